@@ -0,0 +1,104 @@
+"""
+In-memory stand-in for the data layer, so benchmarks measure the app rather
+than Postgres. Implements the DatabaseBackend contract (filters, ordering,
+keyset `after`, ISO-string ids and timestamps) closely enough for the chat
+paths; rpc functions are not emulated.
+"""
+import copy
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional
+from uuid import uuid4
+
+from src.db.database import DatabaseBackend, _keyset_direction, _parse_filter_key, _parse_order
+
+_DEFAULTS = {
+    "conversations": {"title": None, "system_prompt": None, "metadata": {}, "is_archived": False},
+    "messages": {"token_count": 0, "input_tokens": 0, "output_tokens": 0, "model": None, "finish_reason": None,
+                 "latency_ms": 0, "cost_usd": 0, "metadata": {}},
+}
+
+def _now() -> str:
+    return datetime.now(timezone.utc).isoformat()
+
+def _matches(row: dict, filters: Optional[Dict[str, Any]]) -> bool:
+    for key, value in (filters or {}).items():
+        column, op = _parse_filter_key(key)
+        actual = row.get(column)
+        if op == "in" or isinstance(value, (list, tuple, set)):
+            if str(actual) not in {str(v) for v in value}:
+                return False
+        elif value is None:
+            if (actual is None) == (op == "neq"):
+                return False
+        else:
+            # Everything is compared as text, like the ISO strings the real backends return
+            left, right = (actual, value) if isinstance(value, (int, float, bool)) else (str(actual), str(value))
+            if actual is None:
+                return False
+            if not {
+                "eq": left == right, "neq": left != right, "lt": left < right,
+                "lte": left <= right, "gt": left > right, "gte": left >= right,
+            }[op]:
+                return False
+    return True
+
+class InMemoryBackend(DatabaseBackend):
+    name = "memory"
+
+    def __init__(self):
+        self.tables: Dict[str, List[dict]] = {}
+
+    async def select(self, table, columns="*", filters=None, order=None, limit=None, offset=None, after=None):
+        rows = [row for row in self.tables.get(table, []) if _matches(row, filters)]
+        order_by = _parse_order(order)
+        if after:
+            desc = _keyset_direction(order_by, after)
+            cursor = tuple(str(after[column]) for column, _ in order_by)
+            rows = [row for row in rows if (tuple(str(row[c]) for c, _ in order_by) < cursor) == desc
+                    and tuple(str(row[c]) for c, _ in order_by) != cursor]
+        for column, desc in reversed(order_by):
+            rows.sort(key=lambda row: (row.get(column) is None, str(row.get(column))), reverse=desc)
+        rows = rows[offset or 0:]
+        if limit is not None:
+            rows = rows[:limit]
+        if columns.strip() != "*":
+            wanted = [c.strip() for c in columns.split(",")]
+            return [{c: copy.deepcopy(row.get(c)) for c in wanted} for row in rows]
+        return copy.deepcopy(rows)
+
+    async def insert(self, table, rows):
+        stored = []
+        for row in rows:
+            full = {"id": str(uuid4()), "created_at": _now(), **copy.deepcopy(_DEFAULTS.get(table, {})), **copy.deepcopy(row)}
+            if table == "conversations":
+                full.setdefault("updated_at", full["created_at"])
+            full["id"] = str(full["id"])
+            self.tables.setdefault(table, []).append(full)
+            stored.append(full)
+        return copy.deepcopy(stored)
+
+    async def update(self, table, values, filters):
+        updated = []
+        for row in self.tables.get(table, []):
+            if _matches(row, filters):
+                row.update(copy.deepcopy(values))
+                if table == "conversations":
+                    row["updated_at"] = _now()
+                updated.append(row)
+        return copy.deepcopy(updated)
+
+    async def delete(self, table, filters):
+        kept, deleted = [], []
+        for row in self.tables.get(table, []):
+            (deleted if _matches(row, filters) else kept).append(row)
+        self.tables[table] = kept
+        if table == "conversations" and deleted:
+            gone = {row["id"] for row in deleted}
+            self.tables["messages"] = [m for m in self.tables.get("messages", []) if m["conversation_id"] not in gone]
+        return deleted
+
+    async def count(self, table, filters=None):
+        return sum(1 for row in self.tables.get(table, []) if _matches(row, filters))
+
+    async def rpc(self, function, params=None):
+        raise NotImplementedError(f"rpc {function} is not emulated by the in-memory backend")
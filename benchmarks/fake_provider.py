@@ -0,0 +1,95 @@
+"""
+Local stand-in for an OpenAI/Groq-compatible chat completions API.
+
+    python -m benchmarks.fake_provider --port 9100 --ttft-ms 200 --tokens-per-second 80
+
+Streams `--tokens` words per reply with the given time to first token and
+token rate, and fails a share of requests (`--error-rate`, status
+`--error-status`) before the first token.
+"""
+import argparse
+import asyncio
+import json
+import random
+import time
+from dataclasses import dataclass
+
+from starlette.applications import Starlette
+from starlette.requests import Request
+from starlette.responses import JSONResponse, StreamingResponse
+from starlette.routing import Route
+
+@dataclass
+class ProviderProfile:
+    ttft_ms: float = 200.0
+    tokens_per_second: float = 80.0
+    tokens: int = 120
+    error_rate: float = 0.0
+    error_status: int = 503
+    jitter: float = 0.1  # +/- share applied to every delay
+
+def _delay(seconds: float, jitter: float) -> float:
+    return max(0.0, seconds * (1 + random.uniform(-jitter, jitter)))
+
+def build_app(profile: ProviderProfile) -> Starlette:
+    stats = {"requests": 0, "errors": 0}
+
+    async def chat_completions(request: Request):
+        body = await request.json()
+        stats["requests"] += 1
+        if random.random() < profile.error_rate:
+            stats["errors"] += 1
+            return JSONResponse({"error": {"message": "injected failure"}}, status_code=profile.error_status)
+
+        model = body.get("model", "fake")
+        created = int(time.time())
+
+        def frame(delta: dict, finish_reason=None) -> str:
+            payload = {"id": "chatcmpl-fake", "object": "chat.completion.chunk", "created": created, "model": model,
+                       "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}]}
+            return f"data: {json.dumps(payload)}\n\n"
+
+        async def stream():
+            await asyncio.sleep(_delay(profile.ttft_ms / 1000, profile.jitter))
+            yield frame({"role": "assistant", "content": ""})
+            gap = 1 / profile.tokens_per_second if profile.tokens_per_second > 0 else 0
+            for i in range(profile.tokens):
+                if i:
+                    await asyncio.sleep(_delay(gap, profile.jitter))
+                yield frame({"content": f"word{i} "})
+            yield frame({}, "stop")
+            yield "data: [DONE]\n\n"
+
+        return StreamingResponse(stream(), media_type="text/event-stream")
+
+    async def models(request: Request):
+        return JSONResponse({"object": "list", "data": [{"id": "fake", "object": "model"}]})
+
+    async def provider_stats(request: Request):
+        return JSONResponse(stats)
+
+    return Starlette(routes=[
+        Route("/v1/chat/completions", chat_completions, methods=["POST"]),
+        Route("/v1/models", models),
+        Route("/stats", provider_stats),
+    ])
+
+def add_profile_arguments(parser: argparse.ArgumentParser):
+    defaults = ProviderProfile()
+    parser.add_argument("--ttft-ms", type=float, default=defaults.ttft_ms)
+    parser.add_argument("--tokens-per-second", type=float, default=defaults.tokens_per_second)
+    parser.add_argument("--tokens", type=int, default=defaults.tokens)
+    parser.add_argument("--error-rate", type=float, default=defaults.error_rate)
+    parser.add_argument("--error-status", type=int, default=defaults.error_status)
+
+def profile_from_args(args) -> ProviderProfile:
+    return ProviderProfile(args.ttft_ms, args.tokens_per_second, args.tokens, args.error_rate, args.error_status)
+
+if __name__ == "__main__":
+    import uvicorn
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--port", type=int, default=9100)
+    add_profile_arguments(parser)
+    args = parser.parse_args()
+    uvicorn.run(build_app(profile_from_args(args)), host="127.0.0.1", port=args.port, log_level="warning")
@@ -0,0 +1,238 @@
+"""
+End-to-end load benchmark: the real FastAPI app, served by uvicorn, against
+a local fake provider and an in-memory data layer.
+
+    python -m benchmarks.load --mode stream --concurrency 50 --requests 500
+
+Reports requests/sec, time-to-first-token and total latency percentiles,
+event-loop lag in the app's loop, and peak memory. The load driver and the
+fake provider run in their own threads and event loops so they don't add
+lag to the app's loop (they still share the GIL; pass --url to drive an app
+running elsewhere instead).
+"""
+import argparse
+import asyncio
+import os
+import resource
+import threading
+import time
+import tracemalloc
+import uuid
+from dataclasses import dataclass, field
+from typing import List, Optional
+
+from benchmarks.fake_provider import add_profile_arguments, build_app as build_provider_app, profile_from_args
+
+JWT_SECRET = "benchmark-secret"
+
+def configure_environment(provider_port: int):
+    # Must run before anything under src/ is imported: settings are read at import time
+    os.environ.update({
+        "SUPABASE_URL": "http://127.0.0.1:9",
+        "SUPABASE_KEY": "bench.bench.bench",
+        "SUPABASE_DB_URL": "postgresql://bench@127.0.0.1:9/bench",
+        "DB_BACKEND": "supabase",
+        "JWT_SECRET_KEY": JWT_SECRET,
+        "GROQ_API_KEY": "fake",
+        "GROQ_BASE_URL": f"http://127.0.0.1:{provider_port}/v1",
+        "OPENAI_API_KEY": "",
+        "LLM_HTTP2": "false",
+        "RATE_LIMIT_REQUESTS_PER_MINUTE": "0",
+        "RATE_LIMIT_TOKENS_PER_MINUTE": "0",
+        "LLM_MAX_CONCURRENT_STREAMS": "100000",
+    })
+
+@dataclass
+class Results:
+    latencies: List[float] = field(default_factory=list)
+    ttfts: List[float] = field(default_factory=list)
+    errors: int = 0
+    elapsed: float = 0.0
+
+def percentiles(values: List[float]) -> str:
+    if not values:
+        return "n/a"
+    values = sorted(values)
+
+    def pick(q):
+        return values[min(len(values) - 1, int(q * len(values)))] * 1000
+
+    return f"p50={pick(0.50):.1f}ms p95={pick(0.95):.1f}ms p99={pick(0.99):.1f}ms max={values[-1] * 1000:.1f}ms"
+
+class LoopLagMonitor:
+    """
+    Samples how late a short sleep wakes up: time the loop spent busy
+    with something else.
+    """
+
+    def __init__(self, interval: float = 0.01):
+        self.interval = interval
+        self.samples: List[float] = []
+        self._task: Optional[asyncio.Task] = None
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            start = loop.time()
+            await asyncio.sleep(self.interval)
+            self.samples.append(max(0.0, loop.time() - start - self.interval))
+
+    def start(self):
+        self._task = asyncio.create_task(self._run())
+
+    def stop(self):
+        if self._task:
+            self._task.cancel()
+
+def make_token(user_id: str) -> str:
+    import jwt
+    return jwt.encode(
+        {"sub": user_id, "email": f"{user_id[:8]}@bench.local", "aud": "authenticated", "exp": int(time.time()) + 3600},
+        JWT_SECRET, algorithm="HS256",
+    )
+
+async def drive(base_url: str, mode: str, concurrency: int, total: int, users: int, prompt: str, same_prompt: bool = False) -> Results:
+    import httpx
+
+    results = Results()
+    limits = httpx.Limits(max_connections=concurrency + 10, max_keepalive_connections=concurrency + 10)
+    async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=120.0) as client:
+        # One conversation per worker, spread over a few users
+        tokens = [make_token(str(uuid.uuid4())) for _ in range(users)]
+        conversations = []
+        for i in range(concurrency):
+            headers = {"Authorization": f"Bearer {tokens[i % users]}"}
+            response = await client.post("/api/v1/conversations/", json={"title": f"bench {i}"}, headers=headers)
+            response.raise_for_status()
+            conversations.append((response.json()["id"], headers))
+
+        remaining = total
+
+        async def one(conversation_id, headers, kind, content):
+            url = f"/api/v1/conversations/{conversation_id}/messages" + ("/stream" if kind == "stream" else "")
+            start = time.perf_counter()
+            first = None
+            try:
+                if kind == "stream":
+                    async with client.stream("POST", url, json={"content": content}, headers=headers) as response:
+                        if response.status_code != 200:
+                            results.errors += 1
+                            return
+                        async for line in response.aiter_lines():
+                            if first is None and line == "event: content_block_delta":
+                                first = time.perf_counter() - start
+                            elif line == "event: error":
+                                results.errors += 1
+                                return
+                else:
+                    response = await client.post(url, json={"content": content}, headers=headers)
+                    if response.status_code != 200:
+                        results.errors += 1
+                        return
+            except httpx.HTTPError:
+                results.errors += 1
+                return
+            results.latencies.append(time.perf_counter() - start)
+            if first is not None:
+                results.ttfts.append(first)
+
+        async def worker(index):
+            nonlocal remaining
+            conversation_id, headers = conversations[index]
+            # Identical payloads would be coalesced into one upstream call
+            content = prompt if same_prompt else f"{prompt} (client {index})"
+            while remaining > 0:
+                remaining -= 1
+                kind = mode if mode != "mixed" else ("stream" if remaining % 2 else "message")
+                await one(conversation_id, headers, kind, content)
+
+        start = time.perf_counter()
+        await asyncio.gather(*(worker(i) for i in range(concurrency)))
+        results.elapsed = time.perf_counter() - start
+    return results
+
+def start_provider(args) -> threading.Thread:
+    import uvicorn
+
+    config = uvicorn.Config(build_provider_app(profile_from_args(args)), host="127.0.0.1", port=args.provider_port, log_level="warning")
+    server = uvicorn.Server(config)
+    thread = threading.Thread(target=server.run, name="fake-provider", daemon=True)
+    thread.start()
+    while not server.started:
+        time.sleep(0.05)
+    return thread
+
+async def run_in_process(args) -> None:
+    import uvicorn
+
+    from benchmarks.fake_db import InMemoryBackend
+    from src.db.database import db
+    from src.main import app
+
+    backend = InMemoryBackend()
+
+    async def connect():
+        db.backend = backend
+
+    db.connect = connect
+
+    server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=args.app_port, log_level="warning"))
+    serve_task = asyncio.create_task(server.serve())
+    while not server.started:
+        await asyncio.sleep(0.05)
+
+    lag = LoopLagMonitor()
+    lag.start()
+    results = await asyncio.to_thread(
+        asyncio.run,
+        drive(f"http://127.0.0.1:{args.app_port}", args.mode, args.concurrency, args.requests, args.users, args.prompt, args.same_prompt),
+    )
+    lag.stop()
+    server.should_exit = True
+    await serve_task
+
+    report(args, results)
+    print(f"event loop lag:  {percentiles(lag.samples)} ({len(lag.samples)} samples)")
+    print(f"stored messages: {len(backend.tables.get('messages', []))}")
+
+def report(args, results: Results):
+    done = len(results.latencies)
+    print(f"mode={args.mode} concurrency={args.concurrency} requests={args.requests}")
+    print(f"completed:       {done} ok, {results.errors} errors in {results.elapsed:.2f}s")
+    print(f"throughput:      {done / results.elapsed if results.elapsed else 0:.1f} req/s")
+    print(f"ttft:            {percentiles(results.ttfts)}")
+    print(f"total latency:   {percentiles(results.latencies)}")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--mode", choices=["stream", "message", "mixed"], default="stream")
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--users", type=int, default=5)
+    parser.add_argument("--prompt", default="Summarize today's incident in three sentences.")
+    parser.add_argument("--same-prompt", action="store_true", help="Send one identical prompt from every client (exercises coalescing)")
+    parser.add_argument("--url", help="Drive an already running app (JWT_SECRET_KEY=benchmark-secret) instead of starting one in-process")
+    parser.add_argument("--app-port", type=int, default=9200)
+    parser.add_argument("--provider-port", type=int, default=9100)
+    parser.add_argument("--tracemalloc", action="store_true", help="Also report peak Python heap (slows things down)")
+    add_profile_arguments(parser)
+    args = parser.parse_args()
+
+    if args.tracemalloc:
+        tracemalloc.start()
+
+    if args.url:
+        report(args, asyncio.run(drive(args.url, args.mode, args.concurrency, args.requests, args.users, args.prompt, args.same_prompt)))
+    else:
+        configure_environment(args.provider_port)
+        start_provider(args)
+        asyncio.run(run_in_process(args))
+
+    # ru_maxrss is KiB on Linux
+    print(f"peak rss:        {resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024:.1f} MiB")
+    if args.tracemalloc:
+        _, peak = tracemalloc.get_traced_memory()
+        print(f"peak heap:       {peak / 1024 / 1024:.1f} MiB")
+
+if __name__ == "__main__":
+    main()
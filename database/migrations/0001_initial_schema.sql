@@ -0,0 +1,273 @@
+-- Baseline: the schema as it stood before versioned migrations. Safe to
+-- re-run over a database set up from the old database/schema.sql.
+
+-- Enable UUID extension
+CREATE EXTENSION IF NOT EXISTS "uuid-ossp";
+
+-- USERS TABLE (if not using Supabase Auth, or extending it)
+-- In a real Supabase project, 'auth.users' handles authentication. 
+-- We'll create a public profiles table that references auth.users if needed, 
+-- or a standalone users table if we are doing custom auth (as implied by "custom JWT-based auth" option).
+-- For this implementation, we will assume a standalone table for simplicity if custom auth is chosen,
+-- but ideally we link to auth.users.
+-- Let's stick to the prompt's table definition for 'users'.
+
+CREATE TABLE IF NOT EXISTS users (
+    id UUID PRIMARY KEY DEFAULT uuid_generate_v4(),
+    email VARCHAR(255) UNIQUE NOT NULL,
+    password_hash VARCHAR(255) NOT NULL, -- Added for custom auth support
+    created_at TIMESTAMPTZ DEFAULT NOW()
+);
+
+-- CONVERSATIONS TABLE
+CREATE TABLE IF NOT EXISTS conversations (
+    id UUID PRIMARY KEY DEFAULT uuid_generate_v4(),
+    user_id UUID REFERENCES users(id) ON DELETE CASCADE NOT NULL,
+    title VARCHAR(500),
+    model VARCHAR(100) NOT NULL,
+    system_prompt TEXT,
+    metadata JSONB DEFAULT '{}'::jsonb,
+    is_archived BOOLEAN DEFAULT FALSE,
+    created_at TIMESTAMPTZ DEFAULT NOW(),
+    updated_at TIMESTAMPTZ DEFAULT NOW()
+);
+
+-- MESSAGES TABLE
+CREATE TABLE IF NOT EXISTS messages (
+    id UUID PRIMARY KEY DEFAULT uuid_generate_v4(),
+    conversation_id UUID REFERENCES conversations(id) ON DELETE CASCADE NOT NULL,
+    role VARCHAR(20) CHECK (role IN ('user', 'assistant', 'system')) NOT NULL,
+    content TEXT NOT NULL,
+    token_count INT DEFAULT 0, -- tokens in content
+    input_tokens INT DEFAULT 0, -- prompt tokens billed for this turn (assistant rows)
+    output_tokens INT DEFAULT 0, -- completion tokens billed for this turn (assistant rows)
+    model VARCHAR(100),
+    finish_reason VARCHAR(50),
+    latency_ms INT DEFAULT 0,
+    cost_usd NUMERIC(12, 6) DEFAULT 0,
+    metadata JSONB DEFAULT '{}'::jsonb,
+    created_at TIMESTAMPTZ DEFAULT NOW()
+);
+ALTER TABLE messages ADD COLUMN IF NOT EXISTS cost_usd NUMERIC(12, 6) DEFAULT 0;
+ALTER TABLE messages ADD COLUMN IF NOT EXISTS input_tokens INT DEFAULT 0;
+ALTER TABLE messages ADD COLUMN IF NOT EXISTS output_tokens INT DEFAULT 0;
+-- Rows written before input/output were split only recorded the reply size
+UPDATE messages SET output_tokens = token_count
+WHERE role = 'assistant' AND input_tokens = 0 AND output_tokens = 0 AND token_count > 0;
+
+-- Rolling summary of older turns (see src/messages/summarizer.py). The summary
+-- covers every message up to and including (summary_through_at, summary_through_id);
+-- the history builder sends it in place of those messages.
+ALTER TABLE conversations ADD COLUMN IF NOT EXISTS summary TEXT;
+ALTER TABLE conversations ADD COLUMN IF NOT EXISTS summary_token_count INT DEFAULT 0;
+ALTER TABLE conversations ADD COLUMN IF NOT EXISTS summary_through_at TIMESTAMPTZ;
+ALTER TABLE conversations ADD COLUMN IF NOT EXISTS summary_through_id UUID;
+
+-- API KEYS TABLE
+CREATE TABLE IF NOT EXISTS api_keys (
+    id UUID PRIMARY KEY DEFAULT uuid_generate_v4(),
+    user_id UUID REFERENCES users(id) ON DELETE CASCADE NOT NULL,
+    key_hash VARCHAR(255) NOT NULL,
+    key_prefix VARCHAR(10) NOT NULL,
+    name VARCHAR(100),
+    scopes TEXT[],
+    last_used_at TIMESTAMPTZ,
+    expires_at TIMESTAMPTZ,
+    is_active BOOLEAN DEFAULT TRUE,
+    created_at TIMESTAMPTZ DEFAULT NOW()
+);
+
+-- INDEXES for performance
+-- 0003_hot_path_indexes.sql replaces the first two with composite indexes
+CREATE INDEX IF NOT EXISTS idx_conversations_user_id ON conversations(user_id);
+CREATE INDEX IF NOT EXISTS idx_messages_conversation_id ON messages(conversation_id);
+CREATE INDEX IF NOT EXISTS idx_api_keys_user_id ON api_keys(user_id);
+CREATE INDEX IF NOT EXISTS idx_api_keys_key_hash ON api_keys(key_hash);
+
+-- TRIGGER to update updated_at on conversations
+CREATE OR REPLACE FUNCTION update_updated_at_column()
+RETURNS TRIGGER AS $$
+BEGIN
+    -- Background summary updates aren't user activity: keep the list order
+    IF TG_TABLE_NAME = 'conversations'
+       AND (to_jsonb(NEW) - ARRAY['summary', 'summary_token_count', 'summary_through_at', 'summary_through_id', 'updated_at'])
+           = (to_jsonb(OLD) - ARRAY['summary', 'summary_token_count', 'summary_through_at', 'summary_through_id', 'updated_at']) THEN
+        RETURN NEW;
+    END IF;
+    NEW.updated_at = NOW();
+    RETURN NEW;
+END;
+$$ language 'plpgsql';
+
+DROP TRIGGER IF EXISTS update_conversations_updated_at ON conversations;
+CREATE TRIGGER update_conversations_updated_at
+    BEFORE UPDATE ON conversations
+    FOR EACH ROW
+    EXECUTE PROCEDURE update_updated_at_column();
+
+-- USAGE ROLLUPS
+-- Maintained by triggers as messages/conversations are written, so /usage/stats
+-- reads one row (or one row per model per day for date ranges) instead of
+-- scanning every message the user owns. Message rollups are consumption and are
+-- not decremented when conversations are deleted.
+CREATE TABLE IF NOT EXISTS usage_totals (
+    user_id UUID PRIMARY KEY REFERENCES users(id) ON DELETE CASCADE,
+    conversations INT NOT NULL DEFAULT 0, -- current number of conversations
+    messages BIGINT NOT NULL DEFAULT 0,
+    input_tokens BIGINT NOT NULL DEFAULT 0,
+    output_tokens BIGINT NOT NULL DEFAULT 0,
+    cost_usd NUMERIC(14, 6) NOT NULL DEFAULT 0,
+    models TEXT[] NOT NULL DEFAULT '{}',
+    updated_at TIMESTAMPTZ DEFAULT NOW()
+);
+
+CREATE TABLE IF NOT EXISTS usage_daily (
+    user_id UUID REFERENCES users(id) ON DELETE CASCADE NOT NULL,
+    day DATE NOT NULL, -- UTC
+    model VARCHAR(100) NOT NULL DEFAULT '',
+    conversations INT NOT NULL DEFAULT 0, -- conversations created that day
+    messages BIGINT NOT NULL DEFAULT 0,
+    input_tokens BIGINT NOT NULL DEFAULT 0,
+    output_tokens BIGINT NOT NULL DEFAULT 0,
+    cost_usd NUMERIC(14, 6) NOT NULL DEFAULT 0,
+    PRIMARY KEY (user_id, day, model)
+);
+
+-- Statement-level so a multi-row insert updates each rollup row once
+CREATE OR REPLACE FUNCTION rollup_message_usage()
+RETURNS TRIGGER AS $$
+BEGIN
+    INSERT INTO usage_daily AS u (user_id, day, model, messages, input_tokens, output_tokens, cost_usd)
+    SELECT c.user_id,
+           (m.created_at AT TIME ZONE 'UTC')::date,
+           COALESCE(m.model, ''),
+           count(*),
+           sum(COALESCE(m.input_tokens, 0)),
+           sum(COALESCE(m.output_tokens, 0)),
+           sum(COALESCE(m.cost_usd, 0))
+    FROM new_messages m
+    JOIN conversations c ON c.id = m.conversation_id
+    GROUP BY 1, 2, 3
+    ON CONFLICT (user_id, day, model) DO UPDATE SET
+        messages = u.messages + EXCLUDED.messages,
+        input_tokens = u.input_tokens + EXCLUDED.input_tokens,
+        output_tokens = u.output_tokens + EXCLUDED.output_tokens,
+        cost_usd = u.cost_usd + EXCLUDED.cost_usd;
+
+    INSERT INTO usage_totals AS t (user_id, messages, input_tokens, output_tokens, cost_usd, models)
+    SELECT c.user_id,
+           count(*),
+           sum(COALESCE(m.input_tokens, 0)),
+           sum(COALESCE(m.output_tokens, 0)),
+           sum(COALESCE(m.cost_usd, 0)),
+           COALESCE(array_agg(DISTINCT m.model) FILTER (WHERE m.model IS NOT NULL), '{}')
+    FROM new_messages m
+    JOIN conversations c ON c.id = m.conversation_id
+    GROUP BY c.user_id
+    ON CONFLICT (user_id) DO UPDATE SET
+        messages = t.messages + EXCLUDED.messages,
+        input_tokens = t.input_tokens + EXCLUDED.input_tokens,
+        output_tokens = t.output_tokens + EXCLUDED.output_tokens,
+        cost_usd = t.cost_usd + EXCLUDED.cost_usd,
+        models = ARRAY(SELECT DISTINCT unnest(t.models || EXCLUDED.models)),
+        updated_at = NOW();
+    RETURN NULL;
+END;
+$$ language 'plpgsql';
+
+DROP TRIGGER IF EXISTS rollup_messages_usage ON messages;
+CREATE TRIGGER rollup_messages_usage
+    AFTER INSERT ON messages
+    REFERENCING NEW TABLE AS new_messages
+    FOR EACH STATEMENT
+    EXECUTE PROCEDURE rollup_message_usage();
+
+CREATE OR REPLACE FUNCTION rollup_conversation_usage()
+RETURNS TRIGGER AS $$
+BEGIN
+    IF TG_OP = 'INSERT' THEN
+        INSERT INTO usage_daily AS u (user_id, day, model, conversations)
+        SELECT user_id, (created_at AT TIME ZONE 'UTC')::date, model, count(*)
+        FROM changed_conversations
+        GROUP BY 1, 2, 3
+        ON CONFLICT (user_id, day, model) DO UPDATE SET
+            conversations = u.conversations + EXCLUDED.conversations;
+
+        INSERT INTO usage_totals AS t (user_id, conversations)
+        SELECT user_id, count(*) FROM changed_conversations GROUP BY user_id
+        ON CONFLICT (user_id) DO UPDATE SET
+            conversations = t.conversations + EXCLUDED.conversations,
+            updated_at = NOW();
+    ELSE
+        UPDATE usage_totals t
+        SET conversations = GREATEST(t.conversations - d.removed, 0), updated_at = NOW()
+        FROM (SELECT user_id, count(*) AS removed FROM changed_conversations GROUP BY user_id) d
+        WHERE t.user_id = d.user_id;
+    END IF;
+    RETURN NULL;
+END;
+$$ language 'plpgsql';
+
+DROP TRIGGER IF EXISTS rollup_conversations_insert ON conversations;
+CREATE TRIGGER rollup_conversations_insert
+    AFTER INSERT ON conversations
+    REFERENCING NEW TABLE AS changed_conversations
+    FOR EACH STATEMENT
+    EXECUTE PROCEDURE rollup_conversation_usage();
+
+DROP TRIGGER IF EXISTS rollup_conversations_delete ON conversations;
+CREATE TRIGGER rollup_conversations_delete
+    AFTER DELETE ON conversations
+    REFERENCING OLD TABLE AS changed_conversations
+    FOR EACH STATEMENT
+    EXECUTE PROCEDURE rollup_conversation_usage();
+
+-- Backfill / repair: recompute rollups from the raw tables for one user (or everyone).
+-- Run via `python -m src.usage.rebuild`.
+CREATE OR REPLACE FUNCTION rebuild_usage_rollups(p_user_id UUID DEFAULT NULL)
+RETURNS TABLE (users_rebuilt INT) AS $$
+DECLARE
+    v_users INT;
+BEGIN
+    -- Block trigger writes while the rollups are rebuilt
+    LOCK TABLE usage_daily, usage_totals IN EXCLUSIVE MODE;
+
+    DELETE FROM usage_daily WHERE p_user_id IS NULL OR usage_daily.user_id = p_user_id;
+    DELETE FROM usage_totals WHERE p_user_id IS NULL OR usage_totals.user_id = p_user_id;
+
+    INSERT INTO usage_daily (user_id, day, model, messages, input_tokens, output_tokens, cost_usd)
+    SELECT c.user_id,
+           (m.created_at AT TIME ZONE 'UTC')::date,
+           COALESCE(m.model, ''),
+           count(*),
+           sum(COALESCE(m.input_tokens, 0)),
+           sum(COALESCE(m.output_tokens, 0)),
+           sum(COALESCE(m.cost_usd, 0))
+    FROM messages m
+    JOIN conversations c ON c.id = m.conversation_id
+    WHERE p_user_id IS NULL OR c.user_id = p_user_id
+    GROUP BY 1, 2, 3;
+
+    INSERT INTO usage_daily AS u (user_id, day, model, conversations)
+    SELECT c.user_id, (c.created_at AT TIME ZONE 'UTC')::date, c.model, count(*)
+    FROM conversations c
+    WHERE p_user_id IS NULL OR c.user_id = p_user_id
+    GROUP BY 1, 2, 3
+    ON CONFLICT (user_id, day, model) DO UPDATE SET conversations = EXCLUDED.conversations;
+
+    INSERT INTO usage_totals (user_id, conversations, messages, input_tokens, output_tokens, cost_usd, models)
+    SELECT u.user_id,
+           (SELECT count(*) FROM conversations c WHERE c.user_id = u.user_id),
+           sum(u.messages),
+           sum(u.input_tokens),
+           sum(u.output_tokens),
+           sum(u.cost_usd),
+           COALESCE(array_agg(DISTINCT u.model) FILTER (WHERE u.model <> '' AND u.messages > 0), '{}')
+    FROM usage_daily u
+    WHERE p_user_id IS NULL OR u.user_id = p_user_id
+    GROUP BY u.user_id;
+
+    GET DIAGNOSTICS v_users = ROW_COUNT;
+    RETURN QUERY SELECT v_users;
+END;
+$$ language 'plpgsql';
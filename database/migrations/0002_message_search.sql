@@ -0,0 +1,91 @@
+-- FULL-TEXT SEARCH over message content (see src/search/).
+-- A stored tsvector, so matching and ranking never re-parse the text. It is a
+-- plain nullable column kept up to date by a trigger, not a GENERATED one:
+-- adding that would rewrite all of messages under an ACCESS EXCLUSIVE lock,
+-- while this only touches the catalog. Existing rows are backfilled in
+-- batches and the GIN index built concurrently in 0004_message_search_index.sql.
+ALTER TABLE messages ADD COLUMN IF NOT EXISTS content_tsv tsvector;
+
+CREATE OR REPLACE FUNCTION messages_content_tsv()
+RETURNS TRIGGER AS $$
+BEGIN
+    NEW.content_tsv := to_tsvector('english', COALESCE(NEW.content, ''));
+    RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+
+DO $$
+BEGIN
+    -- Databases set up from the old database/schema.sql have a generated
+    -- column instead, which fills itself (and can't be assigned)
+    IF (SELECT attgenerated FROM pg_attribute
+        WHERE attrelid = 'messages'::regclass AND attname = 'content_tsv') = '' THEN
+        DROP TRIGGER IF EXISTS messages_content_tsv ON messages;
+        CREATE TRIGGER messages_content_tsv
+            BEFORE INSERT OR UPDATE OF content ON messages
+            FOR EACH ROW EXECUTE FUNCTION messages_content_tsv();
+    END IF;
+END $$;
+
+-- One page of a user's matching messages, best match first (p_sort = 'rank') or
+-- newest first (p_sort = 'recent'). Keyset paging: pass the last row's
+-- (rank or created_at, id) back as p_after_*. Snippets are only built for the
+-- rows on the page.
+CREATE OR REPLACE FUNCTION search_messages(
+    p_user_id UUID,
+    p_query TEXT,
+    p_conversation_id UUID DEFAULT NULL,
+    p_model TEXT DEFAULT NULL,
+    p_role TEXT DEFAULT NULL,
+    p_created_from TIMESTAMPTZ DEFAULT NULL,
+    p_created_before TIMESTAMPTZ DEFAULT NULL,
+    p_sort TEXT DEFAULT 'rank',
+    p_after_rank REAL DEFAULT NULL,
+    p_after_created_at TIMESTAMPTZ DEFAULT NULL,
+    p_after_id UUID DEFAULT NULL,
+    p_limit INT DEFAULT 20
+)
+RETURNS TABLE (
+    id UUID,
+    conversation_id UUID,
+    conversation_title VARCHAR,
+    role VARCHAR,
+    model VARCHAR,
+    created_at TIMESTAMPTZ,
+    rank REAL,
+    snippet TEXT
+) AS $$
+    WITH q AS (
+        SELECT websearch_to_tsquery('english', p_query) AS query
+    ),
+    hits AS (
+        SELECT m.id, m.conversation_id, c.title, m.role, m.model, m.created_at, m.content,
+               ts_rank_cd(m.content_tsv, q.query) AS rank
+        FROM q, messages m
+        JOIN conversations c ON c.id = m.conversation_id
+        WHERE m.content_tsv @@ q.query
+          AND c.user_id = p_user_id
+          AND (p_conversation_id IS NULL OR m.conversation_id = p_conversation_id)
+          AND (p_model IS NULL OR m.model = p_model)
+          AND (p_role IS NULL OR m.role = p_role)
+          AND (p_created_from IS NULL OR m.created_at >= p_created_from)
+          AND (p_created_before IS NULL OR m.created_at < p_created_before)
+    ),
+    page AS (
+        SELECT * FROM hits h
+        WHERE p_after_id IS NULL
+           OR (p_sort = 'recent' AND (h.created_at, h.id) < (p_after_created_at, p_after_id))
+           OR (p_sort <> 'recent' AND (h.rank, h.id) < (p_after_rank, p_after_id))
+        ORDER BY CASE WHEN p_sort = 'recent' THEN 0 ELSE h.rank END DESC,
+                 CASE WHEN p_sort = 'recent' THEN h.created_at END DESC,
+                 h.id DESC
+        LIMIT p_limit
+    )
+    SELECT p.id, p.conversation_id, p.title, p.role, p.model, p.created_at, p.rank,
+           ts_headline('english', p.content, q.query,
+                       'StartSel=<mark>, StopSel=</mark>, MaxWords=35, MinWords=12, MaxFragments=2, FragmentDelimiter=" … "')
+    FROM page p, q
+    ORDER BY CASE WHEN p_sort = 'recent' THEN 0 ELSE p.rank END DESC,
+             CASE WHEN p_sort = 'recent' THEN p.created_at END DESC,
+             p.id DESC;
+$$ LANGUAGE sql STABLE;
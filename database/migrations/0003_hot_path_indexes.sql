@@ -0,0 +1,23 @@
+-- migrate: no-transaction
+-- Composite indexes for the hottest queries, built without blocking writes.
+-- CONCURRENTLY can't run in a transaction, so the runner sends these one
+-- statement at a time and drops any INVALID leftover of a failed build first.
+
+-- Message history and listings: WHERE conversation_id = $1 ORDER BY created_at, id
+-- (both directions; keyset cursors seek on the row comparison)
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_messages_conversation_created_at_id
+    ON messages (conversation_id, created_at, id);
+
+-- Conversation list: WHERE user_id = $1 ORDER BY updated_at DESC, id DESC
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_conversations_user_updated_at_id
+    ON conversations (user_id, updated_at DESC, id DESC);
+
+-- Same list without archived conversations (?include_archived=false), which
+-- is what most clients show; smaller and skips archived rows entirely
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_conversations_user_active_updated_at_id
+    ON conversations (user_id, updated_at DESC, id DESC)
+    WHERE is_archived = false;
+
+-- Covered by the composites above (same leading column), so they only cost writes
+DROP INDEX CONCURRENTLY IF EXISTS idx_messages_conversation_id;
+DROP INDEX CONCURRENTLY IF EXISTS idx_conversations_user_id;
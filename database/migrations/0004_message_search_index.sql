@@ -0,0 +1,34 @@
+-- migrate: no-transaction
+-- Fill content_tsv for messages written before 0002_message_search.sql, then
+-- index it, without blocking writes. Each backfill batch commits on its own
+-- (so row locks are short-lived), walking the primary key so no batch
+-- rescans rows already done. New rows are covered by the trigger meanwhile.
+
+CREATE OR REPLACE PROCEDURE backfill_message_content_tsv(p_batch_size INT DEFAULT 5000)
+LANGUAGE plpgsql AS $$
+DECLARE
+    last_id UUID := '00000000-0000-0000-0000-000000000000';
+    batch_end UUID;
+BEGIN
+    -- Nothing to do for a generated column (databases from the old schema.sql)
+    IF (SELECT attgenerated FROM pg_attribute
+        WHERE attrelid = 'messages'::regclass AND attname = 'content_tsv') <> '' THEN
+        RETURN;
+    END IF;
+    LOOP
+        SELECT max(id) INTO batch_end
+        FROM (SELECT id FROM messages WHERE id > last_id ORDER BY id LIMIT p_batch_size) batch;
+        EXIT WHEN batch_end IS NULL;
+        UPDATE messages SET content_tsv = to_tsvector('english', COALESCE(content, ''))
+        WHERE id > last_id AND id <= batch_end AND content_tsv IS NULL;
+        last_id := batch_end;
+        COMMIT;
+    END LOOP;
+END;
+$$;
+
+CALL backfill_message_content_tsv();
+DROP PROCEDURE IF EXISTS backfill_message_content_tsv(INT);
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_messages_content_tsv
+    ON messages USING GIN (content_tsv);
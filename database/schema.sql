@@ -1,78 +0,0 @@
--- Enable UUID extension
-CREATE EXTENSION IF NOT EXISTS "uuid-ossp";
-
--- USERS TABLE (if not using Supabase Auth, or extending it)
--- In a real Supabase project, 'auth.users' handles authentication. 
--- We'll create a public profiles table that references auth.users if needed, 
--- or a standalone users table if we are doing custom auth (as implied by "custom JWT-based auth" option).
--- For this implementation, we will assume a standalone table for simplicity if custom auth is chosen,
--- but ideally we link to auth.users.
--- Let's stick to the prompt's table definition for 'users'.
-
-CREATE TABLE IF NOT EXISTS users (
-    id UUID PRIMARY KEY DEFAULT uuid_generate_v4(),
-    email VARCHAR(255) UNIQUE NOT NULL,
-    password_hash VARCHAR(255) NOT NULL, -- Added for custom auth support
-    created_at TIMESTAMPTZ DEFAULT NOW()
-);
-
--- CONVERSATIONS TABLE
-CREATE TABLE IF NOT EXISTS conversations (
-    id UUID PRIMARY KEY DEFAULT uuid_generate_v4(),
-    user_id UUID REFERENCES users(id) ON DELETE CASCADE NOT NULL,
-    title VARCHAR(500),
-    model VARCHAR(100) NOT NULL,
-    system_prompt TEXT,
-    metadata JSONB DEFAULT '{}'::jsonb,
-    is_archived BOOLEAN DEFAULT FALSE,
-    created_at TIMESTAMPTZ DEFAULT NOW(),
-    updated_at TIMESTAMPTZ DEFAULT NOW()
-);
-
--- MESSAGES TABLE
-CREATE TABLE IF NOT EXISTS messages (
-    id UUID PRIMARY KEY DEFAULT uuid_generate_v4(),
-    conversation_id UUID REFERENCES conversations(id) ON DELETE CASCADE NOT NULL,
-    role VARCHAR(20) CHECK (role IN ('user', 'assistant', 'system')) NOT NULL,
-    content TEXT NOT NULL,
-    token_count INT DEFAULT 0,
-    model VARCHAR(100),
-    finish_reason VARCHAR(50),
-    latency_ms INT DEFAULT 0,
-    metadata JSONB DEFAULT '{}'::jsonb,
-    created_at TIMESTAMPTZ DEFAULT NOW()
-);
-
--- API KEYS TABLE
-CREATE TABLE IF NOT EXISTS api_keys (
-    id UUID PRIMARY KEY DEFAULT uuid_generate_v4(),
-    user_id UUID REFERENCES users(id) ON DELETE CASCADE NOT NULL,
-    key_hash VARCHAR(255) NOT NULL,
-    key_prefix VARCHAR(10) NOT NULL,
-    name VARCHAR(100),
-    scopes TEXT[],
-    last_used_at TIMESTAMPTZ,
-    expires_at TIMESTAMPTZ,
-    is_active BOOLEAN DEFAULT TRUE,
-    created_at TIMESTAMPTZ DEFAULT NOW()
-);
-
--- INDEXES for performance
-CREATE INDEX IF NOT EXISTS idx_conversations_user_id ON conversations(user_id);
-CREATE INDEX IF NOT EXISTS idx_messages_conversation_id ON messages(conversation_id);
-CREATE INDEX IF NOT EXISTS idx_api_keys_user_id ON api_keys(user_id);
-CREATE INDEX IF NOT EXISTS idx_api_keys_key_hash ON api_keys(key_hash);
-
--- TRIGGER to update updated_at on conversations
-CREATE OR REPLACE FUNCTION update_updated_at_column()
-RETURNS TRIGGER AS $$
-BEGIN
-    NEW.updated_at = NOW();
-    RETURN NEW;
-END;
-$$ language 'plpgsql';
-
-CREATE TRIGGER update_conversations_updated_at
-    BEFORE UPDATE ON conversations
-    FOR EACH ROW
-    EXECUTE PROCEDURE update_updated_at_column();
@@ -1,34 +1,87 @@
 from fastapi import Depends, HTTPException, status
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
-from src.db.client import supabase
+from src.db.client import supabase, run_sync
 from src.config.settings import settings
+from src.utils.cache import TTLCache
+from src.utils.singleflight import SingleFlight
+from src.utils.metrics import timed
+from gotrue.errors import AuthApiError
+import hashlib
+import time
 import jwt
 
 security = HTTPBearer()
 
+# Verified users keyed by sha256(token), each entry expiring with the token itself
+token_cache = TTLCache(settings.AUTH_TOKEN_CACHE_SIZE, settings.AUTH_TOKEN_CACHE_MAX_TTL_SECONDS)
+# Recently rejected tokens, so retries with a bad token don't hit Supabase Auth again
+rejected_token_cache = TTLCache(settings.AUTH_NEGATIVE_CACHE_SIZE, settings.AUTH_NEGATIVE_CACHE_TTL_SECONDS)
+_remote_verifications = SingleFlight()
+
+def _credentials_exception() -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_401_UNAUTHORIZED,
+        detail="Could not validate credentials",
+        headers={"WWW-Authenticate": "Bearer"},
+    )
+
+def _ttl_until(exp) -> float:
+    if not exp:
+        return settings.AUTH_TOKEN_CACHE_MAX_TTL_SECONDS
+    return min(float(exp) - time.time(), settings.AUTH_TOKEN_CACHE_MAX_TTL_SECONDS)
+
+def _reject(token_key: str) -> HTTPException:
+    rejected_token_cache.set(token_key, True)
+    return _credentials_exception()
+
+async def _verify_remotely(token: str, token_key: str) -> dict:
+    # Fallback: Validation via Supabase client (slower but more robust if needed)
+    try:
+        user = await run_sync(supabase.auth.get_user, token)
+    except AuthApiError:
+        raise _reject(token_key)
+    except Exception:
+        # Auth service trouble says nothing about the token; don't cache the failure
+        raise _credentials_exception()
+    if not user or not user.user:
+        raise _reject(token_key)
+
+    current_user = {"id": user.user.id, "email": user.user.email}
+    try:
+        exp = jwt.decode(token, options={"verify_signature": False}).get("exp")
+    except jwt.PyJWTError:
+        exp = None
+    token_cache.set(token_key, current_user, ttl=_ttl_until(exp))
+    return current_user
+
 async def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(security)):
-    token = credentials.credentials
+    with timed("auth"):
+        return await _authenticate(credentials.credentials)
+
+async def _authenticate(token: str) -> dict:
+    token_key = hashlib.sha256(token.encode()).hexdigest()
+
+    current_user = token_cache.get(token_key)
+    if current_user is not None:
+        return current_user
+    if rejected_token_cache.get(token_key):
+        raise _credentials_exception()
+
     try:
         # Verify JWT using the project secret
         payload = jwt.decode(token, settings.JWT_SECRET_KEY, algorithms=[settings.JWT_ALGORITHM], audience="authenticated")
-        user_id = payload.get("sub")
-        if user_id is None:
-             raise HTTPException(
-                status_code=status.HTTP_401_UNAUTHORIZED,
-                detail="Could not validate credentials",
-                headers={"WWW-Authenticate": "Bearer"},
-            )
-        return {"id": user_id, "email": payload.get("email")}
+    except jwt.ExpiredSignatureError:
+        # Supabase would reject it too; no point asking
+        raise _reject(token_key)
     except jwt.PyJWTError:
-        # Fallback: Validation via Supabase client (slower but more robust if needed)
-        try:
-            user = supabase.auth.get_user(token)
-            if not user:
-                 raise HTTPException(status_code=401, detail="Invalid token")
-            return {"id": user.user.id, "email": user.user.email}
-        except Exception:
-             raise HTTPException(
-                status_code=status.HTTP_401_UNAUTHORIZED,
-                detail="Could not validate credentials",
-                headers={"WWW-Authenticate": "Bearer"},
-            )
+        # Concurrent requests with the same token share one remote call
+        return await _remote_verifications.do(token_key, lambda: _verify_remotely(token, token_key))
+
+    user_id = payload.get("sub")
+    if user_id is None:
+        raise _reject(token_key)
+    current_user = {"id": user_id, "email": payload.get("email")}
+    ttl = _ttl_until(payload.get("exp"))
+    if ttl > 0:
+        token_cache.set(token_key, current_user, ttl=ttl)
+    return current_user
@@ -1,6 +1,6 @@
 from fastapi import APIRouter, HTTPException, status, Depends
 from src.auth.schemas import UserRegister, UserLogin, Token
-from src.db.client import supabase
+from src.db.client import supabase, run_sync
 from gotrue.errors import AuthApiError
 
 router = APIRouter(prefix="/auth", tags=["Auth"])
@@ -8,7 +8,7 @@ router = APIRouter(prefix="/auth", tags=["Auth"])
 @router.post("/register", response_model=Token)
 async def register(user_data: UserRegister):
     try:
-        res = supabase.auth.sign_up({
+        res = await run_sync(supabase.auth.sign_up, {
             "email": user_data.email,
             "password": user_data.password,
         })
@@ -27,7 +27,7 @@ async def register(user_data: UserRegister):
 @router.post("/login", response_model=Token)
 async def login(user_data: UserLogin):
     try:
-        res = supabase.auth.sign_in_with_password({
+        res = await run_sync(supabase.auth.sign_in_with_password, {
             "email": user_data.email,
             "password": user_data.password,
         })
@@ -44,7 +44,7 @@ async def login(user_data: UserLogin):
 async def logout(token: str = Depends(lambda x: x)): # Placeholder, usually handled on client side by discarding token
     # Supabase logout invalidates the session
     try:
-        supabase.auth.sign_out()
+        await run_sync(supabase.auth.sign_out)
         return {"message": "Logged out successfully"}
     except Exception as e:
          raise HTTPException(status_code=500, detail=str(e))
@@ -0,0 +1,76 @@
+import json
+from typing import List
+
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, status
+from fastapi.responses import JSONResponse, StreamingResponse
+from pydantic import ValidationError
+
+from src.auth.dependencies import get_current_user
+from src.batches.schemas import BatchCreate, BatchItem, BatchJobResponse
+from src.batches.service import batch_service
+from src.config.settings import settings
+
+router = APIRouter(prefix="/batches", tags=["Batches"])
+
+NDJSON = "application/x-ndjson"
+
+async def parse_items(request: Request) -> List[BatchItem]:
+    """
+    Items from a JSON body ({"items": [...]}) or NDJSON (one item per line).
+    """
+    body = await request.body()
+    content_type = request.headers.get("content-type", "").split(";")[0].strip()
+    try:
+        if content_type in (NDJSON, "application/jsonl", "application/x-jsonlines"):
+            items = []
+            for number, line in enumerate(body.decode("utf-8").splitlines(), start=1):
+                if line.strip():
+                    try:
+                        items.append(BatchItem.model_validate_json(line))
+                    except ValidationError as e:
+                        raise HTTPException(status_code=422, detail=f"Line {number}: {e.errors()[0]['msg']}")
+        else:
+            items = BatchCreate.model_validate_json(body).items
+    except ValidationError as e:
+        raise HTTPException(status_code=422, detail=json.loads(e.json(include_url=False)))
+    except UnicodeDecodeError:
+        raise HTTPException(status_code=400, detail="Body must be UTF-8")
+
+    if not items:
+        raise HTTPException(status_code=400, detail="Batch has no items")
+    if len(items) > settings.BATCH_MAX_ITEMS:
+        raise HTTPException(status_code=413, detail=f"At most {settings.BATCH_MAX_ITEMS} items per batch")
+    return items
+
+@router.post("/", responses={202: {"model": BatchJobResponse}})
+async def create_batch(
+    request: Request,
+    wait: bool = Query(True, description="Stream NDJSON results as items finish; false returns the job right away"),
+    current_user: dict = Depends(get_current_user)
+):
+    items = await parse_items(request)
+    job = batch_service.submit(current_user["id"], items)
+    if not wait:
+        summary = BatchJobResponse(**job.summary()).model_dump(mode="json")
+        return JSONResponse(summary, status_code=status.HTTP_202_ACCEPTED, headers={"X-Batch-Id": job.id})
+    # The job keeps running if this client goes away; poll it by X-Batch-Id
+    return StreamingResponse(job.lines(), media_type=NDJSON, headers={"X-Batch-Id": job.id})
+
+@router.get("/{batch_id}", response_model=BatchJobResponse)
+async def get_batch(batch_id: str, current_user: dict = Depends(get_current_user)):
+    return batch_service.get(current_user["id"], batch_id).summary()
+
+@router.get("/{batch_id}/results")
+async def get_batch_results(
+    batch_id: str,
+    offset: int = Query(0, ge=0, description="Result lines already fetched; they are skipped"),
+    follow: bool = Query(False, description="Keep streaming until the job finishes"),
+    current_user: dict = Depends(get_current_user)
+):
+    job = batch_service.get(current_user["id"], batch_id)
+    return StreamingResponse(job.lines(offset, follow), media_type=NDJSON, headers={"X-Batch-Id": job.id})
+
+@router.delete("/{batch_id}", response_model=BatchJobResponse)
+async def cancel_batch(batch_id: str, current_user: dict = Depends(get_current_user)):
+    job = await batch_service.cancel(current_user["id"], batch_id)
+    return job.summary()
@@ -0,0 +1,24 @@
+from pydantic import BaseModel
+from typing import List, Literal, Optional
+from datetime import datetime
+from uuid import UUID
+
+from src.conversations.schemas import ConversationCreate
+from src.messages.schemas import MessageCreate
+
+class BatchItem(MessageCreate):
+    custom_id: Optional[str] = None  # Echoed back on the result line
+    conversation_id: Optional[UUID] = None  # Omit to start a new conversation
+    conversation: Optional[ConversationCreate] = None  # Settings for that new conversation
+
+class BatchCreate(BaseModel):
+    items: List[BatchItem]
+
+class BatchJobResponse(BaseModel):
+    id: str
+    status: Literal["running", "completed", "cancelled"]
+    total: int
+    succeeded: int
+    failed: int
+    created_at: datetime
+    finished_at: Optional[datetime] = None
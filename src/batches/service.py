@@ -0,0 +1,186 @@
+import asyncio
+import json
+import logging
+from datetime import datetime, timezone
+from typing import AsyncIterator, Dict, List, Optional
+from uuid import uuid4
+
+from fastapi import HTTPException
+from fastapi.encoders import jsonable_encoder
+
+from src.batches.schemas import BatchItem
+from src.config.settings import settings
+from src.conversations.schemas import ConversationCreate
+from src.conversations.service import ConversationService
+from src.messages.service import MessageService
+from src.utils.broadcast import BroadcastCancelled, ReplayBroadcast
+from src.utils.metrics import start_request_timings
+
+logger = logging.getLogger(__name__)
+
+class BatchJob:
+    """
+    One uploaded batch. Items run in the background; each result becomes
+    available (as an NDJSON line) as soon as its item finishes, in
+    completion order.
+    """
+
+    def __init__(self, user_id: str, items: List[BatchItem], slots: asyncio.Semaphore):
+        self.id = uuid4().hex
+        self.user_id = str(user_id)
+        self.items = items
+        self.succeeded = 0
+        self.failed = 0
+        self.created_at = datetime.now(timezone.utc)
+        self.finished_at: Optional[datetime] = None
+        self._slots = slots
+        self.results = ReplayBroadcast(self._run(), on_done=self._finished, cancel_when_idle=False)
+
+    @property
+    def status(self) -> str:
+        if not self.results.done:
+            return "running"
+        return "cancelled" if self.results.error is not None else "completed"
+
+    def summary(self) -> dict:
+        return {
+            "id": self.id,
+            "status": self.status,
+            "total": len(self.items),
+            "succeeded": self.succeeded,
+            "failed": self.failed,
+            "created_at": self.created_at,
+            "finished_at": self.finished_at,
+        }
+
+    def _finished(self):
+        self.finished_at = datetime.now(timezone.utc)
+
+    async def lines(self, offset: int = 0, follow: bool = True) -> AsyncIterator[str]:
+        """
+        Result lines from the offset-th on; with follow=False, stop at what
+        is available now instead of waiting for the rest. A followed job that
+        is cancelled ends with a {"status": "cancelled"} line.
+        """
+        if follow:
+            try:
+                async for result in self.results.subscribe(start=offset):
+                    yield json.dumps(jsonable_encoder(result)) + "\n"
+            except BroadcastCancelled:
+                yield json.dumps({"status": "cancelled", "succeeded": self.succeeded, "failed": self.failed}) + "\n"
+            return
+        for result in list(self.results.items)[offset:]:
+            yield json.dumps(jsonable_encoder(result)) + "\n"
+
+    async def _run(self) -> AsyncIterator[dict]:
+        done: asyncio.Queue = asyncio.Queue()
+
+        async def one(index: int, item: BatchItem):
+            done.put_nowait(await self._process(index, item))
+
+        tasks = [asyncio.create_task(one(index, item)) for index, item in enumerate(self.items)]
+        try:
+            for _ in tasks:
+                result = await done.get()
+                if result["status"] == 200:
+                    self.succeeded += 1
+                else:
+                    self.failed += 1
+                yield result
+        finally:
+            for task in tasks:
+                task.cancel()
+
+    async def _process(self, index: int, item: BatchItem) -> dict:
+        # Each item is its own "request" as far as timings go
+        start_request_timings()
+        result = {"index": index, "custom_id": item.custom_id, "conversation_id": item.conversation_id}
+        try:
+            if item.conversation_id is None:
+                async with self._slots:
+                    conversation = await ConversationService.create_conversation(self.user_id, item.conversation or ConversationCreate())
+                result["conversation_id"] = conversation["id"]
+            message = await self._send(str(result["conversation_id"]), item)
+            result.update(status=200, message=message)
+        except HTTPException as e:
+            result.update(status=e.status_code, error=e.detail)
+        except Exception as e:
+            logger.error(f"Batch {self.id} item {index} failed: {e}")
+            result.update(status=500, error="Internal server error")
+        return result
+
+    async def _send(self, conversation_id: str, item: BatchItem) -> dict:
+        attempt = 0
+        while True:
+            # A slot is held per attempt, not while waiting out a 429: one
+            # user's exhausted quota mustn't stall everyone else's batches
+            async with self._slots:
+                try:
+                    return await MessageService.process_chat_message(self.user_id, conversation_id, item, priority="batch")
+                except HTTPException as e:
+                    # Quota refusals happen before anything is stored, so waiting them out is safe
+                    attempt += 1
+                    if e.status_code != 429 or attempt > settings.BATCH_RATE_LIMIT_RETRIES:
+                        raise
+                    wait = float((e.headers or {}).get("Retry-After", 1))
+            await asyncio.sleep(wait)
+
+class BatchService:
+    """
+    In-process batch jobs. All jobs share BATCH_CONCURRENCY item slots and
+    call the provider at batch priority, so they queue behind interactive
+    traffic. A user can have BATCH_MAX_ACTIVE_JOBS running at once.
+    Finished jobs are kept for BATCH_JOB_TTL_SECONDS.
+    """
+
+    def __init__(self):
+        self._jobs: Dict[str, BatchJob] = {}
+        self._slots = asyncio.Semaphore(settings.BATCH_CONCURRENCY)
+
+    def __len__(self) -> int:
+        return len(self._jobs)
+
+    def submit(self, user_id: str, items: List[BatchItem]) -> BatchJob:
+        # Each running job holds a task per item, so cap them per user
+        running = sum(1 for job in self._jobs.values() if job.user_id == str(user_id) and not job.results.done)
+        if running >= settings.BATCH_MAX_ACTIVE_JOBS:
+            raise HTTPException(
+                status_code=429,
+                detail=f"At most {settings.BATCH_MAX_ACTIVE_JOBS} batches can run at once; wait for one to finish",
+            )
+        job = BatchJob(user_id, items, self._slots)
+        self._jobs[job.id] = job
+        job.results.start().add_done_callback(lambda _: self._expire(job.id))
+        return job
+
+    def get(self, user_id: str, job_id: str) -> BatchJob:
+        job = self._jobs.get(job_id)
+        if job is None or job.user_id != str(user_id):
+            raise HTTPException(status_code=404, detail="Batch not found or expired")
+        return job
+
+    async def cancel(self, user_id: str, job_id: str) -> BatchJob:
+        """
+        Stop a job; items already finished keep their results.
+        """
+        job = self.get(user_id, job_id)
+        if not job.results.done:
+            task = job.results.start()
+            task.cancel()
+            await asyncio.gather(task, return_exceptions=True)
+        return job
+
+    def _expire(self, job_id: str):
+        asyncio.get_running_loop().call_later(settings.BATCH_JOB_TTL_SECONDS, self._jobs.pop, job_id, None)
+
+    async def stop(self):
+        """
+        Cancel jobs still running at shutdown.
+        """
+        tasks = [job.results.start() for job in self._jobs.values() if not job.results.done]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+# Singleton instance
+batch_service = BatchService()
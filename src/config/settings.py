@@ -1,5 +1,5 @@
 from pydantic_settings import BaseSettings, SettingsConfigDict
-from typing import List
+from typing import Dict, List
 
 class Settings(BaseSettings):
     model_config = SettingsConfigDict(env_file=".env", env_file_encoding="utf-8", extra="ignore")
@@ -8,21 +8,121 @@ class Settings(BaseSettings):
     APP_NAME: str = "AI Conversation API"
     API_V1_STR: str = "/api/v1"
     DEBUG: bool = False
+    # GET /metrics: off unless enabled, and only with "Authorization: Bearer <METRICS_TOKEN>" when set
+    METRICS_ENABLED: bool = False
+    METRICS_TOKEN: str = ""
     
     # Database (Supabase)
     SUPABASE_URL: str
     SUPABASE_KEY: str
     SUPABASE_DB_URL: str  # Creating asyncpg connection string if needed directly, or rely on supabase-py
+    DB_BACKEND: str = "asyncpg"  # "asyncpg" (native pool) or "supabase" (threaded supabase-py fallback)
+    DB_POOL_MIN_SIZE: int = 2
+    DB_POOL_MAX_SIZE: int = 10
+    DB_COMMAND_TIMEOUT: float = 10.0
+    DB_STATEMENT_CACHE_SIZE: int = 0  # Must stay 0 behind pgbouncer in transaction mode
+    DB_FALLBACK_THREADS: int = 8
+    MIGRATION_LOCK_TIMEOUT_MS: int = 5000  # Migrations give up rather than queue live queries behind a table lock
 
     # Auth
     JWT_SECRET_KEY: str
     JWT_ALGORITHM: str = "HS256"
     ACCESS_TOKEN_EXPIRE_MINUTES: int = 30
+    AUTH_TOKEN_CACHE_SIZE: int = 10000
+    AUTH_TOKEN_CACHE_MAX_TTL_SECONDS: float = 300.0  # Also used when a token carries no exp claim
+    AUTH_NEGATIVE_CACHE_SIZE: int = 10000
+    AUTH_NEGATIVE_CACHE_TTL_SECONDS: float = 30.0
     
     # LLM Provider (Default: Groq)
     GROQ_API_KEY: str | None = None
     OPENAI_API_KEY: str | None = None
+    GROQ_BASE_URL: str = "https://api.groq.com/openai/v1"
+    OPENAI_BASE_URL: str = "https://api.openai.com/v1"
+    # Model name prefix -> providers to try, longest prefix wins; "*" is the fallback
+    LLM_MODEL_ROUTES: Dict[str, List[str]] = {"gpt-": ["openai"], "*": ["groq"]}
+    LLM_ROUTER_EWMA_ALPHA: float = 0.2  # Weight of the newest sample in rolling latency/error rates
+    LLM_ROUTER_ERROR_PENALTY: float = 10.0
+    LLM_ROUTER_COOLDOWN_SECONDS: float = 10.0  # Demote a provider after a 429/5xx/connect error (Retry-After wins)
+    LLM_HEDGE_AFTER_MS: int = 0  # Race the next provider if the first token is this late (0 = off)
+    # Upstream admission: concurrent streams per (provider, model), then a priority queue
+    LLM_MAX_CONCURRENT_STREAMS: int = 32
+    LLM_CONCURRENCY_LIMITS: Dict[str, int] = {}  # Overrides keyed "provider:model" or "provider"
+    LLM_MAX_QUEUE_SIZE: int = 256  # Further requests get 503 straight away
+    LLM_QUEUE_TIMEOUT_SECONDS: float = 10.0
+    LLM_QUEUE_RETRY_AFTER_SECONDS: int = 5
+
+    # LLM HTTP client (shared, pooled connection to providers)
+    LLM_HTTP2: bool = True
+    LLM_MAX_CONNECTIONS: int = 100
+    LLM_MAX_KEEPALIVE_CONNECTIONS: int = 20
+    LLM_KEEPALIVE_EXPIRY: float = 30.0
+    LLM_CONNECT_TIMEOUT: float = 5.0
+    LLM_READ_TIMEOUT: float = 60.0
+    LLM_WRITE_TIMEOUT: float = 10.0
+    LLM_POOL_TIMEOUT: float = 5.0
+    LLM_WARMUP: bool = False  # Open provider connections at startup instead of on the first message
+    LLM_COALESCE_REQUESTS: bool = True  # Identical concurrent requests share one upstream stream
     
+    # Pricing overrides per 1M tokens, e.g. {"llama3-8b-8192": {"input": 0.05, "output": 0.08}}
+    MODEL_PRICING: Dict[str, Dict[str, float]] = {}
+    MODEL_PRICING_FILE: str | None = None  # JSON file with the same shape
+
+    # Context window assembly
+    CONTEXT_RESERVED_OUTPUT_TOKENS: int = 1024  # Kept free in the model's window for the reply
+    CONTEXT_PAGE_SIZE: int = 20  # History rows fetched per round trip while filling the budget
+    CONTEXT_MAX_MESSAGES: int = 200
+
+    # Rolling summaries: fold older turns into a per-conversation summary in the background
+    SUMMARY_ENABLED: bool = True
+    SUMMARY_TRIGGER_TOKENS: int = 4000  # Raw history size (tokens) that starts a summary run
+    SUMMARY_MODEL: str = "llama3-8b-8192"
+    SUMMARY_KEEP_RECENT_MESSAGES: int = 8  # Never summarized; always sent verbatim
+    SUMMARY_MAX_INPUT_TOKENS: int = 6000  # Messages folded per run
+    SUMMARY_MAX_TOKENS: int = 512
+    SUMMARY_COOLDOWN_SECONDS: float = 30.0
+
+    # SSE streaming: merge provider deltas arriving within this window into one event (0 = off)
+    SSE_COALESCE_WINDOW_MS: int = 0
+    SSE_COALESCE_MAX_CHARS: int = 256
+    # Resumable streams: events kept per stream, and how long after the end
+    SSE_RESUME_BUFFER_EVENTS: int = 2048
+    SSE_RESUME_TTL_SECONDS: float = 120.0
+    SSE_RESUME_MAX_STREAMS: int = 10000
+    # With no client attached for this long, the upstream generation is cancelled
+    SSE_DISCONNECT_GRACE_SECONDS: float = 10.0
+
+    # Batch chat jobs (POST /batches): item slots shared by all jobs
+    BATCH_CONCURRENCY: int = 4
+    BATCH_MAX_ITEMS: int = 1000
+    BATCH_MAX_ACTIVE_JOBS: int = 3  # Running jobs per user; more get a 429
+    BATCH_JOB_TTL_SECONDS: float = 3600.0  # Results kept after a job finishes
+    BATCH_RATE_LIMIT_RETRIES: int = 5  # Waits on a 429 before an item fails
+
+    # NDJSON export/import: rows per keyset page read, rows per multi-row insert
+    EXPORT_PAGE_SIZE: int = 500
+    IMPORT_BATCH_SIZE: int = 500
+
+    # Write-behind message persistence
+    MESSAGE_WRITE_BATCH_SIZE: int = 100
+    MESSAGE_WRITE_FLUSH_INTERVAL_MS: int = 50
+    MESSAGE_WRITE_QUEUE_SIZE: int = 10000
+    MESSAGE_WRITE_MAX_RETRIES: int = 5
+    MESSAGE_WRITE_RETRY_BACKOFF_MS: int = 100
+
+    # Caches (per process)
+    CONVERSATION_CACHE_SIZE: int = 10000
+    CONVERSATION_CACHE_TTL_SECONDS: float = 60.0
+    RESPONSE_CACHE_ENABLED: bool = False  # Exact-match cache for temperature=0 chat requests
+    RESPONSE_CACHE_MAX_ENTRIES: int = 5000
+    RESPONSE_CACHE_TTL_SECONDS: float = 3600.0
+    RESPONSE_CACHE_MAX_CHARS: int = 32000  # Longer answers aren't cached
+
+    # Per-user LLM quotas (0 = unlimited). "sqlite" shares buckets between workers on one host
+    RATE_LIMIT_REQUESTS_PER_MINUTE: int = 30
+    RATE_LIMIT_TOKENS_PER_MINUTE: int = 60000
+    RATE_LIMIT_STORAGE: str = "memory"  # "memory" or "sqlite"
+    RATE_LIMIT_SQLITE_PATH: str = "/tmp/conversation-api-ratelimit.sqlite3"
+
     # Cors
     BACKEND_CORS_ORIGINS: List[str] = ["http://localhost:3000"]
 
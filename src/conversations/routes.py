@@ -1,8 +1,10 @@
-from fastapi import APIRouter, Depends, Query
-from typing import List
+from fastapi import APIRouter, Depends, Query, Request, Response
+from fastapi.responses import StreamingResponse
+from typing import List, Optional
 from src.auth.dependencies import get_current_user
-from src.conversations.schemas import ConversationCreate, ConversationResponse, ConversationUpdate
+from src.conversations.schemas import ConversationCreate, ConversationResponse, ConversationUpdate, ImportResult
 from src.conversations.service import ConversationService
+from src.conversations.transfer import ConversationTransfer
 
 router = APIRouter(prefix="/conversations", tags=["Conversations"])
 
@@ -15,11 +17,41 @@ async def create_conversation(
 
 @router.get("/", response_model=List[ConversationResponse])
 async def list_conversations(
-    limit: int = 20,
-    offset: int = 0,
+    response: Response,
+    limit: int = Query(20, ge=1),
+    offset: int = Query(0, ge=0),
+    cursor: Optional[str] = Query(None, description="X-Next-Cursor from the previous page; takes precedence over offset"),
+    include_archived: bool = Query(True, description="false lists only conversations that are not archived"),
     current_user: dict = Depends(get_current_user)
 ):
-    return await ConversationService.get_conversations(current_user["id"], limit, offset)
+    conversations, cursor = await ConversationService.get_conversations(current_user["id"], limit, offset, cursor, include_archived)
+    if cursor:
+        response.headers["X-Next-Cursor"] = cursor
+    return conversations
+
+# Declared before /{conversation_id} so "export" isn't taken for an id
+@router.get("/export")
+async def export_conversations(
+    include_archived: bool = Query(True, description="false lists only conversations that are not archived"),
+    compress: bool = Query(False, description="gzip the NDJSON"),
+    current_user: dict = Depends(get_current_user)
+):
+    filename = "conversations.ndjson.gz" if compress else "conversations.ndjson"
+    return StreamingResponse(
+        ConversationTransfer.export_ndjson(current_user["id"], include_archived, compress),
+        media_type="application/gzip" if compress else "application/x-ndjson",
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'}
+    )
+
+@router.post("/import", response_model=ImportResult)
+async def import_conversations(
+    request: Request,
+    current_user: dict = Depends(get_current_user)
+):
+    # NDJSON body; gzip either as the upload itself or as Content-Encoding
+    content_type = request.headers.get("content-type", "").split(";")[0].strip()
+    compressed = request.headers.get("content-encoding") == "gzip" or content_type in ("application/gzip", "application/x-gzip")
+    return await ConversationTransfer.import_ndjson(current_user["id"], request.stream(), compressed)
 
 @router.get("/{conversation_id}", response_model=ConversationResponse)
 async def get_conversation(
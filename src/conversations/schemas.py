@@ -1,8 +1,12 @@
-from pydantic import BaseModel
-from typing import Optional, Dict, Any, List
+import json
+
+from pydantic import BaseModel, Field, field_validator
+from typing import Optional, Dict, Any, List, Literal, Union
 from datetime import datetime
 from uuid import UUID
 
+_INT4_MAX = 2**31 - 1
+
 class ConversationCreate(BaseModel):
     title: Optional[str] = None
     model: str = "llama3-8b-8192"
@@ -25,3 +29,49 @@ class ConversationResponse(BaseModel):
     is_archived: bool
     created_at: datetime
     updated_at: datetime
+
+class ImportResult(BaseModel):
+    conversations: int
+    messages: int
+    skipped: int  # Lines that could not be imported
+    errors: List[Dict[str, Any]]  # The first few of them, with line numbers
+
+class _ImportedRecord(BaseModel):
+    """
+    Checks an import line against the column types before it is buffered,
+    so a bad value skips its own line instead of failing a whole insert.
+    """
+
+    @field_validator("*", mode="before")
+    @classmethod
+    def no_nul(cls, value):
+        # Postgres text and jsonb can't store NUL characters
+        if isinstance(value, str) and "\x00" in value:
+            raise ValueError("contains a NUL character")
+        if isinstance(value, dict) and "\\u0000" in json.dumps(value):
+            raise ValueError("contains a NUL character")
+        return value
+
+class ImportedConversation(_ImportedRecord):
+    id: Optional[Union[str, int]] = None  # Only used to match up its messages
+    title: Optional[str] = Field(None, max_length=500)
+    model: Optional[str] = Field(None, max_length=100)
+    system_prompt: Optional[str] = None
+    metadata: Optional[Dict[str, Any]] = None
+    is_archived: bool = False
+    created_at: Optional[datetime] = None
+    updated_at: Optional[datetime] = None
+
+class ImportedMessage(_ImportedRecord):
+    conversation_id: Optional[Union[str, int]] = None
+    role: Literal["user", "assistant", "system"]
+    content: str
+    token_count: Optional[int] = Field(None, ge=0, le=_INT4_MAX)
+    input_tokens: Optional[int] = Field(None, ge=0, le=_INT4_MAX)
+    output_tokens: Optional[int] = Field(None, ge=0, le=_INT4_MAX)
+    model: Optional[str] = Field(None, max_length=100)
+    finish_reason: Optional[str] = Field(None, max_length=50)
+    latency_ms: Optional[int] = Field(None, ge=0, le=_INT4_MAX)
+    cost_usd: Optional[float] = Field(None, ge=0, lt=1_000_000)  # NUMERIC(12, 6)
+    metadata: Optional[Dict[str, Any]] = None
+    created_at: Optional[datetime] = None
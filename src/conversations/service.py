@@ -1,44 +1,75 @@
-from src.db.client import supabase
+from src.db.database import db
+from src.config.settings import settings
 from src.conversations.schemas import ConversationCreate, ConversationUpdate
+from src.utils.cache import TTLCache
+from src.utils.pagination import decode_cursor, next_cursor
 from fastapi import HTTPException
 from uuid import UUID
 
+# Conversation rows keyed by (user_id, conversation_id). Keying on the owner
+# means a hit is also an ownership check.
+conversation_cache = TTLCache(settings.CONVERSATION_CACHE_SIZE, settings.CONVERSATION_CACHE_TTL_SECONDS)
+
+# Keyset order for listing; served by idx_conversations_user_updated_at_id
+# (see database/migrations/0003_hot_path_indexes.sql)
+CONVERSATION_ORDER = ["updated_at.desc", "id.desc"]
+
 class ConversationService:
     @staticmethod
     async def create_conversation(user_id: str, data: ConversationCreate):
-        response = supabase.table("conversations").insert({
+        rows = await db.insert("conversations", [{
             "user_id": user_id,
             "title": data.title,
             "model": data.model,
             "system_prompt": data.system_prompt,
             "metadata": data.metadata
-        }).execute()
+        }])
         
-        if not response.data:
+        if not rows:
             raise HTTPException(status_code=500, detail="Failed to create conversation")
-        return response.data[0]
+        # The first message usually follows right away
+        conversation_cache.set((str(user_id), str(rows[0]["id"])), rows[0])
+        return rows[0]
 
     @staticmethod
-    async def get_conversations(user_id: str, limit: int = 20, offset: int = 0):
-        response = supabase.table("conversations")\
-            .select("*")\
-            .eq("user_id", user_id)\
-            .order("updated_at", desc=True)\
-            .range(offset, offset + limit - 1)\
-            .execute()
-        return response.data
+    async def get_conversations(user_id: str, limit: int = 20, offset: int = 0, cursor: str = None, include_archived: bool = True):
+        """
+        Returns (conversations, next_cursor). A cursor continues keyset
+        pagination; without one, offset pagination is used for compatibility.
+        Either way the next cursor points past the last row returned.
+        """
+        filters = {"user_id": user_id}
+        if not include_archived:
+            # Served by the partial idx_conversations_user_active_updated_at_id
+            filters["is_archived"] = False
+        rows = await db.select(
+            "conversations",
+            filters=filters,
+            order=CONVERSATION_ORDER,
+            limit=limit + 1,
+            offset=None if cursor else offset,
+            after=decode_cursor(cursor, CONVERSATION_ORDER) if cursor else None,
+        )
+        return rows, next_cursor(rows, limit, CONVERSATION_ORDER)
 
     @staticmethod
-    async def get_conversation(user_id: str, conversation_id: str):
-        response = supabase.table("conversations")\
-            .select("*")\
-            .eq("id", conversation_id)\
-            .eq("user_id", user_id)\
-            .execute()
+    async def get_conversation(user_id: str, conversation_id: str, cached: bool = False):
+        """
+        Fetch a conversation owned by user_id. The chat hot path passes
+        cached=True to skip the round trip while the cached row is fresh.
+        """
+        key = (str(user_id), str(conversation_id))
+        if cached:
+            conversation = conversation_cache.get(key)
+            if conversation is not None:
+                return dict(conversation)
+
+        rows = await db.select("conversations", filters={"id": conversation_id, "user_id": user_id})
             
-        if not response.data:
+        if not rows:
             raise HTTPException(status_code=404, detail="Conversation not found")
-        return response.data[0]
+        conversation_cache.set(key, rows[0])
+        return dict(rows[0])
 
     @staticmethod
     async def update_conversation(user_id: str, conversation_id: str, data: ConversationUpdate):
@@ -46,22 +77,19 @@ class ConversationService:
         if not update_data:
             return await ConversationService.get_conversation(user_id, conversation_id)
 
-        response = supabase.table("conversations")\
-            .update(update_data)\
-            .eq("id", conversation_id)\
-            .eq("user_id", user_id)\
-            .execute()
+        key = (str(user_id), str(conversation_id))
+        conversation_cache.pop(key)
+        rows = await db.update("conversations", update_data, {"id": conversation_id, "user_id": user_id})
             
-        if not response.data:
+        if not rows:
             raise HTTPException(status_code=404, detail="Conversation not found")
-        return response.data[0]
+        conversation_cache.set(key, rows[0])
+        return rows[0]
 
     @staticmethod
     async def delete_conversation(user_id: str, conversation_id: str):
-        response = supabase.table("conversations")\
-            .delete()\
-            .eq("id", conversation_id)\
-            .eq("user_id", user_id)\
-            .execute()
+        await db.delete("conversations", {"id": conversation_id, "user_id": user_id})
+        # After the delete, so a concurrent read can't re-cache the row in between
+        conversation_cache.pop((str(user_id), str(conversation_id)))
             
         return {"message": "Conversation deleted successfully"}
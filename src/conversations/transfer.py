@@ -0,0 +1,311 @@
+import asyncio
+import json
+import logging
+import zlib
+from datetime import datetime, timezone
+from decimal import Decimal
+from typing import Any, AsyncIterator, Dict, List, Optional
+from uuid import uuid4
+
+from fastapi import HTTPException
+from pydantic import ValidationError
+
+from src.config.settings import settings
+from src.conversations.schemas import ImportedConversation, ImportedMessage
+from src.db.database import db
+from src.llm.token_counter import count_tokens_batch
+from src.messages.persistence import message_writer
+from src.messages.service import MESSAGE_ORDERS
+from src.utils.cost_tracker import calculate_cost
+
+logger = logging.getLogger(__name__)
+
+CONVERSATION_COLUMNS = "id, title, model, system_prompt, metadata, is_archived, created_at, updated_at"
+MESSAGE_COLUMNS = (
+    "id, role, content, token_count, input_tokens, output_tokens, model, "
+    "finish_reason, latency_ms, cost_usd, metadata, created_at"
+)
+_MESSAGE_KEYS = [column.strip() for column in MESSAGE_COLUMNS.split(",")]
+
+# Export output is flushed in chunks of about this size
+_CHUNK_BYTES = 64 * 1024
+# An import line longer than this is rejected
+_MAX_LINE_BYTES = 16 * 1024 * 1024
+# Compressed imports are inflated at most this much at a time, so a small
+# chunk can't expand to gigabytes before the line length is checked
+_INFLATE_BYTES = 256 * 1024
+# Error details returned by an import, beyond that only counted
+_MAX_REPORTED_ERRORS = 100
+
+def _json_default(value: Any):
+    if isinstance(value, Decimal):
+        return float(value)
+    return str(value)
+
+def _dumps(record: dict) -> str:
+    return json.dumps(record, default=_json_default) + "\n"
+
+def _timestamp(value: Optional[datetime]) -> Optional[str]:
+    # Naive timestamps in an import are taken as UTC
+    if value is None:
+        return None
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return value.isoformat()
+
+class _Importer:
+    """
+    Buffers parsed import lines into multi-row inserts. Every conversation
+    and message gets a fresh id; messages follow their conversation through
+    the old-to-new id map.
+    """
+
+    def __init__(self, user_id: str):
+        self.user_id = str(user_id)
+        self.ids: Dict[str, str] = {}
+        self.last_conversation: Optional[str] = None
+        self.conversations: List[dict] = []
+        self.messages: List[dict] = []
+        self.imported_conversations = 0
+        self.imported_messages = 0
+        self.skipped = 0
+        self.errors: List[dict] = []
+        self.now = datetime.now(timezone.utc).isoformat()
+
+    def skip(self, line: int, reason: str):
+        self.skipped += 1
+        if len(self.errors) < _MAX_REPORTED_ERRORS:
+            self.errors.append({"line": line, "error": reason})
+
+    async def add(self, line: int, raw: bytes):
+        if not raw.strip():
+            return
+        try:
+            record = json.loads(raw)
+        except ValueError:
+            return self.skip(line, "Not valid JSON")
+        if not isinstance(record, dict):
+            return self.skip(line, "Expected a JSON object")
+        kind = record.get("type") or ("message" if "role" in record else "conversation")
+        if kind not in ("conversation", "message"):
+            return self.skip(line, f"Unknown record type {kind!r}")
+        try:
+            # Everything is checked here, so one bad value can't fail a whole insert later
+            if kind == "conversation":
+                error = self._add_conversation(ImportedConversation.model_validate(record))
+            else:
+                error = self._add_message(ImportedMessage.model_validate(record))
+        except ValidationError as e:
+            first = e.errors()[0]
+            error = f"{'.'.join(str(part) for part in first['loc']) or 'record'}: {first['msg']}"
+        if error:
+            if kind == "conversation":
+                # Its messages must not land in the conversation before it
+                self.last_conversation = None
+            return self.skip(line, error)
+        if len(self.conversations) >= settings.IMPORT_BATCH_SIZE or len(self.messages) >= settings.IMPORT_BATCH_SIZE:
+            await self.flush()
+
+    def _add_conversation(self, record: ImportedConversation) -> Optional[str]:
+        new_id = str(uuid4())
+        if record.id is not None:
+            self.ids[str(record.id)] = new_id
+        self.last_conversation = new_id
+        created_at = _timestamp(record.created_at) or self.now
+        self.conversations.append({
+            "id": new_id,
+            "user_id": self.user_id,
+            "title": record.title,
+            "model": record.model or "llama3-8b-8192",
+            "system_prompt": record.system_prompt,
+            "metadata": record.metadata or {},
+            "is_archived": record.is_archived,
+            "created_at": created_at,
+            "updated_at": _timestamp(record.updated_at) or created_at,
+        })
+        return None
+
+    def _add_message(self, record: ImportedMessage) -> Optional[str]:
+        old_id = record.conversation_id
+        conversation_id = self.ids.get(str(old_id)) if old_id is not None else self.last_conversation
+        if conversation_id is None:
+            return "Message before (or without) its conversation"
+        input_tokens = record.input_tokens or 0
+        output_tokens = record.output_tokens or 0
+        cost = record.cost_usd
+        if cost is None:
+            cost = calculate_cost(record.model, input_tokens, output_tokens) if record.model else 0
+        self.messages.append({
+            "id": str(uuid4()),
+            "conversation_id": conversation_id,
+            "role": record.role,
+            "content": record.content,
+            # None is filled in by the bulk count at flush time
+            "token_count": record.token_count,
+            "input_tokens": input_tokens,
+            "output_tokens": output_tokens,
+            "model": record.model,
+            "finish_reason": record.finish_reason,
+            "latency_ms": record.latency_ms or 0,
+            "cost_usd": cost,
+            "metadata": record.metadata or {},
+            "created_at": _timestamp(record.created_at) or self.now,
+        })
+        return None
+
+    async def flush(self):
+        # Conversations first: the messages reference them
+        if self.conversations:
+            rows, self.conversations = self.conversations, []
+            await db.insert("conversations", rows)
+            self.imported_conversations += len(rows)
+        if self.messages:
+            rows, self.messages = self.messages, []
+            missing = [row for row in rows if row["token_count"] is None]
+            if missing:
+                # CPU-bound; tiktoken releases the GIL, so a thread keeps the loop free
+                counts = await asyncio.to_thread(count_tokens_batch, [row["content"] for row in missing])
+                for row, count in zip(missing, counts):
+                    row["token_count"] = count
+            await db.insert("messages", rows)
+            self.imported_messages += len(rows)
+
+    def result(self) -> dict:
+        return {
+            "conversations": self.imported_conversations,
+            "messages": self.imported_messages,
+            "skipped": self.skipped,
+            "errors": self.errors,
+        }
+
+class ConversationTransfer:
+    @staticmethod
+    async def export_records(user_id: str, include_archived: bool = True) -> AsyncIterator[dict]:
+        """
+        A conversation record followed by its messages, for each of the
+        user's conversations. Both are read in keyset pages, so memory stays
+        flat however much history there is.
+        """
+        filters = {"user_id": user_id}
+        if not include_archived:
+            filters["is_archived"] = False
+        after = None
+        while True:
+            # id order, unlike updated_at, can't shift under the cursor mid-export
+            conversations = await db.select(
+                "conversations",
+                columns=CONVERSATION_COLUMNS,
+                filters=filters,
+                order=["id.asc"],
+                limit=settings.EXPORT_PAGE_SIZE,
+                after=after,
+            )
+            for conversation in conversations:
+                yield {"type": "conversation", **conversation}
+                async for message in ConversationTransfer._export_messages(conversation["id"]):
+                    yield {"type": "message", "conversation_id": conversation["id"], **message}
+            if len(conversations) < settings.EXPORT_PAGE_SIZE:
+                return
+            after = {"id": conversations[-1]["id"]}
+
+    @staticmethod
+    async def _export_messages(conversation_id: str) -> AsyncIterator[dict]:
+        order = MESSAGE_ORDERS["asc"]
+        after = None
+        while True:
+            rows = await db.select(
+                "messages",
+                columns=MESSAGE_COLUMNS,
+                filters={"conversation_id": conversation_id},
+                order=order,
+                limit=settings.EXPORT_PAGE_SIZE,
+                after=after,
+            )
+            for row in rows:
+                yield row
+            if len(rows) < settings.EXPORT_PAGE_SIZE:
+                break
+            after = {"created_at": rows[-1]["created_at"], "id": rows[-1]["id"]}
+        # Rows still queued on the write-behind writer are the newest
+        seen = {row["id"] for row in rows}
+        for row in message_writer.pending_for(conversation_id):
+            if row["id"] not in seen:
+                yield {key: row.get(key) for key in _MESSAGE_KEYS}
+
+    @staticmethod
+    async def export_ndjson(user_id: str, include_archived: bool = True, compress: bool = False) -> AsyncIterator[bytes]:
+        """
+        The export as NDJSON bytes, gzip-compressed on the fly if asked.
+        """
+        gzip = zlib.compressobj(6, zlib.DEFLATED, 31) if compress else None
+        buffer: List[str] = []
+        size = 0
+        async for record in ConversationTransfer.export_records(user_id, include_archived):
+            line = _dumps(record)
+            buffer.append(line)
+            size += len(line)
+            if size >= _CHUNK_BYTES:
+                data = "".join(buffer).encode()
+                buffer, size = [], 0
+                data = gzip.compress(data) if gzip else data
+                if data:
+                    yield data
+        data = "".join(buffer).encode()
+        if gzip:
+            data = gzip.compress(data) + gzip.flush()
+        if data:
+            yield data
+
+    @staticmethod
+    async def import_ndjson(user_id: str, chunks: AsyncIterator[bytes], compressed: bool = False) -> dict:
+        """
+        Import an export (NDJSON, or gzip/zlib-compressed NDJSON) into the
+        user's account as new conversations. Invalid lines are skipped and
+        reported; everything else is inserted IMPORT_BATCH_SIZE rows at a time.
+        """
+        importer = _Importer(user_id)
+        decoder = zlib.decompressobj(47) if compressed else None  # 32 + 15: gzip or zlib header
+        # The unfinished last line; only new data is scanned for newlines, so long lines stay linear
+        pending = bytearray()
+        line = 0
+
+        async def feed(data: bytes):
+            nonlocal line
+            start = 0
+            while True:
+                end = data.find(b"\n", start)
+                if end < 0:
+                    break
+                pending.extend(data[start:end])
+                line += 1
+                await importer.add(line, bytes(pending))
+                pending.clear()
+                start = end + 1
+            pending.extend(data[start:])
+            if len(pending) > _MAX_LINE_BYTES:
+                raise HTTPException(status_code=413, detail=f"Line {line + 1} is too long")
+
+        try:
+            async for chunk in chunks:
+                if decoder is None:
+                    await feed(chunk)
+                    continue
+                while True:
+                    data = decoder.decompress(chunk, _INFLATE_BYTES)
+                    await feed(data)
+                    chunk = decoder.unconsumed_tail
+                    # A full buffer may mean more output is waiting even with no input left
+                    if not chunk and len(data) < _INFLATE_BYTES:
+                        break
+            if decoder is not None:
+                await feed(decoder.flush())
+        except zlib.error:
+            raise HTTPException(status_code=400, detail="Body is not valid gzip")
+        line += 1
+        await importer.add(line, bytes(pending))
+        await importer.flush()
+        logger.info(
+            f"Imported {importer.imported_conversations} conversations and "
+            f"{importer.imported_messages} messages for user {user_id} ({importer.skipped} lines skipped)"
+        )
+        return importer.result()
@@ -1,3 +1,6 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
 from supabase import create_client, Client
 from src.config.settings import settings
 
@@ -9,3 +12,14 @@ def get_supabase_client() -> Client:
 
 # Singleton instance
 supabase: Client = get_supabase_client()
+
+# supabase-py is synchronous; blocking calls go through a bounded pool so they
+# never run on the event loop and can't spawn an unbounded number of threads.
+_executor = ThreadPoolExecutor(max_workers=settings.DB_FALLBACK_THREADS, thread_name_prefix="supabase")
+
+async def run_sync(fn, *args, **kwargs):
+    """
+    Run a blocking supabase-py call in the bounded thread pool.
+    """
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_executor, partial(fn, *args, **kwargs))
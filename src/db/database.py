@@ -0,0 +1,420 @@
+import json
+import logging
+import re
+import time
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from src.config.settings import settings
+from src.db.client import supabase, run_sync
+from src.utils.metrics import DB_QUERY_DURATION, add_timing
+
+try:
+    import asyncpg
+except ImportError:  # pragma: no cover - the supabase fallback still works without it
+    asyncpg = None
+
+logger = logging.getLogger(__name__)
+
+# Filters are a dict of column -> value. A "__op" suffix selects the comparison
+# (PostgREST names), e.g. {"user_id": uid, "created_at__gte": start}. Lists and
+# tuples mean IN, None means IS NULL.
+#
+# Keyset pagination: `after` maps each order column to the values of the last
+# row seen, and only rows strictly after it in the requested order are returned.
+# All order columns must share one direction.
+_OPERATORS = {"eq": "=", "neq": "<>", "lt": "<", "lte": "<=", "gt": ">", "gte": ">="}
+_IDENTIFIER = re.compile(r"^[A-Za-z_][A-Za-z0-9_]*$")
+_SHORT_OFFSET = re.compile(r"([+-]\d{2})$")
+
+
+def _parse_filter_key(key: str) -> Tuple[str, str]:
+    column, _, op = key.partition("__")
+    op = op or "eq"
+    if op not in _OPERATORS and op != "in":
+        raise ValueError(f"Unsupported filter operator: {op}")
+    return column, op
+
+
+def _parse_order(order: Optional[Sequence[str]]) -> List[Tuple[str, bool]]:
+    """
+    Parse PostgREST style ordering ("updated_at.desc") into (column, desc) pairs.
+    """
+    parsed = []
+    for item in order or []:
+        column, _, direction = item.partition(".")
+        parsed.append((column, direction.lower() == "desc"))
+    return parsed
+
+
+def _quote(identifier: str) -> str:
+    if not _IDENTIFIER.match(identifier):
+        raise ValueError(f"Invalid identifier: {identifier!r}")
+    return f'"{identifier}"'
+
+
+def _columns_sql(columns: str) -> str:
+    if columns.strip() == "*":
+        return "*"
+    return ", ".join(_quote(c.strip()) for c in columns.split(","))
+
+
+def _where_sql(filters: Optional[Dict[str, Any]], args: list) -> str:
+    clauses = []
+    for key, value in (filters or {}).items():
+        column, op = _parse_filter_key(key)
+        col = _quote(column)
+        if op == "in" or isinstance(value, (list, tuple, set)):
+            args.append(list(value))
+            clauses.append(f"{col} = ANY(${len(args)})")
+        elif value is None:
+            clauses.append(f"{col} IS NOT NULL" if op == "neq" else f"{col} IS NULL")
+        else:
+            args.append(value)
+            clauses.append(f"{col} {_OPERATORS[op]} ${len(args)}")
+    return f" WHERE {' AND '.join(clauses)}" if clauses else ""
+
+
+def _keyset_direction(order_by: List[Tuple[str, bool]], after: Dict[str, Any]) -> bool:
+    if not order_by or set(after) != {column for column, _ in order_by}:
+        raise ValueError("Keyset pagination needs a value for every order column")
+    directions = {desc for _, desc in order_by}
+    if len(directions) != 1:
+        raise ValueError("Keyset pagination needs all order columns in one direction")
+    return directions.pop()
+
+
+def build_select_sql(
+    table: str,
+    columns: str = "*",
+    filters: Optional[Dict[str, Any]] = None,
+    order: Optional[Sequence[str]] = None,
+    limit: Optional[int] = None,
+    offset: Optional[int] = None,
+    after: Optional[Dict[str, Any]] = None,
+) -> Tuple[str, list]:
+    """
+    Build the parameterized SELECT the asyncpg backend runs for a query.
+    """
+    args: list = []
+    sql = f"SELECT {_columns_sql(columns)} FROM {_quote(table)}"
+    where = _where_sql(filters, args)
+    order_by = _parse_order(order)
+    if after:
+        desc = _keyset_direction(order_by, after)
+        placeholders = []
+        for column, _ in order_by:
+            args.append(after[column])
+            placeholders.append(f"${len(args)}")
+        # Row comparison, so an index on the order columns can seek straight to the cursor
+        keyset = (
+            f"({', '.join(_quote(c) for c, _ in order_by)}) {'<' if desc else '>'} "
+            f"({', '.join(placeholders)})"
+        )
+        where = f"{where} AND {keyset}" if where else f" WHERE {keyset}"
+    sql += where
+    if order_by:
+        sql += " ORDER BY " + ", ".join(f"{_quote(c)} {'DESC' if d else 'ASC'}" for c, d in order_by)
+    if limit is not None:
+        args.append(limit)
+        sql += f" LIMIT ${len(args)}"
+    if offset:
+        args.append(offset)
+        sql += f" OFFSET ${len(args)}"
+    return sql, args
+
+
+def is_data_error(error: Exception) -> bool:
+    """
+    True when the database rejected the rows themselves: SQLSTATE class 22
+    (data exception, e.g. asyncpg.DataError) or 23 (integrity violation,
+    e.g. asyncpg.IntegrityConstraintViolationError). Retrying the same
+    statement can't succeed. PostgREST errors carry the SQLSTATE as `code`.
+    """
+    code = getattr(error, "sqlstate", None) or getattr(error, "code", None)
+    return isinstance(code, str) and code[:2] in ("22", "23")
+
+
+def _encode_text(value: Any) -> str:
+    return value.isoformat() if hasattr(value, "isoformat") else str(value)
+
+
+def _decode_timestamp(value: str) -> str:
+    # Match PostgREST's output ("2024-05-01T10:00:00.123+00:00") so rows look
+    # the same whichever backend produced them.
+    return _SHORT_OFFSET.sub(r"\1:00", value.replace(" ", "T", 1))
+
+
+class DatabaseBackend:
+    """
+    Table-level data access used by the services. All methods return plain
+    dicts with JSON-friendly values (ids and timestamps as strings).
+    """
+    name = "base"
+
+    async def connect(self):
+        pass
+
+    async def close(self):
+        pass
+
+    async def select(self, table: str, columns: str = "*", filters=None, order=None, limit=None, offset=None, after=None) -> List[dict]:
+        raise NotImplementedError
+
+    async def insert(self, table: str, rows: List[dict]) -> List[dict]:
+        raise NotImplementedError
+
+    async def update(self, table: str, values: dict, filters) -> List[dict]:
+        raise NotImplementedError
+
+    async def delete(self, table: str, filters) -> List[dict]:
+        raise NotImplementedError
+
+    async def count(self, table: str, filters=None) -> int:
+        raise NotImplementedError
+
+    async def rpc(self, function: str, params: Optional[dict] = None) -> List[dict]:
+        raise NotImplementedError
+
+
+class AsyncpgBackend(DatabaseBackend):
+    """
+    Native async access to Postgres through an asyncpg connection pool.
+    """
+    name = "asyncpg"
+
+    def __init__(self, dsn: str):
+        self.dsn = dsn
+        self.pool = None
+
+    @staticmethod
+    async def _init_connection(conn):
+        for typename in ("json", "jsonb"):
+            await conn.set_type_codec(typename, encoder=json.dumps, decoder=json.loads, schema="pg_catalog")
+        await conn.set_type_codec("uuid", encoder=_encode_text, decoder=str, schema="pg_catalog", format="text")
+        await conn.set_type_codec("date", encoder=_encode_text, decoder=str, schema="pg_catalog", format="text")
+        for typename in ("timestamp", "timestamptz"):
+            await conn.set_type_codec(typename, encoder=_encode_text, decoder=_decode_timestamp, schema="pg_catalog", format="text")
+
+    async def connect(self):
+        self.pool = await asyncpg.create_pool(
+            self.dsn,
+            min_size=settings.DB_POOL_MIN_SIZE,
+            max_size=settings.DB_POOL_MAX_SIZE,
+            command_timeout=settings.DB_COMMAND_TIMEOUT,
+            statement_cache_size=settings.DB_STATEMENT_CACHE_SIZE,
+            server_settings={"TimeZone": "UTC", "DateStyle": "ISO"},
+            init=self._init_connection,
+        )
+
+    async def close(self):
+        if self.pool is not None:
+            await self.pool.close()
+            self.pool = None
+
+    async def _fetch(self, sql: str, args: list) -> List[dict]:
+        rows = await self.pool.fetch(sql, *args)
+        return [dict(row) for row in rows]
+
+    async def select(self, table, columns="*", filters=None, order=None, limit=None, offset=None, after=None):
+        sql, args = build_select_sql(table, columns, filters, order, limit, offset, after)
+        return await self._fetch(sql, args)
+
+    async def insert(self, table, rows):
+        if not rows:
+            return []
+        columns = list(dict.fromkeys(key for row in rows for key in row))
+        args: list = []
+        values = []
+        for row in rows:
+            placeholders = []
+            for column in columns:
+                if column in row:
+                    args.append(row[column])
+                    placeholders.append(f"${len(args)}")
+                else:
+                    placeholders.append("DEFAULT")
+            values.append(f"({', '.join(placeholders)})")
+        sql = (
+            f"INSERT INTO {_quote(table)} ({', '.join(_quote(c) for c in columns)}) "
+            f"VALUES {', '.join(values)} RETURNING *"
+        )
+        return await self._fetch(sql, args)
+
+    async def update(self, table, values, filters):
+        args: list = []
+        assignments = []
+        for column, value in values.items():
+            args.append(value)
+            assignments.append(f"{_quote(column)} = ${len(args)}")
+        sql = f"UPDATE {_quote(table)} SET {', '.join(assignments)}{_where_sql(filters, args)} RETURNING *"
+        return await self._fetch(sql, args)
+
+    async def delete(self, table, filters):
+        args: list = []
+        sql = f"DELETE FROM {_quote(table)}{_where_sql(filters, args)} RETURNING *"
+        return await self._fetch(sql, args)
+
+    async def count(self, table, filters=None):
+        args: list = []
+        sql = f"SELECT count(*) FROM {_quote(table)}{_where_sql(filters, args)}"
+        return await self.pool.fetchval(sql, *args)
+
+    async def rpc(self, function, params=None):
+        args: list = []
+        named = []
+        for name, value in (params or {}).items():
+            args.append(value)
+            named.append(f"{_quote(name)} => ${len(args)}")
+        sql = f"SELECT * FROM {_quote(function)}({', '.join(named)})"
+        return await self._fetch(sql, args)
+
+
+class SupabaseBackend(DatabaseBackend):
+    """
+    Fallback that runs the synchronous supabase-py client in the bounded
+    thread pool from src.db.client, so PostgREST calls never block the loop.
+    """
+    name = "supabase"
+
+    @staticmethod
+    def _format(value: Any) -> Any:
+        return value.isoformat() if hasattr(value, "isoformat") else value
+
+    @classmethod
+    def _apply_filters(cls, query, filters):
+        for key, value in (filters or {}).items():
+            column, op = _parse_filter_key(key)
+            if op == "in" or isinstance(value, (list, tuple, set)):
+                query = query.in_(column, [cls._format(v) for v in value])
+            elif value is None:
+                query = query.not_.is_(column, "null") if op == "neq" else query.is_(column, "null")
+            else:
+                query = getattr(query, op)(column, cls._format(value))
+        return query
+
+    @staticmethod
+    async def _execute(build):
+        return await run_sync(lambda: build().execute())
+
+    @classmethod
+    def _keyset_filter(cls, order_by: List[Tuple[str, bool]], after: Dict[str, Any]) -> str:
+        # PostgREST has no row comparison, so expand (a, b) < (x, y) into
+        # a.lt.x OR (a.eq.x AND b.lt.y)
+        op = "lt" if _keyset_direction(order_by, after) else "gt"
+
+        def literal(value):
+            text = str(cls._format(value)).replace("\\", "\\\\").replace('"', '\\"')
+            return f'"{text}"'
+
+        branches = []
+        for i, (column, _) in enumerate(order_by):
+            terms = [f"{c}.eq.{literal(after[c])}" for c, _ in order_by[:i]]
+            terms.append(f"{column}.{op}.{literal(after[column])}")
+            branches.append(terms[0] if len(terms) == 1 else f"and({','.join(terms)})")
+        return ",".join(branches)
+
+    async def select(self, table, columns="*", filters=None, order=None, limit=None, offset=None, after=None):
+        def build():
+            query = self._apply_filters(supabase.table(table).select(columns), filters)
+            order_by = _parse_order(order)
+            if after:
+                query = query.or_(self._keyset_filter(order_by, after))
+            for column, desc in order_by:
+                query = query.order(column, desc=desc)
+            if limit is not None:
+                start = offset or 0
+                query = query.range(start, start + limit - 1)
+            return query
+
+        return (await self._execute(build)).data
+
+    async def insert(self, table, rows):
+        if not rows:
+            return []
+        payload = [{k: self._format(v) for k, v in row.items()} for row in rows]
+        return (await self._execute(lambda: supabase.table(table).insert(payload))).data
+
+    async def update(self, table, values, filters):
+        payload = {k: self._format(v) for k, v in values.items()}
+        return (await self._execute(lambda: self._apply_filters(supabase.table(table).update(payload), filters))).data
+
+    async def delete(self, table, filters):
+        return (await self._execute(lambda: self._apply_filters(supabase.table(table).delete(), filters))).data
+
+    async def count(self, table, filters=None):
+        response = await self._execute(
+            lambda: self._apply_filters(supabase.table(table).select("id", count="exact", head=True), filters)
+        )
+        return response.count or 0
+
+    async def rpc(self, function, params=None):
+        payload = {k: self._format(v) for k, v in (params or {}).items()}
+        return (await self._execute(lambda: supabase.rpc(function, payload))).data
+
+
+class Database:
+    """
+    Process-wide entry point for data access. The backend is chosen in the app
+    lifespan: an asyncpg pool on SUPABASE_DB_URL, falling back to the threaded
+    supabase-py adapter when asyncpg is unavailable or the pool can't connect.
+    """
+
+    def __init__(self):
+        self.backend: Optional[DatabaseBackend] = None
+
+    async def connect(self):
+        backend: Optional[DatabaseBackend] = None
+        if settings.DB_BACKEND == "asyncpg":
+            if asyncpg is None:
+                logger.warning("asyncpg is not installed; falling back to the supabase client.")
+            else:
+                try:
+                    backend = AsyncpgBackend(settings.SUPABASE_DB_URL)
+                    await backend.connect()
+                except Exception as e:
+                    logger.error(f"Could not open asyncpg pool ({e}); falling back to the supabase client.")
+                    backend = None
+        self.backend = backend or SupabaseBackend()
+        logger.info(f"Database backend: {self.backend.name}")
+
+    async def close(self):
+        if self.backend is not None:
+            await self.backend.close()
+            self.backend = None
+
+    def _get_backend(self) -> DatabaseBackend:
+        # Scripts and tests that never run the lifespan still get a working backend.
+        if self.backend is None:
+            self.backend = SupabaseBackend()
+        return self.backend
+
+    async def _timed(self, table: str, operation: str, call):
+        start = time.perf_counter()
+        try:
+            return await call
+        finally:
+            elapsed = time.perf_counter() - start
+            DB_QUERY_DURATION.labels(table, operation).observe(elapsed)
+            add_timing("db", elapsed)
+
+    async def select(self, table: str, columns: str = "*", filters=None, order=None, limit=None, offset=None, after=None) -> List[dict]:
+        return await self._timed(table, "select", self._get_backend().select(table, columns, filters, order, limit, offset, after))
+
+    async def insert(self, table: str, rows: List[dict]) -> List[dict]:
+        return await self._timed(table, "insert", self._get_backend().insert(table, rows))
+
+    async def update(self, table: str, values: dict, filters) -> List[dict]:
+        return await self._timed(table, "update", self._get_backend().update(table, values, filters))
+
+    async def delete(self, table: str, filters) -> List[dict]:
+        return await self._timed(table, "delete", self._get_backend().delete(table, filters))
+
+    async def count(self, table: str, filters=None) -> int:
+        return await self._timed(table, "count", self._get_backend().count(table, filters))
+
+    async def rpc(self, function: str, params: Optional[dict] = None) -> List[dict]:
+        return await self._timed(function, "rpc", self._get_backend().rpc(function, params))
+
+
+# Singleton instance
+db = Database()
@@ -0,0 +1,250 @@
+"""
+Versioned schema migrations for the Postgres behind SUPABASE_DB_URL.
+
+    python -m src.db.migrations status           # applied / pending
+    python -m src.db.migrations up               # apply pending migrations
+    python -m src.db.migrations check            # EXPLAIN the hot service queries
+    python -m src.db.migrations up --dsn postgresql://localhost/conversations
+
+Migrations are database/migrations/NNNN_name.sql, applied in version order
+and recorded in schema_migrations. Each one runs in its own transaction,
+unless its first line is "-- migrate: no-transaction": then its statements
+run one at a time, which CREATE/DROP INDEX CONCURRENTLY and procedures that
+COMMIT need. Statements in those files end with ";" at the end of a line;
+$$-quoted bodies are kept whole. A session advisory lock keeps two deploys
+from migrating at once.
+"""
+import argparse
+import asyncio
+import hashlib
+import json
+import re
+import time
+import uuid
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Dict, List
+
+import asyncpg
+
+from src.config.settings import settings
+from src.db.database import AsyncpgBackend, build_select_sql
+
+MIGRATIONS_DIR = Path(__file__).resolve().parents[2] / "database" / "migrations"
+NO_TRANSACTION = "-- migrate: no-transaction"
+# Arbitrary, but fixed: every runner must use the same key
+ADVISORY_LOCK_KEY = 7_201_004_231
+
+_FILENAME = re.compile(r"^(\d{4})_([a-z0-9_]+)\.sql$")
+_CONCURRENT_INDEX = re.compile(r"CREATE\s+(?:UNIQUE\s+)?INDEX\s+CONCURRENTLY\s+(?:IF\s+NOT\s+EXISTS\s+)?(\w+)", re.IGNORECASE)
+
+@dataclass
+class Migration:
+    version: int
+    name: str
+    path: Path
+
+    @property
+    def sql(self) -> str:
+        return self.path.read_text(encoding="utf-8")
+
+    @property
+    def checksum(self) -> str:
+        return hashlib.sha256(self.sql.encode()).hexdigest()
+
+    @property
+    def transactional(self) -> bool:
+        return not self.sql.lstrip().startswith(NO_TRANSACTION)
+
+    def statements(self) -> List[str]:
+        """
+        Split a no-transaction file on lines ending in ";" outside $$ bodies
+        (comment lines dropped).
+        """
+        statements, current = [], []
+        in_body = False
+        for line in self.sql.splitlines():
+            if not in_body and (line.strip().startswith("--") or not line.strip()):
+                continue
+            current.append(line)
+            if line.count("$$") % 2:
+                in_body = not in_body
+            if not in_body and line.rstrip().endswith(";"):
+                statements.append("\n".join(current))
+                current = []
+        if current:
+            statements.append("\n".join(current))
+        return statements
+
+def discover(directory: Path = MIGRATIONS_DIR) -> List[Migration]:
+    migrations = []
+    for path in sorted(directory.glob("*.sql")):
+        match = _FILENAME.match(path.name)
+        if not match:
+            raise ValueError(f"Bad migration file name {path.name!r} (want NNNN_name.sql)")
+        migrations.append(Migration(int(match.group(1)), match.group(2), path))
+    versions = [m.version for m in migrations]
+    if len(set(versions)) != len(versions):
+        raise ValueError("Two migrations share a version number")
+    return migrations
+
+async def _ensure_table(conn):
+    await conn.execute("""
+        CREATE TABLE IF NOT EXISTS schema_migrations (
+            version INT PRIMARY KEY,
+            name TEXT NOT NULL,
+            checksum TEXT NOT NULL,
+            duration_ms INT NOT NULL DEFAULT 0,
+            applied_at TIMESTAMPTZ NOT NULL DEFAULT NOW()
+        )
+    """)
+
+async def applied_migrations(conn) -> Dict[int, dict]:
+    await _ensure_table(conn)
+    rows = await conn.fetch("SELECT version, name, checksum, applied_at FROM schema_migrations")
+    return {row["version"]: dict(row) for row in rows}
+
+async def _drop_invalid_indexes(conn, names: List[str]):
+    # A failed CONCURRENTLY build leaves an INVALID index that IF NOT EXISTS would skip
+    invalid = await conn.fetch(
+        "SELECT c.relname FROM pg_index i JOIN pg_class c ON c.oid = i.indexrelid "
+        "WHERE NOT i.indisvalid AND c.relname = ANY($1::text[])",
+        names,
+    )
+    for row in invalid:
+        print(f"  dropping invalid index {row['relname']} from an earlier failed build")
+        await conn.execute(f'DROP INDEX CONCURRENTLY IF EXISTS "{row["relname"]}"')
+
+async def apply(conn, migration: Migration):
+    start = time.perf_counter()
+    if migration.transactional:
+        async with conn.transaction():
+            await conn.execute(migration.sql)
+            await _record(conn, migration, start)
+        return
+    await _drop_invalid_indexes(conn, _CONCURRENT_INDEX.findall(migration.sql))
+    for statement in migration.statements():
+        await conn.execute(statement)
+    await _record(conn, migration, start)
+
+async def _record(conn, migration: Migration, start: float):
+    await conn.execute(
+        "INSERT INTO schema_migrations (version, name, checksum, duration_ms) VALUES ($1, $2, $3, $4)",
+        migration.version, migration.name, migration.checksum, int((time.perf_counter() - start) * 1000),
+    )
+
+async def migrate(dsn: str, dry_run: bool = False) -> List[Migration]:
+    """
+    Apply pending migrations in order; returns the ones applied (or that
+    would be, with dry_run).
+    """
+    migrations = discover()
+    conn = await asyncpg.connect(dsn, statement_cache_size=0)
+    try:
+        # Waits for another runner to finish (before lock_timeout applies)
+        await conn.execute("SELECT pg_advisory_lock($1)", ADVISORY_LOCK_KEY)
+        # Don't queue behind (and in front of) live traffic for long on a table lock
+        await conn.execute(f"SET lock_timeout = {int(settings.MIGRATION_LOCK_TIMEOUT_MS)}")
+        try:
+            applied = await applied_migrations(conn)
+            for migration in migrations:
+                done = applied.get(migration.version)
+                if done and done["checksum"] != migration.checksum:
+                    print(f"warning: {migration.path.name} changed after it was applied on {done['applied_at']:%Y-%m-%d}")
+            pending = [m for m in migrations if m.version not in applied]
+            for migration in pending:
+                print(f"{'would apply' if dry_run else 'applying'} {migration.path.name}")
+                if not dry_run:
+                    await apply(conn, migration)
+            return pending
+        finally:
+            await conn.execute("SELECT pg_advisory_unlock($1)", ADVISORY_LOCK_KEY)
+    finally:
+        await conn.close()
+
+async def status(dsn: str):
+    conn = await asyncpg.connect(dsn, statement_cache_size=0)
+    try:
+        applied = await applied_migrations(conn)
+    finally:
+        await conn.close()
+    for migration in discover():
+        done = applied.get(migration.version)
+        state = f"applied {done['applied_at']:%Y-%m-%d %H:%M}" if done else "pending"
+        if done and done["checksum"] != migration.checksum:
+            state += " (file changed since)"
+        print(f"{migration.path.name:45} {state}")
+
+def hot_queries() -> Dict[str, tuple]:
+    """
+    The service queries each index exists for, built exactly as the data
+    layer builds them, with (name of the index expected to serve it, sql, args).
+    """
+    from src.conversations.service import CONVERSATION_ORDER
+    from src.messages.service import MESSAGE_COLUMNS, MESSAGE_ORDERS
+
+    some_id = str(uuid.uuid4())
+    now = datetime.now(timezone.utc)
+    cursor_at = {"created_at": now, "id": some_id}
+    return {
+        "messages page (asc, keyset)": ("idx_messages_conversation_created_at_id", *build_select_sql(
+            "messages", MESSAGE_COLUMNS, {"conversation_id": some_id}, MESSAGE_ORDERS["asc"], 51, after=cursor_at)),
+        "history / scroll back (desc)": ("idx_messages_conversation_created_at_id", *build_select_sql(
+            "messages", "id, role, content, token_count, created_at", {"conversation_id": some_id}, MESSAGE_ORDERS["desc"], 20)),
+        "conversation list (keyset)": ("idx_conversations_user_updated_at_id", *build_select_sql(
+            "conversations", "*", {"user_id": some_id}, CONVERSATION_ORDER, 21, after={"updated_at": now, "id": some_id})),
+        "active conversation list": ("idx_conversations_user_active_updated_at_id", *build_select_sql(
+            "conversations", "*", {"user_id": some_id, "is_archived": False}, CONVERSATION_ORDER, 21)),
+    }
+
+def _plan_nodes(plan: dict):
+    yield plan
+    for child in plan.get("Plans", []):
+        yield from _plan_nodes(child)
+
+async def check_plans(dsn: str) -> bool:
+    """
+    EXPLAIN each hot query and flag plans that sort or don't use the expected
+    index. Sequential scans are disabled for the session, so an empty local
+    database still shows which index the planner can use.
+    """
+    conn = await asyncpg.connect(dsn, statement_cache_size=0)
+    ok = True
+    try:
+        await AsyncpgBackend._init_connection(conn)
+        await conn.execute("SET enable_seqscan = off")
+        for label, (index, sql, args) in hot_queries().items():
+            raw = await conn.fetchval(f"EXPLAIN (FORMAT JSON) {sql}", *args)
+            plan = (json.loads(raw) if isinstance(raw, str) else raw)[0]["Plan"]
+            nodes = list(_plan_nodes(plan))
+            problems = []
+            if any(node["Node Type"] in ("Sort", "Incremental Sort") for node in nodes):
+                problems.append("sorts")
+            if not any(node.get("Index Name") == index for node in nodes):
+                used = sorted({node["Index Name"] for node in nodes if node.get("Index Name")}) or ["no index"]
+                problems.append(f"uses {', '.join(used)} instead of {index}")
+            ok = ok and not problems
+            print(f"{'FAIL' if problems else 'ok  '} {label}: {'; '.join(problems) or index}")
+    finally:
+        await conn.close()
+    return ok
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("command", choices=["status", "up", "check"])
+    parser.add_argument("--dsn", help="Postgres URL (defaults to SUPABASE_DB_URL)")
+    parser.add_argument("--dry-run", action="store_true", help="With up: list pending migrations without applying them")
+    args = parser.parse_args()
+    dsn = args.dsn or settings.SUPABASE_DB_URL
+
+    if args.command == "status":
+        asyncio.run(status(dsn))
+    elif args.command == "up":
+        applied = asyncio.run(migrate(dsn, args.dry_run))
+        print(f"{len(applied)} migration(s) {'pending' if args.dry_run else 'applied'}")
+    else:
+        raise SystemExit(0 if asyncio.run(check_plans(dsn)) else 1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,148 @@
+import asyncio
+import heapq
+import itertools
+import logging
+from typing import Dict, List, Optional, Tuple
+
+from src.config.settings import settings
+
+logger = logging.getLogger(__name__)
+
+# Lower runs first
+PRIORITIES = {"interactive": 0, "batch": 1}
+
+class Ticket:
+    """
+    A claim on one upstream stream slot. granted is resolved once the slot
+    is ours; release() must be called when the stream ends (or to give up
+    a place in the queue).
+    """
+
+    def __init__(self, pool: "_Pool", priority: int):
+        self.pool = pool
+        self.priority = priority
+        self.granted = asyncio.get_running_loop().create_future()
+        self.released = False
+
+    @property
+    def position(self) -> int:
+        """
+        Waiters that will be served before this one.
+        """
+        return sum(1 for _, _, other in self.pool.waiting if not other.released and other is not self and other.priority <= self.priority)
+
+    async def wait(self, timeout: float) -> bool:
+        """
+        Wait for the slot; False (and out of the queue) if the deadline passes.
+        """
+        try:
+            await asyncio.wait_for(asyncio.shield(self.granted), timeout)
+            return True
+        except asyncio.TimeoutError:
+            self.release()
+            return False
+        except asyncio.CancelledError:
+            self.release()
+            raise
+
+    def release(self):
+        if self.released:
+            return
+        self.released = True
+        if self.granted.done():
+            self.pool.active -= 1
+            self.pool.grant_next()
+        else:
+            # Lazily dropped from the heap when it reaches the top
+            self.granted.cancel()
+
+class _Pool:
+    def __init__(self, limit: int):
+        self.limit = limit
+        self.active = 0
+        self.waiting: List[Tuple[int, int, Ticket]] = []
+        self._seq = itertools.count()
+
+    def queued(self) -> int:
+        return sum(1 for _, _, ticket in self.waiting if not ticket.released)
+
+    def enqueue(self, ticket: Ticket):
+        heapq.heappush(self.waiting, (ticket.priority, next(self._seq), ticket))
+        self.grant_next()
+
+    def grant_next(self):
+        while self.waiting and self.active < self.limit:
+            _, _, ticket = heapq.heappop(self.waiting)
+            if ticket.released:
+                continue
+            self.active += 1
+            ticket.granted.set_result(True)
+
+class AdmissionController:
+    """
+    Bounds concurrent upstream streams per (provider, model). Requests over
+    the limit wait in a priority queue (interactive before batch) until a
+    slot frees up or their deadline passes. The limit comes from
+    LLM_CONCURRENCY_LIMITS ("provider:model" or "provider") and defaults to
+    LLM_MAX_CONCURRENT_STREAMS.
+    """
+
+    def __init__(self):
+        self._pools: Dict[Tuple[str, str], _Pool] = {}
+        self.rejected = 0
+        self.timed_out = 0
+
+    @staticmethod
+    def limit_for(provider: str, model: str) -> int:
+        limits = settings.LLM_CONCURRENCY_LIMITS
+        return limits.get(f"{provider}:{model}", limits.get(provider, settings.LLM_MAX_CONCURRENT_STREAMS))
+
+    def _pool(self, provider: str, model: str) -> _Pool:
+        key = (provider, model)
+        pool = self._pools.get(key)
+        if pool is None:
+            pool = self._pools[key] = _Pool(self.limit_for(provider, model))
+        return pool
+
+    def has_capacity(self, provider: str, model: str) -> bool:
+        pool = self._pool(provider, model)
+        return pool.active < pool.limit and not pool.queued()
+
+    def try_acquire(self, provider: str, model: str, priority: str = "interactive") -> Optional[Ticket]:
+        """
+        A granted ticket if a slot is free right now, else None.
+        """
+        if not self.has_capacity(provider, model):
+            return None
+        return self.request(provider, model, priority)
+
+    def request(self, provider: str, model: str, priority: str = "interactive") -> Optional[Ticket]:
+        """
+        A ticket that is granted now or queued; None if the queue is full.
+        """
+        pool = self._pool(provider, model)
+        if pool.active >= pool.limit and pool.queued() >= settings.LLM_MAX_QUEUE_SIZE:
+            self.rejected += 1
+            return None
+        ticket = Ticket(pool, PRIORITIES.get(priority, PRIORITIES["interactive"]))
+        pool.enqueue(ticket)
+        return ticket
+
+    def stats(self) -> Dict[str, dict]:
+        return {
+            f"{provider}:{model}": {"active": pool.active, "limit": pool.limit, "queued": pool.queued()}
+            for (provider, model), pool in self._pools.items()
+        }
+
+def overloaded_chunk() -> dict:
+    # "overloaded" tells our own refusal apart from a provider's 503
+    return {
+        "error": "Too many concurrent requests, please retry shortly",
+        "status_code": 503,
+        "retryable": False,
+        "retry_after": settings.LLM_QUEUE_RETRY_AFTER_SECONDS,
+        "overloaded": True,
+    }
+
+# Singleton instance
+admission = AdmissionController()
@@ -3,35 +3,67 @@ import json
 import logging
 from typing import AsyncGenerator, List, Dict, Any, Optional
 from src.config.settings import settings
+from src.llm.http import get_http_client
 
 logger = logging.getLogger(__name__)
 
 class LLMClient:
+    """
+    Yields chunks as dicts: {"content", "finish_reason"} for text, {"error"} on
+    failure. Layers may add keys (e.g. "cached"). Extra keyword options are
+    per-request hints for those layers and are ignored by providers.
+    """
     async def stream_chat(
         self, 
         messages: List[Dict[str, str]], 
         model: str, 
         temperature: float = 0.7,
-        max_tokens: Optional[int] = None
-    ) -> AsyncGenerator[str, None]:
+        max_tokens: Optional[int] = None,
+        **options: Any
+    ) -> AsyncGenerator[Dict[str, Any], None]:
         raise NotImplementedError
 
-class GroqClient(LLMClient):
-    def __init__(self):
-        self.api_key = settings.GROQ_API_KEY
-        self.base_url = "https://api.groq.com/openai/v1/chat/completions"
+    def warmup_targets(self) -> Dict[str, Dict[str, str]]:
+        """
+        URLs (with headers) worth calling at startup to pre-open connections.
+        """
+        return {}
+
+def _retry_after(response: httpx.Response) -> Optional[float]:
+    try:
+        return float(response.headers["retry-after"])
+    except (KeyError, ValueError):
+        return None
+
+class OpenAICompatibleClient(LLMClient):
+    """
+    Any provider speaking the OpenAI chat completions streaming protocol.
+    Error chunks carry "status_code" (None for connection errors) and
+    "retryable", so the router can fail over before the first token.
+    """
+    name = "openai-compatible"
+
+    def __init__(self, base_url: str, api_key: Optional[str], name: Optional[str] = None):
+        self.name = name or self.name
+        self.api_key = api_key
+        self.root_url = base_url.rstrip("/")
+        self.base_url = f"{self.root_url}/chat/completions"
         if not self.api_key:
-            logger.warning("GROQ_API_KEY is not set. LLM features will not work.")
+            logger.warning(f"No API key set for {self.name}. LLM features will not work.")
+
+    def warmup_targets(self) -> Dict[str, Dict[str, str]]:
+        return {f"{self.root_url}/models": {"Authorization": f"Bearer {self.api_key}"}}
 
     async def stream_chat(
         self, 
         messages: List[Dict[str, str]], 
         model: str, 
         temperature: float = 0.7, 
-        max_tokens: Optional[int] = None
+        max_tokens: Optional[int] = None,
+        **options: Any
     ) -> AsyncGenerator[Dict[str, Any], None]:
         """
-        Yields chunks of the response from Groq API.
+        Yields chunks of the response from the provider.
         """
         headers = {
             "Authorization": f"Bearer {self.api_key}",
@@ -47,37 +79,70 @@ class GroqClient(LLMClient):
         if max_tokens:
             payload["max_tokens"] = max_tokens
 
-        async with httpx.AsyncClient() as client:
+        client = get_http_client()
+        try:
+            request = client.build_request("POST", self.base_url, headers=headers, json=payload)
+            response = await client.send(request, stream=True)
+            # Closed explicitly (also on cancel or an abandoned generator) so the
+            # connection drops and the provider stops generating right away
             try:
-                async with client.stream("POST", self.base_url, headers=headers, json=payload, timeout=60.0) as response:
-                    if response.status_code != 200:
-                        error_text = await response.aread()
-                        logger.error(f"Groq API Error: {response.status_code} - {error_text}")
-                        yield {"error": f"Provider returned {response.status_code}"}
-                        return
-
-                    async for line in response.aiter_lines():
-                        if line.startswith("data: "):
-                            data_str = line[6:]
-                            if data_str.strip() == "[DONE]":
-                                break
-                            try:
-                                data = json.loads(data_str)
-                                delta = data["choices"][0]["delta"]
-                                content = delta.get("content", "")
-                                if content:
-                                    yield {"content": content, "finish_reason": None}
-                                finish_reason = data["choices"][0].get("finish_reason")
-                                if finish_reason:
-                                     yield {"content": "", "finish_reason": finish_reason}
-                                     
-                            except json.JSONDecodeError:
-                                continue
-            except httpx.RequestError as e:
-                logger.error(f"Request error: {e}")
-                yield {"error": str(e)}
+                if response.status_code != 200:
+                    error_text = await response.aread()
+                    logger.error(f"{self.name} API Error: {response.status_code} - {error_text}")
+                    yield {
+                        "error": f"Provider returned {response.status_code}",
+                        "status_code": response.status_code,
+                        "retryable": response.status_code == 429 or response.status_code >= 500,
+                        "retry_after": _retry_after(response),
+                    }
+                    return
+
+                async for line in response.aiter_lines():
+                    if line.startswith("data: "):
+                        data_str = line[6:]
+                        if data_str.strip() == "[DONE]":
+                            break
+                        try:
+                            data = json.loads(data_str)
+                            delta = data["choices"][0]["delta"]
+                            content = delta.get("content", "")
+                            if content:
+                                yield {"content": content, "finish_reason": None}
+                            finish_reason = data["choices"][0].get("finish_reason")
+                            if finish_reason:
+                                 yield {"content": "", "finish_reason": finish_reason}
+                             
+                        except json.JSONDecodeError:
+                            continue
+            finally:
+                await response.aclose()
+        except httpx.RequestError as e:
+            logger.error(f"{self.name} request error: {e}")
+            yield {"error": str(e), "status_code": None, "retryable": True}
+
+class GroqClient(OpenAICompatibleClient):
+    name = "groq"
+
+    def __init__(self):
+        super().__init__(settings.GROQ_BASE_URL, settings.GROQ_API_KEY)
+
+class OpenAIClient(OpenAICompatibleClient):
+    name = "openai"
+
+    def __init__(self):
+        super().__init__(settings.OPENAI_BASE_URL, settings.OPENAI_API_KEY)
+
+_llm_client: Optional[LLMClient] = None
 
 # Factory to get client
 def get_llm_client() -> LLMClient:
-    # We can switch providers here based on config or model name
-    return GroqClient()
+    # Providers are picked per model by the router (LLM_MODEL_ROUTES).
+    # Clients are stateless apart from the shared HTTP pool and router stats, so one instance per process is enough.
+    global _llm_client
+    if _llm_client is None:
+        from src.llm.coalescing import CoalescingLLMClient
+        from src.llm.response_cache import CachingLLMClient
+        from src.llm.router import build_router
+        # Cache hits never reach a provider; misses share in-flight calls
+        _llm_client = CachingLLMClient(CoalescingLLMClient(build_router()))
+    return _llm_client
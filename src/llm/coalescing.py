@@ -0,0 +1,68 @@
+import logging
+from typing import Any, AsyncGenerator, Dict, List, Optional
+
+from src.config.settings import settings
+from src.llm.client import LLMClient
+from src.llm.response_cache import request_key
+from src.utils.broadcast import BroadcastCancelled, ReplayBroadcast
+
+logger = logging.getLogger(__name__)
+
+class CoalescingLLMClient(LLMClient):
+    """
+    Shares one upstream stream between concurrent identical requests (same
+    key as the response cache). Every subscriber gets every chunk; one that
+    joins late is replayed what was already sent. The upstream call is
+    cancelled once all subscribers have gone. Pass coalesce=False to opt out.
+    """
+
+    def __init__(self, inner: LLMClient):
+        self.inner = inner
+        self._inflight: Dict[str, ReplayBroadcast] = {}
+        self.started = 0
+        self.joined = 0
+
+    def warmup_targets(self):
+        return self.inner.warmup_targets()
+
+    def __len__(self) -> int:
+        return len(self._inflight)
+
+    async def stream_chat(
+        self,
+        messages: List[Dict[str, str]],
+        model: str,
+        temperature: float = 0.7,
+        max_tokens: Optional[int] = None,
+        coalesce: Optional[bool] = None,
+        **options: Any
+    ) -> AsyncGenerator[Dict[str, Any], None]:
+        if not settings.LLM_COALESCE_REQUESTS or coalesce is False:
+            async for chunk in self.inner.stream_chat(messages, model, temperature, max_tokens, **options):
+                yield chunk
+            return
+
+        key = request_key(messages, model, temperature, max_tokens)
+        broadcast = self._inflight.get(key)
+        if broadcast is not None and broadcast.joinable:
+            self.joined += 1
+            logger.debug(f"Joining in-flight request {key[:12]} ({len(broadcast.items)} chunks to replay)")
+        else:
+            broadcast = ReplayBroadcast(
+                self.inner.stream_chat(messages, model, temperature, max_tokens, **options),
+                on_done=lambda: self._forget(key, broadcast),
+            )
+            self._inflight[key] = broadcast
+            self.started += 1
+
+        try:
+            async for chunk in broadcast.subscribe():
+                yield chunk
+        except BroadcastCancelled:
+            # The shared upstream stream was stopped under us (shutdown)
+            yield {"error": "Upstream request was cancelled", "status_code": None, "retryable": False}
+
+    def _forget(self, key: str, broadcast: ReplayBroadcast):
+        # A newer broadcast may have taken the key after this one was abandoned
+        if self._inflight.get(key) is broadcast:
+            del self._inflight[key]
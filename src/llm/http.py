@@ -0,0 +1,63 @@
+import logging
+from typing import Optional
+
+import httpx
+
+from src.config.settings import settings
+
+logger = logging.getLogger(__name__)
+
+# One pooled client per process, shared by every provider. Created in the app
+# lifespan so connections (and HTTP/2 streams) are reused across requests.
+_http_client: Optional[httpx.AsyncClient] = None
+
+
+def _build_client() -> httpx.AsyncClient:
+    return httpx.AsyncClient(
+        http2=settings.LLM_HTTP2,
+        limits=httpx.Limits(
+            max_connections=settings.LLM_MAX_CONNECTIONS,
+            max_keepalive_connections=settings.LLM_MAX_KEEPALIVE_CONNECTIONS,
+            keepalive_expiry=settings.LLM_KEEPALIVE_EXPIRY,
+        ),
+        timeout=httpx.Timeout(
+            connect=settings.LLM_CONNECT_TIMEOUT,
+            read=settings.LLM_READ_TIMEOUT,
+            write=settings.LLM_WRITE_TIMEOUT,
+            pool=settings.LLM_POOL_TIMEOUT,
+        ),
+    )
+
+
+def get_http_client() -> httpx.AsyncClient:
+    """
+    Return the shared provider HTTP client, creating it lazily if the
+    lifespan hasn't (scripts, tests).
+    """
+    global _http_client
+    if _http_client is None or _http_client.is_closed:
+        _http_client = _build_client()
+    return _http_client
+
+
+async def init_http_client(warmup_urls: Optional[dict] = None):
+    """
+    Create the shared client and optionally warm up provider connections.
+    warmup_urls maps a URL to the headers needed to call it.
+    """
+    client = get_http_client()
+    if settings.LLM_WARMUP:
+        for url, headers in (warmup_urls or {}).items():
+            try:
+                # Any response is fine: the point is the TCP/TLS (and HTTP/2) setup.
+                await client.get(url, headers=headers)
+            except httpx.HTTPError as e:
+                logger.warning(f"LLM warm-up request to {url} failed: {e}")
+    return client
+
+
+async def close_http_client():
+    global _http_client
+    if _http_client is not None:
+        await _http_client.aclose()
+        _http_client = None
@@ -0,0 +1,26 @@
+# Context window sizes (tokens) per model
+MODEL_CONTEXT_WINDOWS = {
+    # Groq
+    "llama3-8b-8192": 8192,
+    "llama3-70b-8192": 8192,
+    "mixtral-8x7b-32768": 32768,
+    "gemma-7b-it": 8192,
+    # OpenAI
+    "gpt-3.5-turbo": 16385,
+    "gpt-4-turbo": 128000,
+}
+
+DEFAULT_CONTEXT_WINDOW = 8192
+
+def get_context_window(model: str) -> int:
+    """
+    Return the context window for a model, matching versioned names
+    (e.g. "gpt-4-turbo-2024-04-09") by their longest known prefix.
+    """
+    model_key = (model or "").lower()
+    if model_key in MODEL_CONTEXT_WINDOWS:
+        return MODEL_CONTEXT_WINDOWS[model_key]
+    matches = [key for key in MODEL_CONTEXT_WINDOWS if model_key.startswith(key)]
+    if not matches:
+        return DEFAULT_CONTEXT_WINDOW
+    return MODEL_CONTEXT_WINDOWS[max(matches, key=len)]
@@ -0,0 +1,90 @@
+import hashlib
+import json
+import logging
+import unicodedata
+from typing import Any, AsyncGenerator, Dict, List, Optional
+
+from src.config.settings import settings
+from src.llm.client import LLMClient
+from src.utils.cache import TTLCache
+
+logger = logging.getLogger(__name__)
+
+def request_key(messages: List[Dict[str, str]], model: str, temperature: float, max_tokens: Optional[int]) -> str:
+    """
+    Stable hash of everything that determines a provider's answer. Message
+    text is NFC-normalized and stripped so trivially different payloads match.
+    """
+    payload = {
+        "model": model,
+        "messages": [
+            {"role": msg["role"], "content": unicodedata.normalize("NFC", msg["content"]).strip()}
+            for msg in messages
+        ],
+        "temperature": temperature,
+        "max_tokens": max_tokens,
+    }
+    raw = json.dumps(payload, sort_keys=True, separators=(",", ":"), ensure_ascii=False)
+    return hashlib.sha256(raw.encode()).hexdigest()
+
+# Shared across client instances; hits/misses feed the metrics
+response_cache = TTLCache(settings.RESPONSE_CACHE_MAX_ENTRIES, settings.RESPONSE_CACHE_TTL_SECONDS)
+
+class CachingLLMClient(LLMClient):
+    """
+    Opt-in exact-match cache in front of a provider client. Only
+    deterministic requests (temperature 0) are cached; pass cache=False to
+    bypass it for a single request. Hits replay as ordinary chunks marked
+    with "cached": True.
+    """
+
+    def __init__(self, inner: LLMClient, cache: TTLCache = response_cache):
+        self.inner = inner
+        self.cache = cache
+
+    def warmup_targets(self):
+        return self.inner.warmup_targets()
+
+    @staticmethod
+    def is_cacheable(temperature: float, cache: Optional[bool]) -> bool:
+        return settings.RESPONSE_CACHE_ENABLED and cache is not False and temperature == 0
+
+    async def stream_chat(
+        self,
+        messages: List[Dict[str, str]],
+        model: str,
+        temperature: float = 0.7,
+        max_tokens: Optional[int] = None,
+        cache: Optional[bool] = None,
+        **options: Any
+    ) -> AsyncGenerator[Dict[str, Any], None]:
+        if not self.is_cacheable(temperature, cache):
+            async for chunk in self.inner.stream_chat(messages, model, temperature, max_tokens, **options):
+                yield chunk
+            return
+
+        key = request_key(messages, model, temperature, max_tokens)
+        hit = self.cache.get(key)
+        if hit is not None:
+            content, finish_reason = hit
+            yield {"content": content, "finish_reason": None, "cached": True}
+            yield {"content": "", "finish_reason": finish_reason, "cached": True}
+            return
+
+        parts = []
+        size = 0
+        finish_reason = None
+        failed = False
+        async for chunk in self.inner.stream_chat(messages, model, temperature, max_tokens, **options):
+            if "error" in chunk:
+                failed = True
+            elif chunk.get("content"):
+                parts.append(chunk["content"])
+                size += len(chunk["content"])
+            if chunk.get("finish_reason"):
+                finish_reason = chunk["finish_reason"]
+            yield chunk
+
+        # Only complete answers are worth replaying
+        if not failed and finish_reason and size <= settings.RESPONSE_CACHE_MAX_CHARS:
+            self.cache.set(key, ("".join(parts), finish_reason))
@@ -0,0 +1,222 @@
+import asyncio
+import logging
+import time
+from typing import Any, AsyncGenerator, Callable, Dict, List, Optional, Tuple
+
+from src.config.settings import settings
+from src.llm.admission import AdmissionController, admission, overloaded_chunk
+from src.llm.client import GroqClient, LLMClient, OpenAIClient
+
+logger = logging.getLogger(__name__)
+
+class ProviderStats:
+    """
+    Rolling (EWMA) time-to-first-token and error rate for one provider,
+    plus a cooldown after retryable failures.
+    """
+
+    def __init__(self):
+        self.ttft: Optional[float] = None
+        self.error_rate = 0.0
+        self.cooldown_until = 0.0
+        self.requests = 0
+        self.failures = 0
+
+    def record_success(self, ttft: float):
+        alpha = settings.LLM_ROUTER_EWMA_ALPHA
+        self.requests += 1
+        self.ttft = ttft if self.ttft is None else alpha * ttft + (1 - alpha) * self.ttft
+        self.error_rate *= 1 - alpha
+
+    def record_failure(self, retry_after: Optional[float] = None):
+        alpha = settings.LLM_ROUTER_EWMA_ALPHA
+        self.requests += 1
+        self.failures += 1
+        self.error_rate = alpha + (1 - alpha) * self.error_rate
+        self.cooldown_until = time.monotonic() + (retry_after or settings.LLM_ROUTER_COOLDOWN_SECONDS)
+
+    @property
+    def cooling_down(self) -> bool:
+        return time.monotonic() < self.cooldown_until
+
+    def score(self) -> float:
+        # Unmeasured providers score as fast so they get tried
+        ttft = self.ttft if self.ttft is not None else 0.0
+        return ttft * (1 + settings.LLM_ROUTER_ERROR_PENALTY * self.error_rate) + self.error_rate
+
+def _is_failover_error(chunk: Dict[str, Any]) -> bool:
+    return "error" in chunk and chunk.get("retryable", False)
+
+class LLMRouter(LLMClient):
+    """
+    Routes each model to one or more providers. Candidates are ordered by
+    live latency and error rate (providers in cooldown go last). Connection
+    errors and 429/5xx before the first token fail over to the next
+    candidate; once text has been sent the stream is committed. With
+    LLM_HEDGE_AFTER_MS set, a second provider is raced against the first
+    when its first token is late, and the loser is cancelled.
+
+    Every attempt holds an admission slot for its (provider, model) while
+    it streams. When none is free the request queues by priority and gets a
+    {"event": "queued"} chunk; past the deadline it ends with a 503 error
+    chunk carrying retry_after.
+    """
+
+    def __init__(self, providers: Dict[str, LLMClient], routes: Dict[str, List[str]], admission: AdmissionController = admission):
+        self.providers = providers
+        self.routes = routes
+        self.admission = admission
+        self.stats = {name: ProviderStats() for name in providers}
+
+    def warmup_targets(self) -> Dict[str, Dict[str, str]]:
+        targets = {}
+        for provider in self.providers.values():
+            targets.update(provider.warmup_targets())
+        return targets
+
+    def providers_for(self, model: str) -> List[str]:
+        """
+        Provider names configured for a model, by longest matching prefix ("*" is the fallback).
+        """
+        model_key = (model or "").lower()
+        matches = [prefix for prefix in self.routes if prefix != "*" and model_key.startswith(prefix.lower())]
+        names = self.routes[max(matches, key=len)] if matches else self.routes.get("*", [])
+        return [name for name in names if name in self.providers]
+
+    def candidates(self, model: str) -> List[str]:
+        names = self.providers_for(model)
+        # sorted() is stable, so configured order breaks ties
+        return sorted(names, key=lambda name: (self.stats[name].cooling_down, self.stats[name].score()))
+
+    async def _first_chunk(self, name: str, stream: AsyncGenerator) -> Tuple[str, AsyncGenerator, Dict[str, Any], float]:
+        start = time.monotonic()
+        try:
+            chunk = await stream.__anext__()
+        except StopAsyncIteration:
+            chunk = {"content": "", "finish_reason": "stop"}
+        return name, stream, chunk, time.monotonic() - start
+
+    def _record(self, name: str, chunk: Dict[str, Any], elapsed: float):
+        if _is_failover_error(chunk):
+            self.stats[name].record_failure(chunk.get("retry_after"))
+            logger.warning(f"Provider {name} failed before first token: {chunk['error']}")
+        elif "error" not in chunk:
+            self.stats[name].record_success(elapsed)
+
+    async def _race(self, first: Tuple[str, AsyncGenerator], hedge: Optional[Callable[[], Optional[Tuple[str, AsyncGenerator]]]]) -> List[asyncio.Task]:
+        """
+        Wait for the first attempt, opening the hedge if its first token is
+        late. Returns the finished attempts; any still running once one has
+        succeeded are cancelled.
+        """
+        tasks = [asyncio.create_task(self._first_chunk(*first))]
+        finished = []
+        pending = set(tasks)
+        try:
+            if hedge is not None:
+                done, _ = await asyncio.wait(tasks, timeout=settings.LLM_HEDGE_AFTER_MS / 1000)
+                opened = hedge() if not done else None
+                if opened is not None:
+                    logger.info(f"Hedging slow first token with provider {opened[0]}")
+                    pending.add(asyncio.create_task(self._first_chunk(*opened)))
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                finished.extend(done)
+                # Stop at the first usable answer
+                if any(not _is_failover_error(task.result()[2]) for task in done):
+                    break
+        finally:
+            for task in pending:
+                task.cancel()
+        return finished
+
+    async def stream_chat(
+        self,
+        messages: List[Dict[str, str]],
+        model: str,
+        temperature: float = 0.7,
+        max_tokens: Optional[int] = None,
+        priority: str = "interactive",
+        **options: Any
+    ) -> AsyncGenerator[Dict[str, Any], None]:
+        names = self.candidates(model)
+        if not names:
+            yield {"error": f"No provider configured for model {model}", "status_code": None, "retryable": False}
+            return
+
+        def open_stream(name):
+            return name, self.providers[name].stream_chat(messages, model, temperature, max_tokens, **options)
+
+        def open_hedge():
+            # Hedges never queue: skip it if the next provider has no free slot
+            ticket = self.admission.try_acquire(names[0], model, priority)
+            if ticket is None:
+                return None
+            tickets[names[0]] = ticket
+            return open_stream(names.pop(0))
+
+        tickets = {}
+        last_error = None
+        winner = None
+        losers = []
+        try:
+            while names and winner is None:
+                # Prefer a provider with a free slot; otherwise queue for the best one
+                name = next((n for n in names if self.admission.has_capacity(n, model)), names[0])
+                names.remove(name)
+                ticket = self.admission.request(name, model, priority)
+                if ticket is None:
+                    last_error = overloaded_chunk()
+                    continue
+                tickets[name] = ticket
+                if not ticket.granted.done():
+                    yield {"event": "queued", "position": ticket.position}
+                    if not await ticket.wait(settings.LLM_QUEUE_TIMEOUT_SECONDS):
+                        self.admission.timed_out += 1
+                        last_error = overloaded_chunk()
+                        break
+
+                hedge = None
+                if settings.LLM_HEDGE_AFTER_MS > 0 and names:
+                    hedge = open_hedge
+                finished = await self._race(open_stream(name), hedge)
+                for task in finished:
+                    result = task.result()
+                    self._record(result[0], result[2], result[3])
+                    if winner is None and not _is_failover_error(result[2]):
+                        winner = result
+                    else:
+                        if _is_failover_error(result[2]):
+                            last_error = result[2]
+                        losers.append(result[1])
+                # Free every slot but the one still streaming
+                for held in list(tickets):
+                    if winner is None or held != winner[0]:
+                        tickets.pop(held).release()
+
+            for stream in losers:
+                await stream.aclose()
+            if winner is None:
+                yield last_error
+                return
+
+            name, stream, chunk, _ = winner
+            try:
+                yield chunk
+                async for chunk in stream:
+                    yield chunk
+            finally:
+                await stream.aclose()
+        finally:
+            for ticket in tickets.values():
+                ticket.release()
+
+def build_router() -> LLMRouter:
+    """
+    Router over every provider with credentials (Groq is always present so
+    misconfiguration surfaces as provider errors, as before).
+    """
+    providers: Dict[str, LLMClient] = {"groq": GroqClient()}
+    if settings.OPENAI_API_KEY:
+        providers["openai"] = OpenAIClient()
+    return LLMRouter(providers, settings.LLM_MODEL_ROUTES)
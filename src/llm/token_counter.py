@@ -1,35 +1,72 @@
 import tiktoken
 import logging
+from functools import lru_cache
+from typing import Iterable, List
 
 logger = logging.getLogger(__name__)
 
-def count_tokens(text: str, model: str = "gpt-3.5-turbo") -> int:
+@lru_cache(maxsize=None)
+def get_encoding(model: str = "gpt-3.5-turbo") -> tiktoken.Encoding:
     """
-    Count the number of tokens in a string.
+    Resolve (once per model) the tiktoken encoding used to count its tokens.
     """
     try:
-        encoding = tiktoken.encoding_for_model(model)
+        return tiktoken.encoding_for_model(model)
     except KeyError:
         # Fallback to cl100k_base for newer models or unknown ones
-        encoding = tiktoken.get_encoding("cl100k_base")
-        
-    return len(encoding.encode(text))
+        return tiktoken.get_encoding("cl100k_base")
+
+def count_tokens(text: str, model: str = "gpt-3.5-turbo") -> int:
+    """
+    Count the number of tokens in a string.
+    """
+    # encode_ordinary skips the special-token check, which we never want for user text
+    return len(get_encoding(model).encode_ordinary(text))
+
+def count_tokens_batch(texts: Iterable[str], model: str = "gpt-3.5-turbo") -> List[int]:
+    """
+    Count tokens for many strings at once (tiktoken encodes the batch in parallel).
+    """
+    return [len(tokens) for tokens in get_encoding(model).encode_ordinary_batch(list(texts))]
 
 def count_message_tokens(messages: list, model: str = "gpt-3.5-turbo") -> int:
     """
     Count tokens for a list of messages.
     Generic approximation for chat format.
     """
-    try:
-        encoding = tiktoken.encoding_for_model(model)
-    except KeyError:
-         encoding = tiktoken.get_encoding("cl100k_base")
-
-    num_tokens = 0
-    for message in messages:
-        # approx 4 tokens per message (role, content, etc overhead)
-        num_tokens += 4
-        for key, value in message.items():
-            num_tokens += len(encoding.encode(str(value)))
+    values = [str(value) for message in messages for value in message.values()]
+    # approx 4 tokens per message (role, content, etc overhead)
+    num_tokens = 4 * len(messages) + sum(count_tokens_batch(values, model))
     num_tokens += 2  # priming
     return num_tokens
+
+class IncrementalTokenCounter:
+    """
+    Counts tokens of a streamed reply as deltas arrive, so the total is known
+    when the stream ends without re-encoding the whole text.
+
+    Text is only encoded up to the last whitespace seen: BPE tokens rarely
+    span a whitespace boundary, so the committed count stays in line with
+    encoding the full string while only a short tail is ever re-encoded.
+    """
+
+    def __init__(self, model: str = "gpt-3.5-turbo"):
+        self.encoding = get_encoding(model)
+        self.committed = 0
+        self.pending = ""
+
+    def feed(self, text: str) -> None:
+        if not text:
+            return
+        self.pending += text
+        # Keep the whitespace with the tail: tokens usually start with a space
+        boundary = max(self.pending.rfind(" "), self.pending.rfind("\n"))
+        if boundary > 0:
+            self.committed += len(self.encoding.encode_ordinary(self.pending[:boundary]))
+            self.pending = self.pending[boundary:]
+
+    @property
+    def total(self) -> int:
+        if not self.pending:
+            return self.committed
+        return self.committed + len(self.encoding.encode_ordinary(self.pending))
@@ -1,28 +1,53 @@
-from fastapi import FastAPI
+import hmac
+import logging
+from fastapi import FastAPI, HTTPException, Request, Response
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.exceptions import RequestValidationError
 from starlette.exceptions import HTTPException as StarletteHTTPException
 from contextlib import asynccontextmanager
+from prometheus_client import CONTENT_TYPE_LATEST, generate_latest
 
 from src.config.settings import settings
+from src.db.database import db
+from src.llm.client import get_llm_client
+from src.llm.http import init_http_client, close_http_client
+from src.batches.service import batch_service
+from src.messages.persistence import message_writer
+from src.messages.resumable import stream_registry
+from src.messages.summarizer import conversation_summarizer
 from src.middleware.error_handler import (
     global_exception_handler,
     http_exception_handler,
     validation_exception_handler,
 )
 from src.middleware.rate_limiter import limiter, rate_limit_handler, RateLimitExceeded
+from src.middleware.metrics import MetricsMiddleware
 from src.auth.routes import router as auth_router
+from src.batches.routes import router as batches_router
 from src.conversations.routes import router as conversations_router
 from src.messages.routes import router as messages_router
 from src.usage.routes import router as usage_router
+from src.search.routes import router as search_router
+
+logger = logging.getLogger(__name__)
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     # Startup
-    print(f"Starting {settings.APP_NAME}...")
+    logger.info(f"Starting {settings.APP_NAME}...")
+    await db.connect()
+    await message_writer.start()
+    await init_http_client(get_llm_client().warmup_targets())
     yield
     # Shutdown
-    print(f"Shutting down {settings.APP_NAME}...")
+    logger.info(f"Shutting down {settings.APP_NAME}...")
+    await stream_registry.stop()
+    await batch_service.stop()
+    await conversation_summarizer.stop()
+    await close_http_client()
+    # Drain queued message writes before the pool goes away
+    await message_writer.stop()
+    await db.close()
 
 app = FastAPI(
     title=settings.APP_NAME,
@@ -43,7 +68,10 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor", "X-Stream-Id", "X-Batch-Id"],
 )
+# Outermost, so route latency covers CORS and error handling too
+app.add_middleware(MetricsMiddleware)
 
 # Exception Handlers
 app.add_exception_handler(StarletteHTTPException, http_exception_handler)
@@ -55,11 +83,24 @@ app.include_router(auth_router, prefix=settings.API_V1_STR)
 app.include_router(conversations_router, prefix=settings.API_V1_STR)
 app.include_router(messages_router, prefix=settings.API_V1_STR)
 app.include_router(usage_router, prefix=settings.API_V1_STR)
+app.include_router(batches_router, prefix=settings.API_V1_STR)
+app.include_router(search_router, prefix=settings.API_V1_STR)
 
 @app.get("/")
 async def root():
     return {"message": "AI Conversation API is running", "docs": "/docs"}
 
+@app.get("/metrics", include_in_schema=False)
+async def metrics(request: Request):
+    # Prometheus text format
+    if not settings.METRICS_ENABLED:
+        raise HTTPException(status_code=404, detail="Not Found")
+    if settings.METRICS_TOKEN:
+        scheme, _, token = request.headers.get("authorization", "").partition(" ")
+        if scheme.lower() != "bearer" or not hmac.compare_digest(token.encode(), settings.METRICS_TOKEN.encode()):
+            raise HTTPException(status_code=401, detail="Invalid metrics token", headers={"WWW-Authenticate": "Bearer"})
+    return Response(generate_latest(), media_type=CONTENT_TYPE_LATEST)
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run("src.main:app", host="0.0.0.0", port=8000, reload=True)
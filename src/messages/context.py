@@ -0,0 +1,108 @@
+from typing import Dict, List, Optional, Tuple
+
+from src.config.settings import settings
+from src.db.database import db
+from src.llm.models import get_context_window
+from src.llm.token_counter import count_tokens
+from src.messages.persistence import message_writer
+from src.messages.summarizer import conversation_summarizer, summary_prefix, watermark
+
+# Per-message chat-format overhead (role, separators), as in count_message_tokens
+MESSAGE_OVERHEAD_TOKENS = 4
+PRIMING_TOKENS = 2
+
+class ContextBuilder:
+    """
+    Assembles the prompt for a conversation turn: the system prompt plus as
+    much recent history as fits in the model's token budget.
+    """
+
+    @staticmethod
+    def token_budget(model: str, max_output_tokens: Optional[int] = None) -> int:
+        reserved = max_output_tokens or settings.CONTEXT_RESERVED_OUTPUT_TOKENS
+        return max(get_context_window(model) - reserved, 0)
+
+    @staticmethod
+    async def get_recent_messages(conversation_id: str, limit: int, before: Optional[dict] = None, since: Optional[str] = None) -> List[dict]:
+        # Newest first, so a turn only reads the rows that end up in the window.
+        # Keyset paging keeps each extra page an index seek.
+        filters = {"conversation_id": conversation_id}
+        if since:
+            filters["created_at__gte"] = since
+        return await db.select(
+            "messages",
+            columns="id, role, content, token_count, created_at",
+            filters=filters,
+            order=["created_at.desc", "id.desc"],
+            limit=limit,
+            after={"created_at": before["created_at"], "id": before["id"]} if before else None,
+        )
+
+    @staticmethod
+    async def build(conversation: dict, model: str, max_output_tokens: Optional[int] = None) -> Tuple[List[Dict[str, str]], int]:
+        """
+        Returns (messages_payload, prompt_tokens) for the LLM call.
+        """
+        budget = ContextBuilder.token_budget(model, max_output_tokens)
+        used = PRIMING_TOKENS
+        system_message = None
+        if conversation.get("system_prompt"):
+            system_message = {"role": "system", "content": conversation["system_prompt"]}
+            used += count_tokens(conversation["system_prompt"], model) + MESSAGE_OVERHEAD_TOKENS
+
+        # A rolling summary stands in for every message up to its watermark
+        covered = watermark(conversation)
+        summary_message = None
+        if covered:
+            summary_message = {"role": "system", "content": summary_prefix(conversation["summary"])}
+            used += count_tokens(summary_message["content"], model) + MESSAGE_OVERHEAD_TOKENS
+
+        selected: List[dict] = []
+        seen = set()
+        history_tokens = 0
+        truncated = False
+
+        def take(row) -> bool:
+            nonlocal used, history_tokens, truncated
+            if row["id"] in seen:
+                return True
+            if covered and (row["created_at"], str(row["id"])) <= (covered["created_at"], str(covered["id"])):
+                return False
+            # token_count is stored on write; only count rows that predate it
+            tokens = (row.get("token_count") or count_tokens(row["content"], model)) + MESSAGE_OVERHEAD_TOKENS
+            # The newest message (the one being answered) is always sent
+            if selected and used + tokens > budget:
+                truncated = True
+                return False
+            selected.append(row)
+            seen.add(row["id"])
+            used += tokens
+            history_tokens += tokens
+            truncated = len(selected) >= settings.CONTEXT_MAX_MESSAGES
+            return not truncated
+
+        # Messages still queued for insert are the newest ones
+        full = not all(take(row) for row in reversed(message_writer.pending_for(conversation["id"])))
+
+        page_size = settings.CONTEXT_PAGE_SIZE
+        before = None
+        while not full:
+            rows = await ContextBuilder.get_recent_messages(conversation["id"], page_size, before, covered["created_at"] if covered else None)
+            for row in rows:
+                if not take(row):
+                    full = True
+                    break
+            if len(rows) < page_size:
+                break
+            before = rows[-1]
+
+        # Raw history is getting long (or no longer fits): fold older turns into the summary
+        if settings.SUMMARY_ENABLED and (truncated or history_tokens > settings.SUMMARY_TRIGGER_TOKENS):
+            conversation_summarizer.schedule(conversation)
+
+        messages_payload = [{"role": row["role"], "content": row["content"]} for row in reversed(selected)]
+        if summary_message:
+            messages_payload.insert(0, summary_message)
+        if system_message:
+            messages_payload.insert(0, system_message)
+        return messages_payload, used
@@ -0,0 +1,170 @@
+import asyncio
+import logging
+from collections import OrderedDict
+from datetime import datetime, timezone
+from typing import Dict, List, Optional
+from uuid import uuid4
+
+from src.config.settings import settings
+from src.db.database import db, is_data_error
+
+logger = logging.getLogger(__name__)
+
+_STOP = object()
+
+class MessageWriter:
+    """
+    Write-behind persistence for messages. Rows get their id and created_at
+    up front, are queued in-process and inserted in multi-row batches (by
+    size or time), with retries and backoff. Until a row is flushed it is
+    visible through pending_for(), so a conversation reads its own writes.
+
+    Queued rows live in memory: a hard crash loses what hasn't been flushed
+    yet (at most MESSAGE_WRITE_FLUSH_INTERVAL_MS worth under normal load).
+    The lifespan drains the queue on a clean shutdown.
+    """
+
+    def __init__(self):
+        self._queue: Optional[asyncio.Queue] = None
+        self._task: Optional[asyncio.Task] = None
+        # conversation_id -> {message_id: row}, in write order
+        self._pending: Dict[str, "OrderedDict[str, dict]"] = {}
+        self.written = 0
+        self.failed = 0
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    async def start(self):
+        if self.running:
+            return
+        self._queue = asyncio.Queue(maxsize=settings.MESSAGE_WRITE_QUEUE_SIZE)
+        self._task = asyncio.create_task(self._run(), name="message-writer")
+
+    async def stop(self):
+        """
+        Flush everything queued, then stop the background task.
+        """
+        if not self.running:
+            return
+        await self._queue.put(_STOP)
+        await self._task
+        self._task = None
+
+    @staticmethod
+    def new_row(data: dict) -> dict:
+        row = dict(data)
+        row.setdefault("id", str(uuid4()))
+        row.setdefault("created_at", datetime.now(timezone.utc).isoformat())
+        return row
+
+    async def write(self, data: dict) -> dict:
+        """
+        Queue a message row for insertion and return it as it will be stored.
+        Blocks only when the queue is full (backpressure).
+        """
+        row = self.new_row(data)
+        if not self.running:
+            # No lifespan (scripts, tests): write through
+            await db.insert("messages", [row])
+            return row
+        await self._queue.put(row)
+        # Only once queued: a put cancelled while the queue is full must not
+        # leave a row that will never be flushed
+        self._pending.setdefault(str(row["conversation_id"]), OrderedDict())[row["id"]] = row
+        return row
+
+    def pending_for(self, conversation_id: str) -> List[dict]:
+        """
+        Rows for a conversation that are queued but not yet in the database, oldest first.
+        """
+        rows = self._pending.get(str(conversation_id))
+        return list(rows.values()) if rows else []
+
+    def _forget(self, rows: List[dict]):
+        for row in rows:
+            conversation_id = str(row["conversation_id"])
+            pending = self._pending.get(conversation_id)
+            if pending is None:
+                continue
+            pending.pop(row["id"], None)
+            if not pending:
+                del self._pending[conversation_id]
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        interval = settings.MESSAGE_WRITE_FLUSH_INTERVAL_MS / 1000
+        stopping = False
+        while not stopping:
+            row = await self._queue.get()
+            if row is _STOP:
+                break
+            batch = [row]
+            deadline = loop.time() + interval
+            while len(batch) < settings.MESSAGE_WRITE_BATCH_SIZE:
+                # Drain what's already queued without waiting, then wait out the window
+                if self._queue.empty():
+                    timeout = deadline - loop.time()
+                    if timeout <= 0:
+                        break
+                    try:
+                        row = await asyncio.wait_for(self._queue.get(), timeout)
+                    except asyncio.TimeoutError:
+                        break
+                else:
+                    row = self._queue.get_nowait()
+                if row is _STOP:
+                    stopping = True
+                    break
+                batch.append(row)
+            await self._flush(batch)
+
+    async def _insert_with_retry(self, rows: List[dict]) -> Optional[Exception]:
+        """
+        Insert rows, retrying connection and timeout failures with backoff.
+        Returns None once inserted, otherwise the last error. Data and
+        integrity errors come back at once: the same rows would fail again.
+        """
+        backoff = settings.MESSAGE_WRITE_RETRY_BACKOFF_MS / 1000
+        for attempt in range(settings.MESSAGE_WRITE_MAX_RETRIES + 1):
+            try:
+                await db.insert("messages", rows)
+                return None
+            except Exception as e:
+                if is_data_error(e):
+                    return e
+                if attempt == settings.MESSAGE_WRITE_MAX_RETRIES:
+                    logger.error(f"Failed to insert {len(rows)} message(s) after {attempt + 1} attempts: {e}")
+                    return e
+                logger.warning(f"Message insert failed (attempt {attempt + 1}), retrying: {e}")
+                await asyncio.sleep(min(backoff * 2 ** attempt, 5.0))
+
+    def _drop(self, row: dict, reason):
+        self.failed += 1
+        logger.error(
+            f"Dropping message {row['id']} for conversation {row['conversation_id']} "
+            f"({row.get('role')}, {len(row.get('content') or '')} chars): {reason}"
+        )
+
+    async def _flush(self, batch: List[dict]):
+        error = await self._insert_with_retry(batch)
+        if error is None:
+            self.written += len(batch)
+        elif is_data_error(error) and len(batch) > 1:
+            # One bad row (e.g. its conversation was deleted) shouldn't sink
+            # the rest. Outages don't get here: row by row they would hold
+            # the writer for the whole retry schedule per row.
+            for row in batch:
+                row_error = await self._insert_with_retry([row])
+                if row_error is None:
+                    self.written += 1
+                else:
+                    self._drop(row, row_error)
+        else:
+            for row in batch:
+                self._drop(row, error)
+        self._forget(batch)
+
+# Singleton instance
+message_writer = MessageWriter()
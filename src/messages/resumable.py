@@ -0,0 +1,153 @@
+import asyncio
+import logging
+import uuid
+from collections import OrderedDict
+from typing import AsyncIterator, Optional, Tuple
+
+from src.config.settings import settings
+from src.messages import sse
+from src.utils.broadcast import BroadcastCancelled, ReplayBroadcast, ReplayGap
+from src.utils.metrics import ACTIVE_STREAMS, LLM_STREAMS_CANCELLED
+
+logger = logging.getLogger(__name__)
+
+def parse_event_id(value: Optional[str]) -> Tuple[Optional[str], int]:
+    """
+    Split a Last-Event-ID ("<stream_id>:<seq>", or a bare seq) into its
+    parts. Returns (None, -1) when there is nothing to resume from.
+    """
+    if not value:
+        return None, -1
+    stream_id, _, seq = value.strip().rpartition(":")
+    try:
+        return stream_id or None, int(seq)
+    except ValueError:
+        return None, -1
+
+class StreamSession:
+    """
+    One generation, decoupled from the HTTP response that started it. The
+    SSE events run in a background task and the most recent
+    SSE_RESUME_BUFFER_EVENTS are kept, so a client that drops can reconnect
+    and pick up from its last event id instead of starting a new turn. If
+    no client is attached for SSE_DISCONNECT_GRACE_SECONDS, the generation
+    is cancelled so the provider stops producing tokens nobody will read.
+    """
+
+    def __init__(self, stream_id: str, user_id: str, conversation_id: str, broadcast: ReplayBroadcast):
+        self.id = stream_id
+        self.user_id = str(user_id)
+        self.conversation_id = str(conversation_id)
+        self.broadcast = broadcast
+        self._abandon_timer: Optional[asyncio.TimerHandle] = None
+
+    def cancel(self, reason: str):
+        """
+        Stop the generation; the partial reply is saved with reason as its finish_reason.
+        """
+        if self.broadcast.done:
+            return
+        LLM_STREAMS_CANCELLED.labels(reason).inc()
+        logger.info(f"Cancelling stream {self.id}: {reason}")
+        self.broadcast.start().cancel(reason)
+
+    def _abandoned(self):
+        self._abandon_timer = None
+        if self.broadcast.subscribers == 0:
+            self.cancel("client_disconnect")
+
+    def watch_idle(self):
+        """
+        Arm the disconnect timer unless a client is attached.
+        """
+        if self.broadcast.subscribers == 0 and not self.broadcast.done and self._abandon_timer is None:
+            self._abandon_timer = asyncio.get_running_loop().call_later(settings.SSE_DISCONNECT_GRACE_SECONDS, self._abandoned)
+
+    async def events(self, after: int = -1) -> AsyncIterator[str]:
+        """
+        SSE frames (with id: lines) following event number after.
+        """
+        ACTIVE_STREAMS.inc()
+        if self._abandon_timer is not None:
+            self._abandon_timer.cancel()
+            self._abandon_timer = None
+        seq = after + 1
+        subscription = self.broadcast.subscribe(start=seq)
+        try:
+            async for event in subscription:
+                yield f"id: {self.id}:{seq}\n{event}"
+                seq += 1
+        except ReplayGap:
+            yield sse.error("Missed events are no longer available, reload the conversation", "resume_error")
+        except BroadcastCancelled as e:
+            # The partial reply is saved with the reason as its finish_reason
+            yield sse.error(f"Generation stopped: {e.reason}", "cancelled_error")
+        except Exception as e:
+            logger.error(f"Stream {self.id} failed: {e}")
+            yield sse.error("Stream failed", "api_error")
+        finally:
+            # Closed here rather than left to the GC, so the subscriber count is right below
+            await subscription.aclose()
+            ACTIVE_STREAMS.dec()
+            self.watch_idle()
+
+class StreamRegistry:
+    """
+    Live and recently finished stream sessions by id. Finished sessions are
+    dropped SSE_RESUME_TTL_SECONDS after their last event; past
+    SSE_RESUME_MAX_STREAMS the oldest finished ones go first.
+    """
+
+    def __init__(self):
+        self._sessions: "OrderedDict[str, StreamSession]" = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._sessions)
+
+    def start(self, user_id: str, conversation_id: str, source: AsyncIterator[str]) -> StreamSession:
+        stream_id = uuid.uuid4().hex
+        broadcast = ReplayBroadcast(
+            source,
+            on_done=lambda: self._finished(stream_id),
+            max_items=settings.SSE_RESUME_BUFFER_EVENTS,
+            # Keep generating while the client is away; it may come back
+            cancel_when_idle=False,
+        )
+        session = StreamSession(stream_id, user_id, conversation_id, broadcast)
+        self._sessions[stream_id] = session
+        self._evict()
+        broadcast.start()
+        # Covers a client that never starts reading
+        session.watch_idle()
+        return session
+
+    def get(self, stream_id: str, user_id: str, conversation_id: str) -> Optional[StreamSession]:
+        session = self._sessions.get(stream_id)
+        if session is None or session.user_id != str(user_id) or session.conversation_id != str(conversation_id):
+            return None
+        return session
+
+    def _finished(self, stream_id: str):
+        asyncio.get_running_loop().call_later(settings.SSE_RESUME_TTL_SECONDS, self._sessions.pop, stream_id, None)
+
+    def _evict(self):
+        excess = len(self._sessions) - settings.SSE_RESUME_MAX_STREAMS
+        if excess <= 0:
+            return
+        # Live generations are never dropped, only finished ones
+        for stream_id in [sid for sid, s in self._sessions.items() if s.broadcast.done][:excess]:
+            del self._sessions[stream_id]
+
+    async def stop(self):
+        """
+        Cancel generations still running at shutdown.
+        """
+        tasks = []
+        for session in self._sessions.values():
+            if not session.broadcast.done:
+                tasks.append(session.broadcast.start())
+                session.cancel("shutdown")
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+# Singleton instance
+stream_registry = StreamRegistry()
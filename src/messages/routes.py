@@ -1,28 +1,37 @@
-from fastapi import APIRouter, Depends, Query, HTTPException, Request
+from fastapi import APIRouter, Depends, Header, Query, HTTPException, Request, Response
 from fastapi.responses import StreamingResponse
-from typing import List
+from typing import List, Literal, Optional
 from uuid import UUID
 
 from src.auth.dependencies import get_current_user
 from src.messages.schemas import MessageCreate, MessageResponse
 from src.messages.service import MessageService
-from src.messages.streaming import stream_generator
-from src.db.client import supabase
+from src.messages.resumable import parse_event_id, stream_registry
+from src.messages.streaming import start_stream
+from src.messages.context import ContextBuilder
+from src.conversations.service import ConversationService
 from src.llm.token_counter import count_tokens
+from src.middleware.rate_limiter import user_quota
+from src.utils.metrics import timed
 
 router = APIRouter(prefix="/conversations", tags=["Messages"])
 
 @router.get("/{conversation_id}/messages", response_model=List[dict])
 async def list_messages(
     conversation_id: str,
-    limit: int = 50,
-    offset: int = 0,
+    response: Response,
+    limit: int = Query(50, ge=1),
+    offset: int = Query(0, ge=0),
+    cursor: Optional[str] = Query(None, description="X-Next-Cursor from the previous page; takes precedence over offset"),
+    order: Literal["asc", "desc"] = "asc",
     current_user: dict = Depends(get_current_user)
 ):
     # Determine ownership
-    conv = await MessageService.get_messages(conversation_id, limit, offset)
+    conv, next_cursor = await MessageService.get_messages(conversation_id, limit, offset, cursor, order)
     # Ideally should check ownership of conversation first, added basic check in service but explicit check here is safer
     # For now, relying on service or future RLS
+    if next_cursor:
+        response.headers["X-Next-Cursor"] = next_cursor
     return conv
 
 @router.post("/{conversation_id}/messages", response_model=dict)
@@ -40,10 +49,8 @@ async def stream_message(
     current_user: dict = Depends(get_current_user)
 ):
     # 1. Validate conversation access
-    conv_res = supabase.table("conversations").select("*").eq("id", conversation_id).eq("user_id", current_user["id"]).execute()
-    if not conv_res.data:
-         raise HTTPException(status_code=404, detail="Conversation not found")
-    conversation = conv_res.data[0]
+    conversation = await ConversationService.get_conversation(current_user["id"], conversation_id, cached=True)
+    await user_quota.admit(current_user["id"])
 
     # 2. Save User Message
     user_tokens = count_tokens(data.content)
@@ -54,22 +61,49 @@ async def stream_message(
         token_count=user_tokens
     )
 
-    # 3. Prepare History
-    history = await MessageService.get_messages(conversation_id, limit=10)
-    messages_payload = [{"role": msg["role"], "content": msg["content"]} for msg in history]
-    if conversation.get("system_prompt"):
-         messages_payload.insert(0, {"role": "system", "content": conversation["system_prompt"]})
+    # 3. Prepare History (token-budgeted, newest messages first)
+    model = data.model or conversation["model"]
+    with timed("context"):
+        messages_payload, prompt_tokens = await ContextBuilder.build(conversation, model)
+    options = MessageService.sampling_options(conversation, data)
+    await user_quota.charge(current_user["id"], prompt_tokens)
 
-    # 4. Stream Response
+    # 4. Stream Response (generation runs in the background, so a dropped client can resume)
+    session = start_stream(
+        model=model,
+        messages=messages_payload,
+        temperature=options["temperature"],
+        user_id=current_user["id"],
+        conversation_id=conversation_id,
+        prompt_tokens=prompt_tokens,
+        cache=options.get("cache")
+    )
+    return StreamingResponse(
+        session.events(),
+        media_type="text/event-stream",
+        headers={"X-Stream-Id": session.id}
+    )
+
+@router.get("/{conversation_id}/messages/stream/{stream_id}")
+async def resume_stream(
+    conversation_id: str,
+    stream_id: str,
+    last_event_id: Optional[str] = Header(None),
+    after: Optional[str] = Query(None, description="Last event id received, for clients that can't set Last-Event-ID"),
+    current_user: dict = Depends(get_current_user)
+):
+    """
+    Replays the events of a stream after Last-Event-ID, then follows it live.
+    No Last-Event-ID replays from the start.
+    """
+    session = stream_registry.get(stream_id, current_user["id"], conversation_id)
+    if session is None:
+        raise HTTPException(status_code=404, detail="Stream not found or expired")
+    event_stream_id, seq = parse_event_id(last_event_id or after)
+    if event_stream_id is not None and event_stream_id != stream_id:
+        raise HTTPException(status_code=400, detail="Last-Event-ID belongs to another stream")
     return StreamingResponse(
-        stream_generator(
-            model=data.model or conversation["model"],
-            messages=messages_payload,
-            temperature=0.7,
-            user_id=current_user["id"],
-            conversation_id=conversation_id
-            # Note: The generator needs to handle saving the assistant message after completion
-            # We'll update stream_generator to do exactly that (it currently has a comment)
-        ),
-        media_type="text/event-stream"
+        session.events(after=seq),
+        media_type="text/event-stream",
+        headers={"X-Stream-Id": session.id}
     )
@@ -1,4 +1,4 @@
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 from typing import Optional, Dict, Any, Literal
 from datetime import datetime
 from uuid import UUID
@@ -6,6 +6,8 @@ from uuid import UUID
 class MessageCreate(BaseModel):
     content: str
     model: Optional[str] = None # Optional override
+    temperature: Optional[float] = Field(None, ge=0, le=2)  # Defaults to DEFAULT_TEMPERATURE
+    cache: Optional[bool] = None  # False bypasses the response cache for this request
 
 class MessageResponse(BaseModel):
     id: UUID
@@ -13,6 +15,9 @@ class MessageResponse(BaseModel):
     role: Literal["user", "assistant", "system"]
     content: str
     token_count: Optional[int]
+    input_tokens: Optional[int] = None
+    output_tokens: Optional[int] = None
+    cost_usd: Optional[float] = None
     model: Optional[str]
     finish_reason: Optional[str]
     latency_ms: Optional[int]
@@ -1,43 +1,116 @@
+import math
 import time
 from uuid import UUID
 from fastapi import HTTPException
-from src.db.client import supabase
+from src.db.database import db
+from src.conversations.service import ConversationService
 from src.messages.schemas import MessageCreate
-from src.llm.token_counter import count_tokens, count_message_tokens
+from src.messages.context import ContextBuilder
+from src.messages.persistence import message_writer
+from src.llm.token_counter import count_tokens, count_message_tokens, IncrementalTokenCounter
 from src.llm.client import get_llm_client, GroqClient
+from src.utils.cost_tracker import calculate_cost
+from src.utils.pagination import decode_cursor, next_cursor
+from src.middleware.rate_limiter import user_quota
+from src.utils.metrics import StreamTimer, current_timings, timed
+
+# Used when a request doesn't set one
+DEFAULT_TEMPERATURE = 0.7
+
+# Everything but the generated search column (content_tsv)
+MESSAGE_COLUMNS = (
+    "id, conversation_id, role, content, token_count, input_tokens, output_tokens, "
+    "model, finish_reason, latency_ms, cost_usd, metadata, created_at"
+)
+
+# Keyset orders for listing; served by idx_messages_conversation_created_at_id
+MESSAGE_ORDERS = {
+    "asc": ["created_at.asc", "id.asc"],
+    "desc": ["created_at.desc", "id.desc"],
+}
 
 class MessageService:
     @staticmethod
-    async def get_messages(conversation_id: str, limit: int = 50, offset: int = 0):
-        response = supabase.table("messages")\
-            .select("*")\
-            .eq("conversation_id", conversation_id)\
-            .order("created_at", desc=False)\
-            .range(offset, offset + limit - 1)\
-            .execute()
-        return response.data
+    async def get_messages(conversation_id: str, limit: int = 50, offset: int = 0, cursor: str = None, order: str = "asc"):
+        """
+        Returns (messages, next_cursor). order="desc" pages backwards from the
+        newest message. A cursor continues keyset pagination; without one,
+        offset pagination is used for compatibility.
+        """
+        order_by = MESSAGE_ORDERS[order]
+        rows = await db.select(
+            "messages",
+            columns=MESSAGE_COLUMNS,
+            filters={"conversation_id": conversation_id},
+            order=order_by,
+            limit=limit + 1,
+            offset=None if cursor else offset,
+            after=decode_cursor(cursor, order_by) if cursor else None,
+        )
+        cursor_out = next_cursor(rows, limit, order_by)
+
+        # Read-your-writes: queued rows are the newest, so they belong on the
+        # last page going forward or the first page going backward
+        pending = message_writer.pending_for(conversation_id)
+        if pending:
+            seen = {row["id"] for row in rows}
+            pending = [row for row in pending if row["id"] not in seen]
+            if order == "asc" and cursor_out is None:
+                rows.extend(pending)
+            elif order == "desc" and not cursor and not offset:
+                rows[:0] = reversed(pending)
+        return rows, cursor_out
 
     @staticmethod
-    async def add_message(conversation_id: str, role: str, content: str, model: str = None, token_count: int = 0, finish_reason: str = None, latency_ms: int = 0):
+    async def add_message(conversation_id: str, role: str, content: str, model: str = None, token_count: int = 0, finish_reason: str = None, latency_ms: int = 0, input_tokens: int = 0, output_tokens: int = 0, metadata: dict = None):
+        # input/output tokens are what the turn was billed for: set on assistant rows,
+        # zero on user rows (their text is billed as part of the next prompt) and
+        # on response-cache hits
         data = {
             "conversation_id": conversation_id,
             "role": role,
             "content": content,
             "token_count": token_count,
+            "input_tokens": input_tokens,
+            "output_tokens": output_tokens,
             "model": model,
             "finish_reason": finish_reason,
-            "latency_ms": latency_ms
+            "latency_ms": latency_ms,
+            # Stored per row so the usage rollup triggers can sum it
+            "cost_usd": calculate_cost(model, input_tokens, output_tokens) if model else 0
         }
-        response = supabase.table("messages").insert(data).execute()
-        return response.data[0]
+        if metadata:
+            data["metadata"] = metadata
+        # Queued and batched by the write-behind writer; the returned row is final
+        return await message_writer.write(data)
+
+    @staticmethod
+    def assistant_metadata(cached: bool) -> dict:
+        """
+        Metadata stored on an assistant reply: where the request's time went
+        (auth, db, context, ttft, llm in ms) and whether it was a cache hit.
+        """
+        metadata = {"timings": current_timings()}
+        if cached:
+            metadata["response_cache"] = "hit"
+        return metadata
+
+    @staticmethod
+    def sampling_options(conversation: dict, data: MessageCreate) -> dict:
+        """
+        Per-request LLM options: temperature, and whether the response cache may
+        be used (a conversation opts out with metadata.response_cache = false).
+        """
+        options = {"temperature": DEFAULT_TEMPERATURE if data.temperature is None else data.temperature}
+        if data.cache is False or (conversation.get("metadata") or {}).get("response_cache") is False:
+            options["cache"] = False
+        return options
 
     @staticmethod
-    async def process_chat_message(user_id: str, conversation_id: str, data: MessageCreate):
+    async def process_chat_message(user_id: str, conversation_id: str, data: MessageCreate, priority: str = "interactive"):
         # 1. Verify ownership/existence
-        conv_res = supabase.table("conversations").select("*").eq("id", conversation_id).eq("user_id", user_id).execute()
-        if not conv_res.data:
-            raise HTTPException(status_code=404, detail="Conversation not found")
-        conversation = conv_res.data[0]
+        conversation = await ConversationService.get_conversation(user_id, conversation_id, cached=True)
+        await user_quota.admit(user_id)
         
         # 2. Store User Message
         user_tokens = count_tokens(data.content)
@@ -49,16 +122,14 @@ class MessageService:
         )
         
         # 3. Retrieve Context (History)
-        # Simple strategy: last 10 messages for now. Real implementation needs smarter windowing.
-        history = await MessageService.get_messages(conversation_id, limit=10)
-        messages_payload = [{"role": msg["role"], "content": msg["content"]} for msg in history]
-        
-        # Add system prompt if exists
-        if conversation.get("system_prompt"):
-             messages_payload.insert(0, {"role": "system", "content": conversation["system_prompt"]})
+        # Most recent messages that fit the model's token budget, system prompt included
+        model = data.model or conversation["model"]
+        with timed("context"):
+            messages_payload, prompt_tokens = await ContextBuilder.build(conversation, model)
+        history = [msg for msg in messages_payload if msg["role"] != "system"]
+        await user_quota.charge(user_id, prompt_tokens)
 
         # 4. Call LLM (Non-streaming)
-        model = data.model or conversation["model"]
         client = get_llm_client()
         
         start_time = time.time()
@@ -68,16 +139,33 @@ class MessageService:
         # For now, let's consume the stream to simulate non-streaming.
         full_response = ""
         finish_reason = None
+        cached = False
+        token_counter = IncrementalTokenCounter(model)
+        timer = StreamTimer(model)
         
-        async for chunk in client.stream_chat(messages_payload, model):
+        async for chunk in client.stream_chat(messages_payload, model, priority=priority, **MessageService.sampling_options(conversation, data)):
+            cached = cached or chunk.get("cached", False)
             if "error" in chunk:
-                raise HTTPException(status_code=502, detail=chunk["error"])
+                timer.error(chunk.get("status_code"))
+                retry_after = chunk.get("retry_after")
+                headers = {"Retry-After": str(math.ceil(retry_after))} if retry_after is not None else None
+                if chunk.get("overloaded"):
+                    # Our own admission queue is full: tell the client when to come back
+                    raise HTTPException(status_code=503, detail=chunk["error"], headers=headers)
+                raise HTTPException(status_code=502, detail=chunk["error"], headers=headers)
             full_response += chunk.get("content", "")
+            token_counter.feed(chunk.get("content", ""))
+            timer.chunk(chunk.get("content", ""), cached)
             if chunk.get("finish_reason"):
                 finish_reason = chunk["finish_reason"]
                 
         latency = int((time.time() - start_time) * 1000)
-        output_tokens = count_tokens(full_response)
+        output_tokens = token_counter.total
+        timer.finish(output_tokens)
+        # A cache hit made no upstream call, so the reply isn't billed. Its
+        # prompt was charged above, before the hit was known.
+        if not cached:
+            await user_quota.charge(user_id, output_tokens)
         
         # 5. Store Assistant Message
         assistant_msg = await MessageService.add_message(
@@ -87,7 +175,10 @@ class MessageService:
             model=model,
             token_count=output_tokens,
             finish_reason=finish_reason,
-            latency_ms=latency
+            latency_ms=latency,
+            input_tokens=0 if cached else prompt_tokens,
+            output_tokens=0 if cached else output_tokens,
+            metadata=MessageService.assistant_metadata(cached)
         )
         
         # 6. Auto-title if first user message (simple check: total messages <= 2)
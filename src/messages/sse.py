@@ -0,0 +1,118 @@
+import asyncio
+import json
+from json.encoder import encode_basestring_ascii
+from typing import Any, AsyncIterator, Dict, Optional
+
+# Each event is emitted as a single string ("event: ...\ndata: ...\n\n"), so it
+# goes out as one ASGI send. Payloads match json.dumps output byte for byte.
+
+def event(name: str, payload: Dict[str, Any]) -> str:
+    return f"event: {name}\ndata: {json.dumps(payload)}\n\n"
+
+CONTENT_BLOCK_START = event("content_block_start", {"type": "content_block_start", "index": 0, "content_block": {"type": "text", "text": ""}})
+CONTENT_BLOCK_STOP = event("content_block_stop", {"type": "content_block_stop", "index": 0})
+MESSAGE_STOP = event("message_stop", {"type": "message_stop"})
+
+# Provider chunks that carry nothing but text and can be merged
+_MERGEABLE_KEYS = {"content", "finish_reason"}
+
+_TEXT_DELTA_PREFIX = 'event: content_block_delta\ndata: {"type": "content_block_delta", "index": 0, "delta": {"type": "text_delta", "text": '
+_TEXT_DELTA_SUFFIX = "}}\n\n"
+
+def text_delta(text: str) -> str:
+    """
+    content_block_delta frame for a piece of text: the only per-token event,
+    so it is built from a fixed template plus the C string escaper.
+    """
+    return _TEXT_DELTA_PREFIX + encode_basestring_ascii(text) + _TEXT_DELTA_SUFFIX
+
+def message_start(message_id: str, model: str, input_tokens: int) -> str:
+    return event("message_start", {"type": "message_start", "message": {"id": message_id, "role": "assistant", "model": model, "usage": {"input_tokens": input_tokens}}})
+
+def message_delta(stop_reason: str, output_tokens: int) -> str:
+    return event("message_delta", {"type": "message_delta", "delta": {"stop_reason": stop_reason}, "usage": {"output_tokens": output_tokens}})
+
+def queued(position: int) -> str:
+    # Sent while the request waits for an upstream slot
+    return event("queued", {"type": "queued", "position": position})
+
+def error(message: str, error_type: str = "api_error", retry_after: Optional[float] = None) -> str:
+    body = {"type": error_type, "message": message}
+    if retry_after is not None:
+        body["retry_after"] = retry_after
+    return event("error", {"type": "error", "error": body})
+
+async def _aclose(iterator: AsyncIterator[Any]):
+    aclose = getattr(iterator, "aclose", None)
+    if aclose is not None:
+        await aclose()
+
+async def coalesce_chunks(chunks: AsyncIterator[Dict[str, Any]], window_ms: int, max_chars: int) -> AsyncIterator[Dict[str, Any]]:
+    """
+    Merge consecutive content-only chunks from the provider into one, flushing
+    when the first buffered delta is window_ms old, when max_chars are
+    buffered, or when any other chunk (finish, error) arrives. window_ms <= 0
+    passes chunks through unchanged.
+    """
+    iterator = chunks.__aiter__()
+    if window_ms <= 0:
+        try:
+            async for chunk in iterator:
+                yield chunk
+        finally:
+            await _aclose(iterator)
+        return
+
+    loop = asyncio.get_running_loop()
+    window = window_ms / 1000
+    pending = None
+    buffer = []
+    size = 0
+    deadline = None
+    try:
+        while True:
+            if pending is None:
+                pending = asyncio.ensure_future(iterator.__anext__())
+            timeout = None if deadline is None else deadline - loop.time()
+            if timeout is not None and timeout <= 0:
+                done = False
+            else:
+                # The pending read survives a timeout and is awaited again next round
+                done = bool((await asyncio.wait({pending}, timeout=timeout))[0])
+            if not done:
+                yield {"content": "".join(buffer), "finish_reason": None}
+                buffer, size, deadline = [], 0, None
+                continue
+
+            try:
+                chunk = pending.result()
+            except StopAsyncIteration:
+                pending = None
+                break
+            pending = None
+
+            content = chunk.get("content")
+            if content and not chunk.get("finish_reason") and chunk.keys() <= _MERGEABLE_KEYS:
+                buffer.append(content)
+                size += len(content)
+                if deadline is None:
+                    deadline = loop.time() + window
+                if size >= max_chars:
+                    yield {"content": "".join(buffer), "finish_reason": None}
+                    buffer, size, deadline = [], 0, None
+                continue
+
+            if buffer:
+                yield {"content": "".join(buffer), "finish_reason": None}
+                buffer, size, deadline = [], 0, None
+            yield chunk
+
+        if buffer:
+            yield {"content": "".join(buffer), "finish_reason": None}
+    finally:
+        if pending is not None:
+            # The consumer went away mid-read: stop the read, and let it unwind
+            pending.cancel()
+            await asyncio.gather(pending, return_exceptions=True)
+        # Close the provider generator now (and its HTTP response), not at GC time
+        await _aclose(iterator)
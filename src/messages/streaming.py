@@ -1,85 +1,130 @@
-import json
+import asyncio
 import time
 from typing import AsyncGenerator
+from src.config.settings import settings
 from src.llm.client import get_llm_client
-from src.db.client import supabase
+from src.messages import sse
+from src.llm.token_counter import IncrementalTokenCounter
+from src.messages.service import MessageService
+from src.messages.resumable import StreamSession, stream_registry
+from src.middleware.rate_limiter import user_quota
+from src.utils.metrics import StreamTimer
+
+def start_stream(
+    model: str,
+    messages: list,
+    temperature: float,
+    user_id: str,
+    conversation_id: str,
+    db_message_id: str = None,
+    prompt_tokens: int = 0,
+    cache: bool = None
+) -> StreamSession:
+    """
+    Starts generating in the background; the returned session can be read
+    (and re-read after a reconnect) with session.events().
+    """
+    source = _generate(model, messages, temperature, user_id, conversation_id, db_message_id, prompt_tokens, cache)
+    return stream_registry.start(user_id, conversation_id, source)
 
 async def stream_generator(
     model: str,
     messages: list,
     temperature: float,
-    user_id: str, # For logging or future use
+    user_id: str, # Charged for output tokens
     conversation_id: str,
-    db_message_id: str = None # if we want to update the DB row later
+    db_message_id: str = None, # if we want to update the DB row later
+    prompt_tokens: int = 0,
+    cache: bool = None
 ) -> AsyncGenerator[str, None]:
     """
     Generates SSE events in the specific format required.
     """
+    session = start_stream(model, messages, temperature, user_id, conversation_id, db_message_id, prompt_tokens, cache)
+    async for event in session.events():
+        yield event
+
+async def _generate(model, messages, temperature, user_id, conversation_id, db_message_id, prompt_tokens, cache):
     client = get_llm_client()
     
     # event: message_start
-    yield f"event: message_start\n"
-    yield f"data: {json.dumps({'type': 'message_start', 'message': {'id': db_message_id, 'role': 'assistant', 'model': model}})}\n\n"
+    yield sse.message_start(db_message_id, model, prompt_tokens)
     
     # event: content_block_start
-    yield f"event: content_block_start\n"
-    yield f"data: {json.dumps({'type': 'content_block_start', 'index': 0, 'content_block': {'type': 'text', 'text': ''}})}\n\n"
+    yield sse.CONTENT_BLOCK_START
 
     full_content = []
+    token_counter = IncrementalTokenCounter(model)
+    timer = StreamTimer(model)
     start_time = time.time()
     
     finish_reason = None
+    cached = False
     
-    async for chunk in client.stream_chat(messages, model, temperature):
-        if "error" in chunk:
-            yield f"event: error\n"
-            yield f"data: {json.dumps({'type': 'error', 'error': {'type': 'api_error', 'message': chunk['error']}})}\n\n"
-            return
+    chunks = sse.coalesce_chunks(
+        client.stream_chat(messages, model, temperature, cache=cache),
+        settings.SSE_COALESCE_WINDOW_MS,
+        settings.SSE_COALESCE_MAX_CHARS,
+    )
+    cancelled = None
+    try:
+        async for chunk in chunks:
+            if "error" in chunk:
+                timer.error(chunk.get("status_code"))
+                yield sse.error(chunk["error"], "overloaded_error" if chunk.get("overloaded") else "api_error", chunk.get("retry_after"))
+                return
+            if chunk.get("event") == "queued":
+                yield sse.queued(chunk["position"])
+                continue
+            cached = cached or chunk.get("cached", False)
 
-        content = chunk.get("content", "")
-        if content:
-            full_content.append(content)
-            # event: content_block_delta
-            yield f"event: content_block_delta\n"
-            yield f"data: {json.dumps({'type': 'content_block_delta', 'index': 0, 'delta': {'type': 'text_delta', 'text': content}})}\n\n"
+            content = chunk.get("content", "")
+            if content:
+                full_content.append(content)
+                token_counter.feed(content)
+                timer.chunk(content, cached)
+                # event: content_block_delta
+                yield sse.text_delta(content)
 
-        if chunk.get("finish_reason"):
-             finish_reason = chunk["finish_reason"]
-             # event: content_block_stop
-             yield f"event: content_block_stop\n"
-             yield f"data: {json.dumps({'type': 'content_block_stop', 'index': 0})}\n\n"
+            if chunk.get("finish_reason"):
+                 finish_reason = chunk["finish_reason"]
+                 # event: content_block_stop
+                 yield sse.CONTENT_BLOCK_STOP
             
-             # event: message_delta
-             yield f"event: message_delta\n"
-             yield f"data: {json.dumps({'type': 'message_delta', 'delta': {'stop_reason': finish_reason}, 'usage': {'output_tokens': 0}})}\n\n" # usage is placeholder until we count
+                 # event: message_delta
+                 yield sse.message_delta(finish_reason, token_counter.total)
             
-             # event: message_stop
-             yield f"event: message_stop\n"
-             yield f"data: {json.dumps({'type': 'message_stop'})}\n\n"
+                 # event: message_stop
+                 yield sse.MESSAGE_STOP
+    except asyncio.CancelledError as e:
+        # Client gone past the grace period (or shutdown): keep what was generated
+        cancelled = e
+        finish_reason = str(e.args[0]) if e.args and e.args[0] else "client_disconnect"
 
     # Post-stream: Save to DB
     final_text = "".join(full_content)
+    timer.finish(token_counter.total)
+    # A cache hit made no upstream call, so the reply isn't billed (its
+    # prompt was charged before the stream started)
+    if not cached:
+        await user_quota.charge(user_id, token_counter.total)
     if final_text:
         end_time = time.time()
         latency = int((end_time - start_time) * 1000)
-        # Import inside to avoid circular dependency (service imports streaming, streaming imports service)
-        from src.llm.token_counter import count_tokens
-        output_tokens = count_tokens(final_text)
-        
-        # We can't import MessageService easily due to circular imports with routes -> service -> streaming
-        # So we use the supabase client directly or refactor. Direct DB call is safest here.
+        output_tokens = token_counter.total
         
-        data = {
-            "conversation_id": conversation_id,
-            "role": "assistant",
-            "content": final_text,
-            "token_count": output_tokens,
-            "model": model,
-            "finish_reason": finish_reason or "stop",
-            "latency_ms": latency
-        }
-        try:
-             supabase.table("messages").insert(data).execute()
-        except Exception as e:
-             # Log error but don't crash stream (it's done anyway)
-             print(f"Failed to save streamed message: {e}")
+        # Queued on the write-behind writer, which retries and logs failures
+        await MessageService.add_message(
+            conversation_id=conversation_id,
+            role="assistant",
+            content=final_text,
+            model=model,
+            token_count=output_tokens,
+            finish_reason=finish_reason or "stop",
+            latency_ms=latency,
+            input_tokens=0 if cached else prompt_tokens,
+            output_tokens=0 if cached else output_tokens,
+            metadata=MessageService.assistant_metadata(cached)
+        )
+    if cancelled is not None:
+        raise cancelled
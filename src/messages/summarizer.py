@@ -0,0 +1,142 @@
+import asyncio
+import logging
+from typing import Dict, List, Optional
+
+from src.config.settings import settings
+from src.conversations.service import conversation_cache
+from src.db.database import db
+from src.llm.client import get_llm_client
+from src.llm.token_counter import count_tokens
+from src.utils.cache import TTLCache
+
+logger = logging.getLogger(__name__)
+
+SUMMARY_INSTRUCTIONS = (
+    "You maintain a running summary of a conversation between a user and an assistant. "
+    "Merge the existing summary with the new messages into one updated summary. Keep facts, "
+    "decisions, names, numbers, open questions and user preferences; drop pleasantries. "
+    "Write compact prose or bullets, no preamble."
+)
+
+def summary_prefix(summary: str) -> str:
+    return f"Summary of the earlier conversation:\n{summary}"
+
+def watermark(conversation: dict) -> Optional[dict]:
+    """
+    (created_at, id) of the last message the stored summary covers, if any.
+    """
+    if not conversation.get("summary") or not conversation.get("summary_through_id"):
+        return None
+    return {"created_at": conversation["summary_through_at"], "id": conversation["summary_through_id"]}
+
+class ConversationSummarizer:
+    """
+    Compacts long conversations in the background. When a turn's history
+    passes SUMMARY_TRIGGER_TOKENS, older messages (all but the most recent
+    SUMMARY_KEEP_RECENT_MESSAGES) are folded into the conversation's rolling
+    summary by SUMMARY_MODEL, and the watermark moves forward. The context
+    builder then sends the summary instead of those messages.
+    """
+
+    def __init__(self):
+        self._running: Dict[str, asyncio.Task] = {}
+        # Conversations summarized recently, so every turn doesn't re-check
+        self._recent = TTLCache(10000, settings.SUMMARY_COOLDOWN_SECONDS)
+        self.completed = 0
+        self.failed = 0
+
+    def schedule(self, conversation: dict):
+        conversation_id = str(conversation["id"])
+        if conversation_id in self._running or self._recent.get(conversation_id):
+            return
+        self._recent.set(conversation_id, True)
+        task = asyncio.create_task(self._summarize(conversation), name=f"summarize-{conversation_id}")
+        self._running[conversation_id] = task
+        task.add_done_callback(lambda _: self._running.pop(conversation_id, None))
+
+    async def stop(self):
+        """
+        Cancel summaries still running (they are redone on a later turn).
+        """
+        tasks = list(self._running.values())
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    @staticmethod
+    async def _messages_to_fold(conversation: dict) -> List[dict]:
+        conversation_id = conversation["id"]
+        # Everything older than the last few messages and newer than the watermark
+        recent = await db.select(
+            "messages",
+            columns="id, created_at",
+            filters={"conversation_id": conversation_id},
+            order=["created_at.desc", "id.desc"],
+            limit=settings.SUMMARY_KEEP_RECENT_MESSAGES,
+        )
+        if len(recent) < settings.SUMMARY_KEEP_RECENT_MESSAGES:
+            return []
+        rows = await db.select(
+            "messages",
+            columns="id, role, content, token_count, created_at",
+            filters={"conversation_id": conversation_id, "created_at__lt": recent[-1]["created_at"]},
+            order=["created_at.asc", "id.asc"],
+            limit=settings.CONTEXT_MAX_MESSAGES,
+            after=watermark(conversation),
+        )
+        selected = []
+        used = 0
+        for row in rows:
+            used += row.get("token_count") or count_tokens(row["content"])
+            if selected and used > settings.SUMMARY_MAX_INPUT_TOKENS:
+                break
+            selected.append(row)
+        return selected
+
+    async def _summarize(self, conversation: dict):
+        try:
+            rows = await self._messages_to_fold(conversation)
+            if not rows:
+                return
+            transcript = "\n\n".join(f"{row['role'].upper()}: {row['content']}" for row in rows)
+            prompt = f"Existing summary:\n{conversation.get('summary') or '(none)'}\n\nNew messages:\n{transcript}"
+            parts = []
+            async for chunk in get_llm_client().stream_chat(
+                [{"role": "system", "content": SUMMARY_INSTRUCTIONS}, {"role": "user", "content": prompt}],
+                settings.SUMMARY_MODEL,
+                temperature=0,
+                max_tokens=settings.SUMMARY_MAX_TOKENS,
+                priority="batch",
+            ):
+                if "error" in chunk:
+                    raise RuntimeError(chunk["error"])
+                parts.append(chunk.get("content") or "")
+            summary = "".join(parts).strip()
+            if not summary:
+                return
+
+            last = rows[-1]
+            previous = conversation.get("summary_through_id")
+            # Only move the watermark if nobody else did in the meantime
+            updated = await db.update(
+                "conversations",
+                {
+                    "summary": summary,
+                    "summary_token_count": count_tokens(summary, settings.SUMMARY_MODEL),
+                    "summary_through_at": last["created_at"],
+                    "summary_through_id": last["id"],
+                },
+                {"id": conversation["id"], "summary_through_id": previous},
+            )
+            if updated:
+                conversation_cache.set((str(updated[0]["user_id"]), str(updated[0]["id"])), updated[0])
+                self.completed += 1
+                logger.info(f"Summarized {len(rows)} messages of conversation {conversation['id']}")
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            self.failed += 1
+            logger.error(f"Summarizing conversation {conversation['id']} failed: {e}")
+
+# Singleton instance
+conversation_summarizer = ConversationSummarizer()
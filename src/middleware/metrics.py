@@ -0,0 +1,37 @@
+import time
+
+from src.utils.metrics import HTTP_REQUEST_DURATION, start_request_timings
+
+class MetricsMiddleware:
+    """
+    Records per-route latency histograms and starts the per-request timing
+    breakdown. Plain ASGI (not BaseHTTPMiddleware) so it runs in the
+    request's own task and sees streaming responses through to the end.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        start = time.perf_counter()
+        start_request_timings()
+        status = 500
+
+        async def send_wrapper(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            # Route templates keep the label set bounded (no ids in paths)
+            route = scope.get("route")
+            HTTP_REQUEST_DURATION.labels(
+                scope["method"], getattr(route, "path", "unmatched"), str(status)
+            ).observe(time.perf_counter() - start)
@@ -1,7 +1,15 @@
+import logging
+import math
+
 from slowapi import Limiter, _rate_limit_exceeded_handler
 from slowapi.util import get_remote_address
 from slowapi.errors import RateLimitExceeded
-from fastapi import Request
+from fastapi import HTTPException, Request, status
+
+from src.config.settings import settings
+from src.utils.token_bucket import BucketStore, MemoryBucketStore, SQLiteBucketStore
+
+logger = logging.getLogger(__name__)
 
 # Global limiter instance
 limiter = Limiter(key_func=get_remote_address)
@@ -11,3 +19,57 @@ def rate_limit_handler(request: Request, exc: RateLimitExceeded):
     Handles 429 Too Many Requests errors.
     """
     return _rate_limit_exceeded_handler(request, exc)
+
+class UserQuota:
+    """
+    Per-user requests-per-minute and tokens-per-minute buckets for LLM calls.
+    admit() runs before a chat turn: it takes one request and refuses users
+    whose token bucket is in debt. Prompt tokens are charged once the context
+    is built (before the provider call) and output tokens after the reply,
+    so the next request pays for any overshoot. A limit of 0 turns that
+    bucket off.
+    """
+
+    def __init__(self, store: BucketStore):
+        self.store = store
+        self.rejected = 0
+
+    def _exceeded(self, what: str, wait: float) -> HTTPException:
+        self.rejected += 1
+        return HTTPException(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            detail=f"{what} rate limit exceeded",
+            headers={"Retry-After": str(max(1, math.ceil(wait)))},
+        )
+
+    async def admit(self, user_id: str):
+        if settings.RATE_LIMIT_TOKENS_PER_MINUTE > 0:
+            # A zero-sized take only checks that the bucket isn't in debt
+            rate = settings.RATE_LIMIT_TOKENS_PER_MINUTE / 60
+            wait = await self.store.take(f"tokens:{user_id}", 0, rate, settings.RATE_LIMIT_TOKENS_PER_MINUTE)
+            if wait:
+                raise self._exceeded("Token", wait)
+        if settings.RATE_LIMIT_REQUESTS_PER_MINUTE > 0:
+            rate = settings.RATE_LIMIT_REQUESTS_PER_MINUTE / 60
+            wait = await self.store.take(f"requests:{user_id}", 1, rate, settings.RATE_LIMIT_REQUESTS_PER_MINUTE)
+            if wait:
+                raise self._exceeded("Request", wait)
+
+    async def charge(self, user_id: str, tokens: int):
+        """
+        Record tokens used by a turn. Never rejects; debt delays the next request.
+        """
+        if settings.RATE_LIMIT_TOKENS_PER_MINUTE <= 0 or tokens <= 0:
+            return
+        rate = settings.RATE_LIMIT_TOKENS_PER_MINUTE / 60
+        await self.store.take(f"tokens:{user_id}", tokens, rate, settings.RATE_LIMIT_TOKENS_PER_MINUTE, force=True)
+
+def build_bucket_store() -> BucketStore:
+    if settings.RATE_LIMIT_STORAGE == "sqlite":
+        return SQLiteBucketStore(settings.RATE_LIMIT_SQLITE_PATH)
+    if settings.RATE_LIMIT_STORAGE != "memory":
+        logger.warning(f"Unknown RATE_LIMIT_STORAGE {settings.RATE_LIMIT_STORAGE!r}, using memory")
+    return MemoryBucketStore()
+
+# Singleton instance
+user_quota = UserQuota(build_bucket_store())
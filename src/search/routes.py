@@ -0,0 +1,35 @@
+from fastapi import APIRouter, Depends, HTTPException, Query, Response
+from datetime import date
+from typing import List, Literal, Optional
+from uuid import UUID
+from src.auth.dependencies import get_current_user
+from src.search.schemas import MessageSearchResult
+from src.search.service import SearchService
+
+router = APIRouter(prefix="/search", tags=["Search"])
+
+@router.get("/messages", response_model=List[MessageSearchResult])
+async def search_messages(
+    response: Response,
+    q: str = Query(..., min_length=1, max_length=500, description="Search terms; supports \"phrases\", or, and -exclusions"),
+    conversation_id: Optional[UUID] = None,
+    model: Optional[str] = None,
+    role: Optional[Literal["user", "assistant", "system"]] = None,
+    start_date: Optional[date] = Query(None, description="First UTC day to include"),
+    end_date: Optional[date] = Query(None, description="Last UTC day to include"),
+    sort: Literal["rank", "recent"] = "rank",
+    limit: int = Query(20, ge=1, le=100),
+    cursor: Optional[str] = Query(None, description="X-Next-Cursor from the previous page"),
+    current_user: dict = Depends(get_current_user)
+):
+    if start_date and end_date and start_date > end_date:
+        raise HTTPException(status_code=400, detail="start_date must not be after end_date")
+    results, next_cursor = await SearchService.search_messages(
+        current_user["id"], q,
+        conversation_id=str(conversation_id) if conversation_id else None,
+        model=model, role=role, start_date=start_date, end_date=end_date,
+        sort=sort, limit=limit, cursor=cursor,
+    )
+    if next_cursor:
+        response.headers["X-Next-Cursor"] = next_cursor
+    return results
@@ -0,0 +1,14 @@
+from pydantic import BaseModel
+from typing import Literal, Optional
+from datetime import datetime
+from uuid import UUID
+
+class MessageSearchResult(BaseModel):
+    id: UUID
+    conversation_id: UUID
+    conversation_title: Optional[str]
+    role: Literal["user", "assistant", "system"]
+    model: Optional[str]
+    created_at: datetime
+    rank: float
+    snippet: str  # Matched terms wrapped in <mark></mark>
@@ -0,0 +1,53 @@
+from datetime import date, datetime, time, timedelta, timezone
+from typing import List, Optional, Tuple
+
+from src.db.database import db
+from src.utils.pagination import decode_cursor, next_cursor
+
+# Keyset orders per sort; must match the ORDER BY in search_messages()
+SEARCH_ORDERS = {
+    "rank": ["rank.desc", "id.desc"],
+    "recent": ["created_at.desc", "id.desc"],
+}
+
+def _day_start(day: date) -> datetime:
+    return datetime.combine(day, time.min, tzinfo=timezone.utc)
+
+class SearchService:
+    @staticmethod
+    async def search_messages(
+        user_id: str,
+        query: str,
+        conversation_id: Optional[str] = None,
+        model: Optional[str] = None,
+        role: Optional[str] = None,
+        start_date: Optional[date] = None,
+        end_date: Optional[date] = None,
+        sort: str = "rank",
+        limit: int = 20,
+        cursor: Optional[str] = None,
+    ) -> Tuple[List[dict], Optional[str]]:
+        """
+        Returns (results, next_cursor). Matching runs in Postgres against the
+        GIN-indexed content_tsv column (search_messages() in
+        database/migrations/0002_message_search.sql);
+        the query accepts web-search syntax ("quoted phrases", -exclusions, or).
+        """
+        order = SEARCH_ORDERS[sort]
+        after = decode_cursor(cursor, order) if cursor else {}
+        rows = await db.rpc("search_messages", {
+            "p_user_id": user_id,
+            "p_query": query,
+            "p_conversation_id": conversation_id,
+            "p_model": model,
+            "p_role": role,
+            "p_created_from": _day_start(start_date) if start_date else None,
+            # end_date is inclusive (UTC days, as in /usage/stats)
+            "p_created_before": _day_start(end_date + timedelta(days=1)) if end_date else None,
+            "p_sort": sort,
+            "p_after_rank": after.get("rank"),
+            "p_after_created_at": after.get("created_at"),
+            "p_after_id": after.get("id"),
+            "p_limit": limit + 1,
+        })
+        return rows, next_cursor(rows, limit, order)
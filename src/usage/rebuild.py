@@ -0,0 +1,28 @@
+"""
+Backfill or repair the usage rollup tables from the raw messages/conversations.
+
+    python -m src.usage.rebuild                 # every user
+    python -m src.usage.rebuild --user-id UUID  # one user
+"""
+import argparse
+import asyncio
+
+from src.db.database import db
+
+async def rebuild(user_id: str = None) -> int:
+    await db.connect()
+    try:
+        rows = await db.rpc("rebuild_usage_rollups", {"p_user_id": user_id})
+    finally:
+        await db.close()
+    return rows[0]["users_rebuilt"] if rows else 0
+
+def main():
+    parser = argparse.ArgumentParser(description="Rebuild usage rollups")
+    parser.add_argument("--user-id", help="Only rebuild this user's rollups")
+    args = parser.parse_args()
+    users = asyncio.run(rebuild(args.user_id))
+    print(f"Rebuilt usage rollups for {users} user(s)")
+
+if __name__ == "__main__":
+    main()
@@ -1,57 +1,21 @@
-from fastapi import APIRouter, Depends
+from fastapi import APIRouter, Depends, HTTPException, Query
+from datetime import date
+from typing import Optional
 from src.auth.dependencies import get_current_user
 from src.usage.schemas import UsageStats
-from src.db.client import supabase
-from src.utils.cost_tracker import calculate_cost
+from src.usage.service import UsageService
 
 router = APIRouter(prefix="/usage", tags=["Usage"])
 
 @router.get("/stats", response_model=UsageStats)
-async def get_usage_stats(current_user: dict = Depends(get_current_user)):
-    user_id = current_user["id"]
-    
-    # 1. Total Conversations
-    conv_res = supabase.table("conversations").select("id", count="exact").eq("user_id", user_id).execute()
-    total_conversations = conv_res.count
-    
-    # 2. Get all messages for user (via join or direct query if we had user_id on messages, but we don't)
-    # So we must query messages for conversations owned by user.
-    # Supabase/PostgREST supports nested resource embedding.
-    
-    # Query: conversations(messages(token_count, model))
-    # This might be heavy for a lot of data, but acceptable for this scope.
-    # Alternatively, efficient SQL view or RPC would be better in production.
-    res = supabase.table("conversations").select("messages(token_count, model, role)").eq("user_id", user_id).execute()
-    
-    total_messages = 0
-    total_tokens = 0
-    cost_estimate = 0.0
-    models = set()
-    
-    for conv in res.data:
-        msgs = conv.get("messages", [])
-        total_messages += len(msgs)
-        for msg in msgs:
-            tokens = msg.get("token_count", 0)
-            model = msg.get("model")
-            role = msg.get("role")
-            
-            total_tokens += tokens
-            if model:
-                models.add(model)
-                # Simple cost estimation logic
-                # We need input/output distinction for accurate cost
-                # For now, we'll assume a 50/50 split or just apply a flat rate if distinction is lost
-                # Improvement: Store input/output tokens separately in DB
-                cost_estimate += calculate_cost(model, 0, tokens) # Treating all as output for conservative estimate or similar
-
-    return {
-        "total_conversations": total_conversations,
-        "total_messages": total_messages,
-        "total_tokens": total_tokens,
-        "cost_estimate_usd": round(cost_estimate, 6),
-        "models_used": list(models)
-    }
+async def get_usage_stats(
+    start_date: Optional[date] = Query(None, description="First UTC day to include"),
+    end_date: Optional[date] = Query(None, description="Last UTC day to include"),
+    current_user: dict = Depends(get_current_user)
+):
+    if start_date and end_date and start_date > end_date:
+        raise HTTPException(status_code=400, detail="start_date must not be after end_date")
+    return await UsageService.get_usage_stats(current_user["id"], start_date, end_date)
 
 @router.get("/models")
 async def list_models(current_user: dict = Depends(get_current_user)):
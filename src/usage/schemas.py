@@ -1,9 +1,14 @@
 from pydantic import BaseModel
-from typing import List, Dict
+from typing import List, Dict, Optional
+from datetime import date
 
 class UsageStats(BaseModel):
     total_conversations: int
     total_messages: int
     total_tokens: int
+    input_tokens: int = 0
+    output_tokens: int = 0
     cost_estimate_usd: float
     models_used: List[str]
+    start_date: Optional[date] = None
+    end_date: Optional[date] = None
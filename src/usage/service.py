@@ -0,0 +1,43 @@
+from datetime import date
+from typing import Optional
+from src.db.database import db
+
+class UsageService:
+    @staticmethod
+    async def get_usage_stats(user_id: str, start_date: Optional[date] = None, end_date: Optional[date] = None):
+        """
+        Read usage from the trigger-maintained rollups (see database/migrations/0001_initial_schema.sql).
+        Without a date range this is a single-row lookup.
+        """
+        if start_date is None and end_date is None:
+            rows = await db.select("usage_totals", filters={"user_id": user_id})
+            totals = rows[0] if rows else {}
+            models = sorted(totals.get("models") or [])
+        else:
+            filters = {"user_id": user_id}
+            if start_date is not None:
+                filters["day__gte"] = start_date
+            if end_date is not None:
+                filters["day__lte"] = end_date
+            # One row per (day, model) in the range
+            rows = await db.select("usage_daily", filters=filters)
+            totals = {
+                key: sum(row.get(key) or 0 for row in rows)
+                for key in ("conversations", "messages", "input_tokens", "output_tokens")
+            }
+            totals["cost_usd"] = sum(float(row.get("cost_usd") or 0) for row in rows)
+            models = sorted({row["model"] for row in rows if row.get("model") and row.get("messages")})
+
+        input_tokens = int(totals.get("input_tokens") or 0)
+        output_tokens = int(totals.get("output_tokens") or 0)
+        return {
+            "total_conversations": int(totals.get("conversations") or 0),
+            "total_messages": int(totals.get("messages") or 0),
+            "total_tokens": input_tokens + output_tokens,
+            "input_tokens": input_tokens,
+            "output_tokens": output_tokens,
+            "cost_estimate_usd": round(float(totals.get("cost_usd") or 0), 6),
+            "models_used": models,
+            "start_date": start_date,
+            "end_date": end_date,
+        }
@@ -0,0 +1,123 @@
+import asyncio
+import logging
+from collections import deque
+from typing import Any, AsyncIterator, Callable, Deque, Optional
+
+logger = logging.getLogger(__name__)
+
+class ReplayGap(LookupError):
+    """
+    The requested items were already dropped from a bounded buffer.
+    """
+
+class BroadcastCancelled(Exception):
+    """
+    The source was cancelled before it finished; reason is the cancel message.
+    """
+
+    def __init__(self, reason: str = "cancelled"):
+        super().__init__(reason)
+        self.reason = reason
+
+class ReplayBroadcast:
+    """
+    Runs one async iterator in a background task and fans its items out to any
+    number of subscribers. A subscriber first gets everything produced so far,
+    then live items as they arrive. If every subscriber leaves before the
+    source is exhausted, the source is cancelled (unless cancel_when_idle is
+    off). With max_items only the most recent items are kept; items are
+    still numbered from 0, and older indexes raise ReplayGap. Subscribers
+    of a source that was cancelled get BroadcastCancelled after the last item.
+    """
+
+    def __init__(
+        self,
+        source: AsyncIterator[Any],
+        on_done: Optional[Callable[[], None]] = None,
+        max_items: Optional[int] = None,
+        cancel_when_idle: bool = True,
+    ):
+        self.items: Deque[Any] = deque(maxlen=max_items)
+        # Index of items[0]: how many items the ring buffer has dropped
+        self.offset = 0
+        self.subscribers = 0
+        self.cancel_when_idle = cancel_when_idle
+        self.error: Optional[BaseException] = None
+        self._source = source
+        self._on_done = on_done
+        self._signal = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+        self._closing = False
+
+    @property
+    def done(self) -> bool:
+        return self._task is not None and self._task.done()
+
+    @property
+    def joinable(self) -> bool:
+        """
+        True while a new subscriber would still see the whole output.
+        """
+        return not self._closing and self.error is None and self.offset == 0
+
+    @property
+    def produced(self) -> int:
+        return self.offset + len(self.items)
+
+    def start(self) -> asyncio.Task:
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+        return self._task
+
+    def _notify(self):
+        signal, self._signal = self._signal, asyncio.Event()
+        signal.set()
+
+    async def _run(self):
+        try:
+            async for item in self._source:
+                if len(self.items) == self.items.maxlen:
+                    self.offset += 1
+                self.items.append(item)
+                self._notify()
+        except asyncio.CancelledError as e:
+            # Subscribers get an ordinary exception: a CancelledError raised
+            # into their own tasks would look like they were cancelled too
+            self.error = BroadcastCancelled(str(e.args[0]) if e.args and e.args[0] else "cancelled")
+            raise
+        except Exception as e:
+            self.error = e
+            logger.error(f"Broadcast source failed: {e}")
+        finally:
+            aclose = getattr(self._source, "aclose", None)
+            if aclose is not None:
+                await aclose()
+            self._notify()
+            if self._on_done is not None:
+                self._on_done()
+
+    async def subscribe(self, start: int = 0) -> AsyncIterator[Any]:
+        """
+        Items from index start onwards: the replay, then live ones. Raises
+        ReplayGap if the subscriber falls behind the buffer.
+        """
+        self.subscribers += 1
+        self.start()
+        index = start
+        try:
+            while True:
+                while index < self.produced:
+                    if index < self.offset:
+                        raise ReplayGap(f"item {index} was dropped (oldest kept is {self.offset})")
+                    yield self.items[index - self.offset]
+                    index += 1
+                if self.done:
+                    if self.error is not None:
+                        raise self.error
+                    return
+                await self._signal.wait()
+        finally:
+            self.subscribers -= 1
+            if self.subscribers == 0 and self.cancel_when_idle and not self.done:
+                self._closing = True
+                self._task.cancel()
@@ -1,8 +1,19 @@
+import json
+import logging
+from functools import lru_cache
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from src.config.settings import settings
+
+logger = logging.getLogger(__name__)
+
 # Pricing per 1M tokens (USD)
 # As of late 2024 / early 2025 estimates
-PRICING = {
+DEFAULT_PRICING = {
     # Groq (Free tier exists, but for estimation)
-    "llama3-8b-8192": {"input": 0.05, "output": 0.08}, 
+    "llama3-8b-8192": {"input": 0.05, "output": 0.08},
     "llama3-70b-8192": {"input": 0.59, "output": 0.79},
     "mixtral-8x7b-32768": {"input": 0.24, "output": 0.24},
     "gemma-7b-it": {"input": 0.07, "output": 0.07},
@@ -11,23 +22,85 @@ PRICING = {
     "gpt-4-turbo": {"input": 10.00, "output": 30.00},
 }
 
+def load_pricing() -> Dict[str, Dict[str, float]]:
+    """
+    Default prices, overridden by MODEL_PRICING_FILE (JSON) and then by the
+    MODEL_PRICING setting. Both use the same {model: {"input", "output"}} shape.
+    """
+    pricing = dict(DEFAULT_PRICING)
+    if settings.MODEL_PRICING_FILE:
+        try:
+            with open(settings.MODEL_PRICING_FILE, encoding="utf-8") as f:
+                pricing.update(json.load(f))
+        except (OSError, ValueError) as e:
+            logger.error(f"Could not load MODEL_PRICING_FILE {settings.MODEL_PRICING_FILE}: {e}")
+    pricing.update(settings.MODEL_PRICING)
+    return pricing
+
+class PricingIndex:
+    """
+    Resolves a model name to its per-token (input, output) rates once.
+    Versioned names ("gpt-4-turbo-2024-04-09") match the longest known key
+    they contain, so the result doesn't depend on dict order.
+    """
+
+    def __init__(self, pricing: Dict[str, Dict[str, float]]):
+        self.rates = {
+            key.lower(): (float(price["input"]) / 1_000_000, float(price["output"]) / 1_000_000)
+            for key, price in pricing.items()
+        }
+        # Longest keys first so the first substring hit is the longest match
+        self._keys = sorted(self.rates, key=len, reverse=True)
+        # Bounded: model names can come straight from requests
+        self.key = lru_cache(maxsize=1024)(self._key)
+
+    def _key(self, model: str) -> Optional[str]:
+        """
+        The price key a model name resolves to, or None if it has no price.
+        """
+        model_key = (model or "").lower()
+        if model_key in self.rates:
+            return model_key
+        for key in self._keys:
+            if key in model_key:
+                return key
+        return None
+
+    def resolve(self, model: str) -> Optional[Tuple[float, float]]:
+        key = self.key(model)
+        return self.rates[key] if key is not None else None
+
+    def cost(self, model: str, input_tokens: int, output_tokens: int) -> float:
+        rates = self.resolve(model)
+        if not rates:
+            return 0.0
+        return round(input_tokens * rates[0] + output_tokens * rates[1], 6)
+
+    def cost_batch(self, models: Sequence[str], input_tokens: Sequence[int], output_tokens: Sequence[int]) -> np.ndarray:
+        """
+        Cost many rows at once: each distinct model is resolved once and the
+        arithmetic runs over whole columns.
+        """
+        if not len(models):
+            return np.zeros(0)
+        distinct = {}
+        model_idx = np.fromiter((distinct.setdefault(m, len(distinct)) for m in models), dtype=np.int64, count=len(models))
+        rate_table = np.array([self.resolve(m) or (0.0, 0.0) for m in distinct], dtype=np.float64)
+        rates = rate_table[model_idx]
+        costs = np.asarray(input_tokens, dtype=np.float64) * rates[:, 0] + np.asarray(output_tokens, dtype=np.float64) * rates[:, 1]
+        return np.round(costs, 6)
+
+PRICING = load_pricing()
+pricing_index = PricingIndex(PRICING)
+
 def calculate_cost(model: str, input_tokens: int, output_tokens: int) -> float:
     """
     Calculate the estimated cost of a request.
     """
-    # Normalize model name slightly to match keys
-    model_key = model.lower()
-    # Partial match setup
-    price_info = None
-    for key in PRICING:
-        if key in model_key:
-            price_info = PRICING[key]
-            break
-            
-    if not price_info:
-        return 0.0
-        
-    input_cost = (input_tokens / 1_000_000) * price_info["input"]
-    output_cost = (output_tokens / 1_000_000) * price_info["output"]
-    
-    return round(input_cost + output_cost, 6)
+    return pricing_index.cost(model, input_tokens, output_tokens)
+
+def calculate_costs(models: Sequence[str], input_tokens: Sequence[int], output_tokens: Sequence[int]) -> List[float]:
+    """
+    Vectorized calculate_cost over parallel columns of (model, input, output).
+    """
+    return pricing_index.cost_batch(models, input_tokens, output_tokens).tolist()
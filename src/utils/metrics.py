@@ -0,0 +1,170 @@
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, Iterator, Optional
+
+from prometheus_client import Counter, Gauge, Histogram
+from prometheus_client.core import CounterMetricFamily, GaugeMetricFamily, REGISTRY
+
+from src.utils.cost_tracker import pricing_index
+
+# Buckets in seconds: most of our spans sit between a millisecond and a minute
+_LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+HTTP_REQUEST_DURATION = Histogram(
+    "http_request_duration_seconds", "HTTP request latency (whole response, streams included)",
+    ["method", "route", "status"], buckets=_LATENCY_BUCKETS,
+)
+DB_QUERY_DURATION = Histogram(
+    "db_query_duration_seconds", "Data layer call latency", ["table", "operation"], buckets=_LATENCY_BUCKETS,
+)
+LLM_TIME_TO_FIRST_TOKEN = Histogram(
+    "llm_time_to_first_token_seconds", "Time from calling the provider to the first text chunk", ["model", "cached"],
+    buckets=_LATENCY_BUCKETS,
+)
+LLM_INTER_TOKEN_GAP = Histogram(
+    "llm_inter_token_gap_seconds", "Time between consecutive text chunks", ["model"],
+    buckets=(0.001, 0.005, 0.01, 0.02, 0.05, 0.1, 0.25, 0.5, 1, 2.5),
+)
+LLM_TOKENS_PER_SECOND = Histogram(
+    "llm_output_tokens_per_second", "Output tokens per second after the first token", ["model"],
+    buckets=(5, 10, 25, 50, 100, 200, 400, 800, 1600),
+)
+LLM_STREAM_ERRORS = Counter("llm_stream_errors_total", "Provider errors surfaced to clients", ["model", "status"])
+LLM_STREAMS_CANCELLED = Counter("llm_streams_cancelled_total", "Generations stopped before the provider finished", ["reason"])
+ACTIVE_STREAMS = Gauge("sse_active_streams", "SSE responses currently streaming")
+
+def model_label(model: str) -> str:
+    """
+    The model as a metric label. Model names come from requests, so only the
+    price keys they resolve to are used; anything else is "other".
+    """
+    return pricing_index.key(model) or "other"
+
+# Per-request timing breakdown (milliseconds by phase), set by the metrics
+# middleware and filled in by auth, the data layer and the chat handlers.
+_request_timings: ContextVar[Optional[Dict[str, float]]] = ContextVar("request_timings", default=None)
+
+def start_request_timings() -> Dict[str, float]:
+    timings: Dict[str, float] = {}
+    _request_timings.set(timings)
+    return timings
+
+def current_timings() -> Dict[str, float]:
+    """
+    Snapshot of the current request's timings, rounded to 0.1ms ({} outside a request).
+    """
+    timings = _request_timings.get()
+    return {name: round(value, 1) for name, value in timings.items()} if timings else {}
+
+def add_timing(name: str, seconds: float):
+    timings = _request_timings.get()
+    if timings is not None:
+        timings[f"{name}_ms"] = timings.get(f"{name}_ms", 0.0) + seconds * 1000
+
+def set_timing(name: str, milliseconds: float):
+    timings = _request_timings.get()
+    if timings is not None:
+        timings[f"{name}_ms"] = milliseconds
+
+@contextmanager
+def timed(name: str) -> Iterator[None]:
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        add_timing(name, time.perf_counter() - start)
+
+class StreamTimer:
+    """
+    Times one provider stream: time to first token, gaps between chunks and
+    output rate. Results go to the histograms and the request timings.
+    """
+
+    def __init__(self, model: str):
+        self.model = model_label(model)
+        self.start = time.perf_counter()
+        self.first_at: Optional[float] = None
+        self.last_at: Optional[float] = None
+        self.cached = False
+
+    def chunk(self, content: str, cached: bool = False):
+        if not content:
+            return
+        now = time.perf_counter()
+        if self.first_at is None:
+            self.first_at = now
+            self.cached = cached
+            LLM_TIME_TO_FIRST_TOKEN.labels(self.model, str(cached).lower()).observe(now - self.start)
+            set_timing("ttft", (now - self.start) * 1000)
+        else:
+            LLM_INTER_TOKEN_GAP.labels(self.model).observe(now - self.last_at)
+        self.last_at = now
+
+    def error(self, status_code: Optional[int]):
+        LLM_STREAM_ERRORS.labels(self.model, str(status_code or "connect")).inc()
+
+    def finish(self, output_tokens: int):
+        now = time.perf_counter()
+        set_timing("llm", (now - self.start) * 1000)
+        # Replayed cache hits would report absurd rates
+        if self.first_at is not None and not self.cached and self.last_at > self.first_at:
+            LLM_TOKENS_PER_SECOND.labels(self.model).observe(output_tokens / (self.last_at - self.first_at))
+
+class _StatsCollector:
+    """
+    Exposes counters that live on in-process objects (caches, admission
+    queue, message writer) at scrape time.
+    """
+
+    def describe(self):
+        # Without this, register() calls collect() straight away, importing
+        # the services above while the data layer is still being imported
+        return []
+
+    def collect(self):
+        from src.auth.dependencies import rejected_token_cache, token_cache
+        from src.conversations.service import conversation_cache
+        from src.llm.admission import admission
+        from src.llm.response_cache import response_cache
+        from src.messages.persistence import message_writer
+        from src.messages.resumable import stream_registry
+        from src.middleware.rate_limiter import user_quota
+
+        hits = CounterMetricFamily("cache_hits", "Cache hits", labels=["cache"])
+        misses = CounterMetricFamily("cache_misses", "Cache misses", labels=["cache"])
+        entries = GaugeMetricFamily("cache_entries", "Entries currently cached", labels=["cache"])
+        caches = {
+            "auth_token": token_cache,
+            "auth_rejected": rejected_token_cache,
+            "conversation": conversation_cache,
+            "llm_response": response_cache,
+        }
+        for name, cache in caches.items():
+            hits.add_metric([name], cache.hits)
+            misses.add_metric([name], cache.misses)
+            entries.add_metric([name], len(cache))
+        yield hits
+        yield misses
+        yield entries
+
+        active = GaugeMetricFamily("llm_upstream_active_streams", "Admitted upstream streams", labels=["pool"])
+        queued = GaugeMetricFamily("llm_upstream_queued_requests", "Requests waiting for an upstream slot", labels=["pool"])
+        for pool, stats in admission.stats().items():
+            active.add_metric([pool], stats["active"])
+            queued.add_metric([pool], stats["queued"])
+        yield active
+        yield queued
+        shed = CounterMetricFamily("llm_admission_rejected", "Requests refused by admission control", labels=["reason"])
+        shed.add_metric(["queue_full"], admission.rejected)
+        shed.add_metric(["queue_timeout"], admission.timed_out)
+        yield shed
+
+        yield CounterMetricFamily("rate_limit_rejected", "Chat turns refused by per-user quotas", value=user_quota.rejected)
+        written = CounterMetricFamily("message_writes", "Messages persisted by the write-behind writer", labels=["result"])
+        written.add_metric(["written"], message_writer.written)
+        written.add_metric(["dropped"], message_writer.failed)
+        yield written
+        yield GaugeMetricFamily("sse_resumable_streams", "Stream sessions kept for resuming", value=len(stream_registry))
+
+REGISTRY.register(_StatsCollector())
@@ -0,0 +1,77 @@
+import base64
+import json
+import math
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional, Sequence
+from uuid import UUID
+
+from fastapi import HTTPException
+from pydantic import TypeAdapter
+
+_DATETIME = TypeAdapter(datetime)
+
+def _uuid(value: Any) -> UUID:
+    if not isinstance(value, str):
+        raise ValueError("cursor id must be a string")
+    return UUID(value)
+
+def _timestamp(value: Any) -> datetime:
+    # pydantic also takes Unix times, which Postgres won't cast from text
+    if not isinstance(value, str) or value[4:5] != "-":
+        raise ValueError("cursor timestamp must be an ISO 8601 string")
+    return _DATETIME.validate_python(value)
+
+def _number(value: Any) -> float:
+    # bool is an int, and json.loads accepts NaN/Infinity
+    if isinstance(value, bool) or not isinstance(value, (int, float)) or not math.isfinite(value):
+        raise ValueError("cursor value must be a finite number")
+    return value
+
+# Checks for the values a cursor may carry, by column. A cursor is client
+# input: a value the database can't cast would otherwise surface as a 500.
+_CURSOR_TYPES: Dict[str, Callable[[Any], Any]] = {
+    "id": _uuid,
+    "created_at": _timestamp,
+    "updated_at": _timestamp,
+    "rank": _number,
+}
+
+def _check_value(column: str, value: Any) -> Any:
+    check = _CURSOR_TYPES.get(column)
+    if check is not None:
+        check(value)
+    return value
+
+def encode_cursor(row: dict, order: Sequence[str]) -> str:
+    """
+    Opaque cursor pointing just past `row` for a query ordered by `order`
+    (PostgREST style, e.g. ["updated_at.desc", "id.desc"]).
+    """
+    payload = {"o": list(order), "v": [row[item.partition(".")[0]] for item in order]}
+    raw = json.dumps(payload, separators=(",", ":"), default=str).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+def decode_cursor(cursor: str, order: Sequence[str]) -> Dict[str, Any]:
+    """
+    Turn a cursor back into the `after` values for db.select. A cursor only
+    works with the ordering it was issued for.
+    """
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        payload = json.loads(raw)
+        if payload["o"] != list(order) or len(payload["v"]) != len(order):
+            raise ValueError("cursor ordering mismatch")
+        columns = [item.partition(".")[0] for item in order]
+        return {column: _check_value(column, value) for column, value in zip(columns, payload["v"])}
+    except (ValueError, KeyError, TypeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+def next_cursor(rows: List[dict], limit: int, order: Sequence[str]) -> Optional[str]:
+    """
+    Callers fetch limit + 1 rows; an extra row means there is another page.
+    Trims rows to limit in place and returns the cursor for the next page.
+    """
+    if len(rows) <= limit:
+        return None
+    del rows[limit:]
+    return encode_cursor(rows[-1], order)
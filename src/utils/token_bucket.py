@@ -0,0 +1,128 @@
+import asyncio
+import sqlite3
+import threading
+import time
+from typing import Dict, Tuple
+
+class BucketStore:
+    """
+    Token buckets keyed by string. take() refills the bucket at rate tokens
+    per second up to capacity, then removes amount. Returns 0.0 if granted,
+    otherwise the seconds to wait before it would be.
+
+    A bucket may go negative (force=True, or a request bigger than the
+    capacity taken from a full bucket): that debt is paid back by waiting,
+    which is how usage only known afterwards gets charged.
+
+    A bucket that has refilled to capacity is the same as one never used,
+    so stores drop those once they have been idle that long.
+    """
+
+    async def take(self, key: str, amount: float, rate: float, capacity: float, force: bool = False) -> float:
+        raise NotImplementedError
+
+# How often a store sweeps out buckets that have refilled
+_SWEEP_INTERVAL_SECONDS = 60.0
+
+def _full_at(tokens: float, now: float, rate: float, capacity: float) -> float:
+    """
+    When a bucket left with tokens at now will have refilled to capacity.
+    """
+    return now + max(0.0, capacity - tokens) / rate
+
+def _take(tokens: float, updated_at: float, now: float, amount: float, rate: float, capacity: float, force: bool) -> Tuple[float, float]:
+    """
+    Returns (tokens left, wait) for a bucket last seen at updated_at with tokens.
+    """
+    tokens = min(capacity, tokens + (now - updated_at) * rate)
+    # Anything up to the capacity must be available; more than that needs a full bucket
+    needed = min(amount, capacity)
+    if force or tokens >= needed:
+        return tokens - amount, 0.0
+    return tokens, (needed - tokens) / rate
+
+class MemoryBucketStore(BucketStore):
+    """
+    Per-process buckets. Each worker limits on its own.
+    """
+
+    def __init__(self):
+        # key -> (tokens, updated_at, full_at)
+        self._buckets: Dict[str, Tuple[float, float, float]] = {}
+        self._next_sweep = time.monotonic() + _SWEEP_INTERVAL_SECONDS
+
+    def __len__(self) -> int:
+        return len(self._buckets)
+
+    async def take(self, key: str, amount: float, rate: float, capacity: float, force: bool = False) -> float:
+        now = time.monotonic()
+        tokens, updated_at, _ = self._buckets.get(key, (capacity, now, now))
+        tokens, wait = _take(tokens, updated_at, now, amount, rate, capacity, force)
+        self._buckets[key] = (tokens, now, _full_at(tokens, now, rate, capacity))
+        if now >= self._next_sweep:
+            self._sweep(now)
+        return wait
+
+    def _sweep(self, now: float):
+        self._next_sweep = now + _SWEEP_INTERVAL_SECONDS
+        for key in [key for key, (_, _, full_at) in self._buckets.items() if full_at <= now]:
+            del self._buckets[key]
+
+class SQLiteBucketStore(BucketStore):
+    """
+    Buckets in a local SQLite file, so every worker on the host shares them.
+    Each take is one short write transaction, run off the event loop.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._local = threading.local()
+        self._next_sweep = time.time() + _SWEEP_INTERVAL_SECONDS
+        with self._connect() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS buckets ("
+                "key TEXT PRIMARY KEY, tokens REAL NOT NULL, updated_at REAL NOT NULL, full_at REAL NOT NULL DEFAULT 0)"
+            )
+            columns = {row[1] for row in conn.execute("PRAGMA table_info(buckets)")}
+            if "full_at" not in columns:
+                # Files from before the sweep: old rows count as full and go at the first sweep
+                conn.execute("ALTER TABLE buckets ADD COLUMN full_at REAL NOT NULL DEFAULT 0")
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5.0, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            self._local.conn = conn
+        return conn
+
+    def _take_sync(self, key: str, amount: float, rate: float, capacity: float, force: bool) -> float:
+        conn = self._connect()
+        # Wall clock: the file is shared between processes
+        now = time.time()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute("SELECT tokens, updated_at FROM buckets WHERE key = ?", (key,)).fetchone()
+            tokens, updated_at = row if row else (capacity, now)
+            tokens, wait = _take(tokens, updated_at, now, amount, rate, capacity, force)
+            conn.execute(
+                "INSERT INTO buckets (key, tokens, updated_at, full_at) VALUES (?, ?, ?, ?) "
+                "ON CONFLICT(key) DO UPDATE SET tokens = excluded.tokens, updated_at = excluded.updated_at, "
+                "full_at = excluded.full_at",
+                (key, tokens, now, _full_at(tokens, now, rate, capacity)),
+            )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        if now >= self._next_sweep:
+            self._sweep(conn, now)
+        return wait
+
+    def _sweep(self, conn: sqlite3.Connection, now: float):
+        # Every worker sweeps on its own schedule; deleting a full bucket twice is harmless
+        self._next_sweep = now + _SWEEP_INTERVAL_SECONDS
+        conn.execute("DELETE FROM buckets WHERE full_at <= ?", (now,))
+
+    async def take(self, key: str, amount: float, rate: float, capacity: float, force: bool = False) -> float:
+        return await asyncio.to_thread(self._take_sync, key, amount, rate, capacity, force)
@@ -0,0 +1,66 @@
+import asyncio
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+# Settings are read on import; none of these are contacted by the tests
+for key, value in {
+    "SUPABASE_URL": "http://127.0.0.1:9",
+    "SUPABASE_KEY": "test.test.test",
+    "SUPABASE_DB_URL": "postgresql://test@127.0.0.1:9/test",
+    "JWT_SECRET_KEY": "test-secret",
+}.items():
+    os.environ.setdefault(key, value)
+
+from benchmarks.fake_db import InMemoryBackend
+from src.conversations.service import conversation_cache
+from src.db.database import db
+from src.llm import client as llm_client
+from src.llm.client import LLMClient
+
+class ScriptedLLM(LLMClient):
+    """
+    Yields the same chunks for every call, delay seconds apart. Records the
+    calls it got and whether each stream was closed.
+    """
+
+    def __init__(self, chunks, delay=0.0):
+        self.chunks = chunks
+        self.delay = delay
+        self.calls = []
+        self.closed = 0
+
+    async def stream_chat(self, messages, model, temperature=0.7, max_tokens=None, **options):
+        self.calls.append({"messages": messages, "model": model, "temperature": temperature, **options})
+        try:
+            for chunk in self.chunks:
+                await asyncio.sleep(self.delay)
+                yield chunk
+        finally:
+            self.closed += 1
+
+@pytest.fixture
+def memory_db(monkeypatch):
+    """
+    The in-memory backend from benchmarks/ in place of Postgres.
+    """
+    backend = InMemoryBackend()
+    monkeypatch.setattr(db, "backend", backend)
+    conversation_cache.clear()
+    yield backend
+    conversation_cache.clear()
+
+@pytest.fixture
+def llm(monkeypatch):
+    """
+    install(chunks, delay) makes get_llm_client() return a ScriptedLLM.
+    """
+    def install(chunks, delay=0.0, wrap=None):
+        scripted = ScriptedLLM(chunks, delay)
+        monkeypatch.setattr(llm_client, "_llm_client", wrap(scripted) if wrap else scripted)
+        return scripted
+
+    return install
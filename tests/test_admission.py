@@ -0,0 +1,67 @@
+import asyncio
+
+import pytest
+
+from src.config.settings import settings
+from src.llm.admission import AdmissionController
+
+@pytest.fixture(autouse=True)
+def one_slot(monkeypatch):
+    monkeypatch.setattr(settings, "LLM_MAX_CONCURRENT_STREAMS", 1)
+    monkeypatch.setattr(settings, "LLM_CONCURRENCY_LIMITS", {})
+    monkeypatch.setattr(settings, "LLM_MAX_QUEUE_SIZE", 8)
+
+def test_interactive_is_served_before_batch():
+    async def scenario():
+        admission = AdmissionController()
+        holder = admission.request("groq", "m")
+        batch = admission.request("groq", "m", "batch")
+        interactive = admission.request("groq", "m", "interactive")
+        assert holder.granted.done() and not batch.granted.done()
+        assert interactive.position == 0 and batch.position == 1
+
+        holder.release()
+        assert interactive.granted.done() and not batch.granted.done()
+        interactive.release()
+        assert batch.granted.done()
+        batch.release()
+        return admission.stats()["groq:m"]
+
+    assert asyncio.run(scenario()) == {"active": 0, "limit": 1, "queued": 0}
+
+def test_missed_deadline_leaves_the_queue():
+    async def scenario():
+        admission = AdmissionController()
+        holder = admission.request("groq", "m")
+        waiter = admission.request("groq", "m")
+        assert not await waiter.wait(0.01)
+        assert admission.stats()["groq:m"]["queued"] == 0
+        # The released waiter is skipped, not granted, when the slot frees up
+        holder.release()
+        return admission.stats()["groq:m"]
+
+    assert asyncio.run(scenario()) == {"active": 0, "limit": 1, "queued": 0}
+
+def test_cancelled_waiter_gives_up_its_place():
+    async def scenario():
+        admission = AdmissionController()
+        admission.request("groq", "m")
+        waiter = admission.request("groq", "m")
+        task = asyncio.create_task(waiter.wait(5))
+        await asyncio.sleep(0)
+        task.cancel()
+        await asyncio.gather(task, return_exceptions=True)
+        return waiter.released, admission.stats()["groq:m"]["queued"]
+
+    assert asyncio.run(scenario()) == (True, 0)
+
+def test_full_queue_refuses(monkeypatch):
+    monkeypatch.setattr(settings, "LLM_MAX_QUEUE_SIZE", 1)
+
+    async def scenario():
+        admission = AdmissionController()
+        admission.request("groq", "m")
+        admission.request("groq", "m")
+        return admission.request("groq", "m"), admission.rejected, admission.try_acquire("groq", "m")
+
+    assert asyncio.run(scenario()) == (None, 1, None)
@@ -0,0 +1,134 @@
+import asyncio
+import json
+
+import pytest
+from fastapi import HTTPException
+
+from src.batches.schemas import BatchItem
+from src.batches.service import BatchService
+from src.config.settings import settings
+from src.db.database import db
+from src.messages.service import MessageService
+
+REPLY = [{"content": "Done.", "finish_reason": None}, {"content": "", "finish_reason": "stop"}]
+
+@pytest.fixture(autouse=True)
+def batch_settings(monkeypatch):
+    monkeypatch.setattr(settings, "RATE_LIMIT_REQUESTS_PER_MINUTE", 0)
+    monkeypatch.setattr(settings, "RATE_LIMIT_TOKENS_PER_MINUTE", 0)
+    monkeypatch.setattr(settings, "BATCH_CONCURRENCY", 2)
+
+def items(count):
+    return [BatchItem(content=f"question {i}", custom_id=f"q{i}") for i in range(count)]
+
+async def read(job, **kwargs):
+    return [json.loads(line) async for line in job.lines(**kwargs)]
+
+def test_every_item_gets_a_result_line(memory_db, llm):
+    scripted = llm(REPLY)
+
+    async def scenario():
+        job = BatchService().submit("u", items(5))
+        results = await read(job)
+        return job.summary(), results, await db.count("messages", {"role": "assistant"})
+
+    summary, results, replies = asyncio.run(scenario())
+
+    assert summary["status"] == "completed" and summary["succeeded"] == 5 and summary["failed"] == 0
+    assert sorted(result["custom_id"] for result in results) == [f"q{i}" for i in range(5)]
+    assert all(result["status"] == 200 and result["message"]["content"] == "Done." for result in results)
+    assert replies == 5
+    assert {call["priority"] for call in scripted.calls} == {"batch"}
+
+def test_results_can_be_read_from_an_offset(memory_db, llm):
+    llm(REPLY)
+
+    async def scenario():
+        job = BatchService().submit("u", items(3))
+        everything = await read(job)
+        return everything, await read(job, offset=1, follow=False)
+
+    everything, rest = asyncio.run(scenario())
+
+    assert rest == everything[1:]
+
+def test_item_for_a_missing_conversation_fails_alone(memory_db, llm):
+    llm(REPLY)
+
+    async def scenario():
+        bad = BatchItem(content="hi", custom_id="bad", conversation_id="00000000-0000-0000-0000-000000000000")
+        job = BatchService().submit("u", [bad] + items(1))
+        return job.summary, await read(job)
+
+    summary, results = asyncio.run(scenario())
+
+    by_id = {result["custom_id"]: result for result in results}
+    assert by_id["bad"]["status"] == 404
+    assert by_id["q0"]["status"] == 200
+    assert summary()["failed"] == 1 and summary()["succeeded"] == 1
+
+def test_running_jobs_are_capped_per_user(memory_db, llm, monkeypatch):
+    monkeypatch.setattr(settings, "BATCH_MAX_ACTIVE_JOBS", 1)
+    llm(REPLY, delay=0.05)
+
+    async def scenario():
+        service = BatchService()
+        first = service.submit("u", items(1))
+        with pytest.raises(HTTPException) as error:
+            service.submit("u", items(1))
+        # Other users are not affected
+        service.submit("someone else", items(1))
+        await read(first)
+        # Once the first job is done there is room again
+        return error.value.status_code, service.submit("u", items(1))
+
+    status_code, _ = asyncio.run(scenario())
+
+    assert status_code == 429
+
+def test_cancel_ends_followed_results_with_a_status_line(memory_db, llm):
+    llm(REPLY, delay=0.05)
+
+    async def scenario():
+        service = BatchService()
+        job = service.submit("u", items(4))
+        reader = asyncio.create_task(read(job))
+        await asyncio.sleep(0.01)
+        await service.cancel("u", job.id)
+        return job.summary(), await reader
+
+    summary, results = asyncio.run(scenario())
+
+    assert summary["status"] == "cancelled"
+    assert results[-1] == {"status": "cancelled", "succeeded": summary["succeeded"], "failed": summary["failed"]}
+
+def test_waiting_out_a_rate_limit_frees_the_slot(memory_db, llm, monkeypatch):
+    monkeypatch.setattr(settings, "BATCH_CONCURRENCY", 1)
+    llm(REPLY)
+    process = MessageService.process_chat_message
+    refused = []
+
+    async def rate_limited(user_id, conversation_id, data, priority="interactive"):
+        if user_id == "limited" and not refused:
+            refused.append(user_id)
+            raise HTTPException(status_code=429, detail="Too many requests", headers={"Retry-After": "0.5"})
+        return await process(user_id, conversation_id, data, priority)
+
+    monkeypatch.setattr(MessageService, "process_chat_message", staticmethod(rate_limited))
+
+    async def scenario():
+        loop = asyncio.get_running_loop()
+        service = BatchService()
+        limited = service.submit("limited", items(1))
+        await asyncio.sleep(0.05)
+        start = loop.time()
+        other = await read(service.submit("other", items(1)))
+        waited = loop.time() - start
+        return waited, other, await read(limited)
+
+    waited, other, limited = asyncio.run(scenario())
+
+    assert refused == ["limited"]
+    # The other user's item ran while the limited one slept
+    assert waited < 0.25
+    assert other[0]["status"] == 200 and limited[0]["status"] == 200
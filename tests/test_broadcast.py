@@ -0,0 +1,111 @@
+import asyncio
+
+import pytest
+
+from src.config.settings import settings
+from src.messages.resumable import StreamRegistry
+from src.utils.broadcast import BroadcastCancelled, ReplayBroadcast, ReplayGap
+
+async def numbers(count, delay=0.0, closed=None):
+    try:
+        for i in range(count):
+            await asyncio.sleep(delay)
+            yield i
+    finally:
+        if closed is not None:
+            closed.append(True)
+
+async def drain(subscription):
+    return [item async for item in subscription]
+
+def test_late_subscriber_gets_the_replay_then_live_items():
+    async def scenario():
+        broadcast = ReplayBroadcast(numbers(6, delay=0.01))
+        first = asyncio.create_task(drain(broadcast.subscribe()))
+        await asyncio.sleep(0.035)
+        late = await drain(broadcast.subscribe())
+        return await first, late
+
+    first, late = asyncio.run(scenario())
+    assert first == late == list(range(6))
+
+def test_subscribing_from_an_offset():
+    async def scenario():
+        broadcast = ReplayBroadcast(numbers(5))
+        await broadcast.start()
+        return await drain(broadcast.subscribe(start=3))
+
+    assert asyncio.run(scenario()) == [3, 4]
+
+def test_dropped_items_raise_replay_gap():
+    async def scenario():
+        broadcast = ReplayBroadcast(numbers(10), max_items=4)
+        await broadcast.start()
+        assert broadcast.offset == 6 and broadcast.produced == 10
+        assert await drain(broadcast.subscribe(start=6)) == [6, 7, 8, 9]
+        with pytest.raises(ReplayGap):
+            await drain(broadcast.subscribe(start=2))
+
+    asyncio.run(scenario())
+
+def test_cancelled_source_ends_subscribers_with_an_ordinary_exception():
+    async def scenario():
+        closed = []
+        broadcast = ReplayBroadcast(numbers(100, delay=0.01, closed=closed), cancel_when_idle=False)
+        received = []
+
+        async def subscriber():
+            async for item in broadcast.subscribe():
+                received.append(item)
+
+        task = asyncio.create_task(subscriber())
+        await asyncio.sleep(0.035)
+        broadcast.start().cancel("shutdown")
+        # The subscriber's own task must not look cancelled
+        with pytest.raises(BroadcastCancelled) as error:
+            await task
+        return error.value.reason, received, closed
+
+    reason, received, closed = asyncio.run(scenario())
+    assert reason == "shutdown"
+    assert received and received == list(range(len(received)))
+    assert closed == [True]
+
+def test_last_subscriber_leaving_cancels_the_source():
+    async def scenario():
+        closed = []
+        broadcast = ReplayBroadcast(numbers(100, delay=0.01, closed=closed))
+        subscription = broadcast.subscribe()
+        assert await subscription.__anext__() == 0
+        await subscription.aclose()
+        await asyncio.gather(broadcast.start(), return_exceptions=True)
+        return broadcast.done, broadcast.joinable, closed
+
+    assert asyncio.run(scenario()) == (True, False, [True])
+
+def test_stream_session_ends_with_an_error_event_on_shutdown(monkeypatch):
+    monkeypatch.setattr(settings, "SSE_RESUME_BUFFER_EVENTS", 100)
+
+    async def events():
+        for i in range(100):
+            await asyncio.sleep(0.01)
+            yield f"event: ping\ndata: {i}\n\n"
+
+    async def scenario():
+        registry = StreamRegistry()
+        session = registry.start("user", "conversation", events())
+        received = []
+
+        async def client():
+            async for frame in session.events():
+                received.append(frame)
+
+        task = asyncio.create_task(client())
+        await asyncio.sleep(0.035)
+        await registry.stop()
+        await task
+        return session.id, received
+
+    stream_id, received = asyncio.run(scenario())
+    assert received[0].startswith(f"id: {stream_id}:0\n")
+    assert '"cancelled_error"' in received[-1] and "shutdown" in received[-1]
@@ -0,0 +1,64 @@
+import asyncio
+
+import pytest
+
+from src.config.settings import settings
+from src.llm.client import LLMClient
+from src.llm.coalescing import CoalescingLLMClient
+
+class SlowProvider(LLMClient):
+    def __init__(self):
+        self.calls = 0
+
+    async def stream_chat(self, messages, model, temperature=0.7, max_tokens=None, **options):
+        self.calls += 1
+        for word in ("one ", "two ", "three"):
+            await asyncio.sleep(0.01)
+            yield {"content": word, "finish_reason": None}
+        yield {"content": "", "finish_reason": "stop"}
+
+@pytest.fixture(autouse=True)
+def coalescing_on(monkeypatch):
+    monkeypatch.setattr(settings, "LLM_COALESCE_REQUESTS", True)
+
+async def ask(client, content="hi", delay=0.0, **options):
+    await asyncio.sleep(delay)
+    chunks = client.stream_chat([{"role": "user", "content": content}], "m", 0, **options)
+    return "".join([chunk["content"] async for chunk in chunks])
+
+def test_identical_requests_share_one_upstream_call():
+    upstream = SlowProvider()
+    client = CoalescingLLMClient(upstream)
+
+    async def scenario():
+        # The second one joins after the first chunk and is replayed it
+        return await asyncio.gather(ask(client), ask(client, delay=0.015))
+
+    assert asyncio.run(scenario()) == ["one two three", "one two three"]
+    assert upstream.calls == 1
+    assert client.joined == 1 and len(client) == 0
+
+def test_different_or_opted_out_requests_are_not_shared():
+    upstream = SlowProvider()
+    client = CoalescingLLMClient(upstream)
+
+    async def scenario():
+        return await asyncio.gather(ask(client), ask(client, "hello"), ask(client, coalesce=False))
+
+    asyncio.run(scenario())
+    assert upstream.calls == 3
+
+def test_upstream_is_cancelled_when_every_subscriber_leaves():
+    upstream = SlowProvider()
+    client = CoalescingLLMClient(upstream)
+
+    async def scenario():
+        chunks = client.stream_chat([{"role": "user", "content": "hi"}], "m", 0)
+        await chunks.__anext__()
+        await chunks.aclose()
+        await asyncio.sleep(0.05)
+        # A new identical request starts fresh instead of joining the cancelled one
+        return await ask(client)
+
+    assert asyncio.run(scenario()) == "one two three"
+    assert upstream.calls == 2
@@ -0,0 +1,30 @@
+import asyncio
+
+import pytest
+from fastapi import HTTPException
+
+from src.conversations.schemas import ConversationCreate
+from src.conversations.service import ConversationService, conversation_cache
+
+def test_read_during_delete_does_not_leave_a_cached_row(memory_db, monkeypatch):
+    delete = memory_db.delete
+
+    async def slow_delete(table, filters):
+        await asyncio.sleep(0.02)
+        return await delete(table, filters)
+
+    monkeypatch.setattr(memory_db, "delete", slow_delete)
+
+    async def scenario():
+        conversation = await ConversationService.create_conversation("u", ConversationCreate(title="t"))
+        deleting = asyncio.create_task(ConversationService.delete_conversation("u", conversation["id"]))
+        await asyncio.sleep(0.01)
+        # Re-caches the row while the delete is still in flight
+        await ConversationService.get_conversation("u", conversation["id"])
+        await deleting
+        await ConversationService.get_conversation("u", conversation["id"], cached=True)
+
+    with pytest.raises(HTTPException) as error:
+        asyncio.run(scenario())
+    assert error.value.status_code == 404
+    assert len(conversation_cache) == 0
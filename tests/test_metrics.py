@@ -0,0 +1,23 @@
+from fastapi.testclient import TestClient
+
+from src.config.settings import Settings, settings
+from src.main import app
+
+client = TestClient(app)
+
+def test_metrics_are_off_by_default(monkeypatch):
+    assert Settings.model_fields["METRICS_ENABLED"].default is False
+    monkeypatch.setattr(settings, "METRICS_ENABLED", False)
+    assert client.get("/metrics").status_code == 404
+
+def test_metrics_token_is_required_when_set(monkeypatch):
+    monkeypatch.setattr(settings, "METRICS_ENABLED", True)
+    monkeypatch.setattr(settings, "METRICS_TOKEN", "scraper-token")
+    client.get("/")
+
+    assert client.get("/metrics").status_code == 401
+    assert client.get("/metrics", headers={"Authorization": "Bearer wrong"}).status_code == 401
+    response = client.get("/metrics", headers={"Authorization": "Bearer scraper-token"})
+    assert response.status_code == 200
+    assert 'http_request_duration_seconds_count{method="GET",route="/",status="200"}' in response.text
+    assert "cache_hits_total" in response.text
@@ -0,0 +1,58 @@
+from datetime import datetime, timezone
+
+import pytest
+from fastapi import HTTPException
+
+from src.conversations.service import CONVERSATION_ORDER
+from src.db.database import build_select_sql
+from src.messages.service import MESSAGE_ORDERS
+from src.utils.pagination import decode_cursor, encode_cursor, next_cursor
+
+ROW = {"id": "6f1c0d4e-5b55-4c1e-9c43-0d1f4ad0b2a1", "updated_at": "2024-05-01T12:00:00+00:00", "title": "x"}
+
+def test_cursor_round_trip():
+    cursor = encode_cursor(ROW, CONVERSATION_ORDER)
+    assert decode_cursor(cursor, CONVERSATION_ORDER) == {"updated_at": ROW["updated_at"], "id": ROW["id"]}
+
+def test_cursor_round_trip_with_datetimes():
+    created_at = datetime(2024, 5, 1, 12, 0, tzinfo=timezone.utc)
+    cursor = encode_cursor({"created_at": created_at, "id": ROW["id"]}, MESSAGE_ORDERS["asc"])
+    assert decode_cursor(cursor, MESSAGE_ORDERS["asc"]) == {"created_at": str(created_at), "id": ROW["id"]}
+
+@pytest.mark.parametrize("cursor", ["not-base64!", "e30", encode_cursor(ROW, ["id.desc"])])
+def test_bad_or_foreign_cursor_is_a_400(cursor):
+    with pytest.raises(HTTPException) as error:
+        decode_cursor(cursor, CONVERSATION_ORDER)
+    assert error.value.status_code == 400
+
+@pytest.mark.parametrize("values", [
+    {"updated_at": "yesterday", "id": ROW["id"]},
+    {"updated_at": "1714567890", "id": ROW["id"]},
+    {"updated_at": None, "id": ROW["id"]},
+    {"updated_at": ROW["updated_at"], "id": "1 OR 1=1"},
+    {"updated_at": ROW["updated_at"], "id": 7},
+    {"updated_at": ["2024-05-01"], "id": ROW["id"]},
+])
+def test_cursor_with_values_of_the_wrong_type_is_a_400(values):
+    with pytest.raises(HTTPException) as error:
+        decode_cursor(encode_cursor(values, CONVERSATION_ORDER), CONVERSATION_ORDER)
+    assert error.value.status_code == 400
+
+def test_next_cursor_trims_the_extra_row():
+    rows = [{"id": f"00000000-0000-0000-0000-00000000000{i}", "updated_at": f"2024-05-0{9 - i}"} for i in range(4)]
+    cursor = next_cursor(rows, 3, CONVERSATION_ORDER)
+    assert len(rows) == 3
+    assert decode_cursor(cursor, CONVERSATION_ORDER) == {"updated_at": "2024-05-07", "id": rows[2]["id"]}
+    assert next_cursor(rows, 3, CONVERSATION_ORDER) is None
+
+def test_keyset_query_seeks_on_a_row_comparison():
+    after = decode_cursor(encode_cursor(ROW, CONVERSATION_ORDER), CONVERSATION_ORDER)
+    sql, args = build_select_sql("conversations", "*", {"user_id": "u"}, CONVERSATION_ORDER, 21, after=after)
+    assert '("updated_at", "id") < ($2, $3)' in sql
+    assert sql.endswith('ORDER BY "updated_at" DESC, "id" DESC LIMIT $4')
+    assert args == ["u", ROW["updated_at"], ROW["id"], 21]
+
+@pytest.mark.parametrize("rank", [0, 0.25, 3])
+def test_numeric_cursor_values_are_kept_as_numbers(rank):
+    order = ["rank.desc", "id.desc"]
+    assert decode_cursor(encode_cursor({"rank": rank, "id": ROW["id"]}, order), order) == {"rank": rank, "id": ROW["id"]}
@@ -0,0 +1,140 @@
+import asyncio
+
+import asyncpg
+import pytest
+
+from src.config.settings import settings
+from src.messages.persistence import MessageWriter
+
+@pytest.fixture(autouse=True)
+def writer_settings(monkeypatch):
+    monkeypatch.setattr(settings, "MESSAGE_WRITE_FLUSH_INTERVAL_MS", 20)
+    monkeypatch.setattr(settings, "MESSAGE_WRITE_RETRY_BACKOFF_MS", 1)
+    monkeypatch.setattr(settings, "MESSAGE_WRITE_MAX_RETRIES", 2)
+
+@pytest.fixture
+def inserts(memory_db, monkeypatch):
+    """
+    Records every messages insert. Set fail(rows) to return an exception to
+    raise instead of inserting.
+    """
+    insert = memory_db.insert
+    calls = []
+
+    async def recording_insert(table, rows):
+        if table == "messages":
+            calls.append([row["content"] for row in rows])
+            error = recording_insert.fail(rows)
+            if error is not None:
+                raise error
+        return await insert(table, rows)
+
+    recording_insert.fail = lambda rows: None
+    monkeypatch.setattr(memory_db, "insert", recording_insert)
+    return recording_insert, calls
+
+def message(content, conversation_id="c1"):
+    return {"conversation_id": conversation_id, "role": "user", "content": content}
+
+async def write_all(writer, contents, **kwargs):
+    await writer.start()
+    for content in contents:
+        await writer.write(message(content, **kwargs))
+    return writer.pending_for("c1")
+
+def test_rows_are_batched_and_readable_until_flushed(memory_db, inserts):
+    _, calls = inserts
+    writer = MessageWriter()
+
+    async def scenario():
+        pending = await write_all(writer, ["a", "b", "c"])
+        await writer.stop()
+        return pending
+
+    pending = asyncio.run(scenario())
+
+    assert [row["content"] for row in pending] == ["a", "b", "c"]
+    assert calls == [["a", "b", "c"]]
+    assert writer.written == 3 and writer.pending_for("c1") == []
+    assert [row["content"] for row in memory_db.tables["messages"]] == ["a", "b", "c"]
+
+def test_connection_errors_retry_the_whole_batch(memory_db, inserts):
+    insert, calls = inserts
+    failures = [asyncpg.ConnectionDoesNotExistError("connection was closed"), asyncio.TimeoutError()]
+    insert.fail = lambda rows: failures.pop(0) if failures else None
+    writer = MessageWriter()
+
+    async def scenario():
+        await write_all(writer, ["a", "b", "c"])
+        await writer.stop()
+
+    asyncio.run(scenario())
+
+    assert calls == [["a", "b", "c"]] * 3
+    assert writer.written == 3 and writer.failed == 0
+
+def test_outage_drops_the_batch_without_row_by_row_retries(memory_db, inserts):
+    insert, calls = inserts
+    insert.fail = lambda rows: ConnectionRefusedError("database is down")
+    writer = MessageWriter()
+
+    async def scenario():
+        await write_all(writer, ["a", "b", "c"])
+        await writer.stop()
+
+    asyncio.run(scenario())
+
+    assert calls == [["a", "b", "c"]] * (settings.MESSAGE_WRITE_MAX_RETRIES + 1)
+    assert writer.failed == 3 and writer.pending_for("c1") == []
+
+def test_integrity_error_falls_back_to_single_rows(memory_db, inserts):
+    insert, calls = inserts
+    insert.fail = lambda rows: next(
+        (asyncpg.ForeignKeyViolationError("conversation is gone") for row in rows if row["conversation_id"] == "gone"),
+        None,
+    )
+    writer = MessageWriter()
+
+    async def scenario():
+        await writer.start()
+        await writer.write(message("a"))
+        await writer.write(message("orphan", conversation_id="gone"))
+        await writer.write(message("c"))
+        await writer.stop()
+
+    asyncio.run(scenario())
+
+    # The bad row is tried once on its own, not retried
+    assert calls == [["a", "orphan", "c"], ["a"], ["orphan"], ["c"]]
+    assert writer.written == 2 and writer.failed == 1
+
+def test_cancelled_write_leaves_nothing_pending(memory_db, inserts, monkeypatch):
+    monkeypatch.setattr(settings, "MESSAGE_WRITE_QUEUE_SIZE", 1)
+    insert, _ = inserts
+    release = asyncio.Event()
+    writer = MessageWriter()
+
+    async def blocked_insert(table, rows):
+        await release.wait()
+        return await insert(table, rows)
+
+    monkeypatch.setattr(memory_db, "insert", blocked_insert)
+
+    async def scenario():
+        await writer.start()
+        await writer.write(message("flushing"))
+        await asyncio.sleep(0.05)
+        await writer.write(message("queued"))
+        # The queue is full, so this one waits for room and is cancelled
+        blocked = asyncio.create_task(writer.write(message("cancelled")))
+        await asyncio.sleep(0.01)
+        blocked.cancel()
+        await asyncio.gather(blocked, return_exceptions=True)
+        pending = [row["content"] for row in writer.pending_for("c1")]
+        release.set()
+        await writer.stop()
+        return pending
+
+    assert asyncio.run(scenario()) == ["flushing", "queued"]
+    assert writer.pending_for("c1") == []
+    assert [row["content"] for row in memory_db.tables["messages"]] == ["flushing", "queued"]
@@ -0,0 +1,98 @@
+import asyncio
+
+import pytest
+
+from src.config.settings import settings
+from src.db.database import db
+from src.llm.response_cache import CachingLLMClient
+from src.messages.schemas import MessageCreate
+from src.messages.service import MessageService
+from src.messages.streaming import _generate
+from src.middleware.rate_limiter import user_quota
+from src.utils.cache import TTLCache
+
+REPLY = [{"content": "Paris.", "finish_reason": None}, {"content": "", "finish_reason": "stop"}]
+PROMPT = [{"role": "user", "content": "Capital of France?"}]
+
+@pytest.fixture(autouse=True)
+def cache_settings(monkeypatch):
+    monkeypatch.setattr(settings, "RESPONSE_CACHE_ENABLED", True)
+
+@pytest.fixture
+def charges(monkeypatch):
+    charged = []
+
+    async def charge(user_id, tokens):
+        charged.append(tokens)
+
+    monkeypatch.setattr(user_quota, "charge", charge)
+    return charged
+
+def caching(inner):
+    return CachingLLMClient(inner, TTLCache(10, 60))
+
+async def collect(client, temperature=0, **options):
+    return [chunk async for chunk in client.stream_chat(PROMPT, "llama3-8b-8192", temperature, **options)]
+
+def test_hit_is_replayed_without_an_upstream_call(llm):
+    scripted = llm(REPLY)
+    client = caching(scripted)
+
+    async def scenario():
+        return await collect(client), await collect(client)
+
+    first, second = asyncio.run(scenario())
+
+    assert len(scripted.calls) == 1
+    assert "".join(chunk["content"] for chunk in second) == "Paris."
+    assert all(chunk["cached"] for chunk in second) and not any(chunk.get("cached") for chunk in first)
+
+@pytest.mark.parametrize("options", [{"cache": False}, {"temperature": 0.7}])
+def test_bypass_goes_upstream_every_time(llm, options):
+    scripted = llm(REPLY)
+    client = caching(scripted)
+
+    async def scenario():
+        await collect(client, **options)
+        return await collect(client, **options)
+
+    second = asyncio.run(scenario())
+
+    assert len(scripted.calls) == 2
+    assert not any(chunk.get("cached") for chunk in second)
+
+def test_cached_reply_is_stored_without_cost_or_quota_charge(memory_db, llm, charges):
+    llm(REPLY, wrap=caching)
+
+    async def scenario():
+        replies = []
+        # Same prompt in two fresh conversations, so the second is a hit
+        for _ in range(2):
+            conversation = (await db.insert("conversations", [{"user_id": "u", "model": "llama3-8b-8192"}]))[0]
+            await MessageService.process_chat_message("u", conversation["id"], MessageCreate(content="Capital of France?", temperature=0))
+            replies += await db.select("messages", filters={"conversation_id": conversation["id"], "role": "assistant"})
+        return replies
+
+    miss, hit = asyncio.run(scenario())
+
+    assert miss["input_tokens"] > 0 and miss["output_tokens"] > 0 and miss["cost_usd"] > 0
+    assert hit["metadata"]["response_cache"] == "hit"
+    assert hit["content"] == miss["content"] and hit["token_count"] == miss["token_count"]
+    assert (hit["input_tokens"], hit["output_tokens"], hit["cost_usd"]) == (0, 0, 0)
+    # Prompt, reply, then only the second prompt: it's charged before the hit is known
+    assert charges == [miss["input_tokens"], miss["output_tokens"], miss["input_tokens"]]
+
+def test_cached_stream_is_stored_without_cost_or_quota_charge(memory_db, llm, charges):
+    llm(REPLY, wrap=caching)
+
+    async def scenario():
+        for message_id in ("m1", "m2"):
+            async for _ in _generate("llama3-8b-8192", PROMPT, 0, "u", "c1", message_id, 5, None):
+                pass
+        return await db.select("messages", filters={"role": "assistant"})
+
+    miss, hit = asyncio.run(scenario())
+
+    assert (miss["input_tokens"], miss["output_tokens"]) == (5, miss["token_count"])
+    assert (hit["input_tokens"], hit["output_tokens"], hit["cost_usd"]) == (0, 0, 0)
+    assert charges == [miss["token_count"]]
@@ -0,0 +1,158 @@
+import asyncio
+
+import pytest
+
+from src.config.settings import settings
+from src.llm.admission import AdmissionController
+from src.llm.client import LLMClient
+from src.llm.router import LLMRouter
+
+class FakeProvider(LLMClient):
+    """
+    Waits delay seconds, then yields chunks. Records whether its stream was closed.
+    """
+
+    def __init__(self, chunks, delay=0.0):
+        self.chunks = chunks
+        self.delay = delay
+        self.calls = 0
+        self.closed = 0
+
+    async def stream_chat(self, messages, model, temperature=0.7, max_tokens=None, **options):
+        self.calls += 1
+        try:
+            await asyncio.sleep(self.delay)
+            for chunk in self.chunks:
+                yield chunk
+        finally:
+            self.closed += 1
+
+TEXT = [{"content": "hello", "finish_reason": None}, {"content": "", "finish_reason": "stop"}]
+UPSTREAM_503 = {"error": "upstream overloaded", "status_code": 503, "retryable": True, "retry_after": None}
+
+def make_router(**providers):
+    return LLMRouter(providers, {"*": list(providers)}, AdmissionController())
+
+async def collect(router, priority="interactive"):
+    return [chunk async for chunk in router.stream_chat([{"role": "user", "content": "hi"}], "m", priority=priority)]
+
+@pytest.fixture(autouse=True)
+def router_settings(monkeypatch):
+    monkeypatch.setattr(settings, "LLM_HEDGE_AFTER_MS", 0)
+    monkeypatch.setattr(settings, "LLM_MAX_CONCURRENT_STREAMS", 4)
+    monkeypatch.setattr(settings, "LLM_CONCURRENCY_LIMITS", {})
+    monkeypatch.setattr(settings, "LLM_MAX_QUEUE_SIZE", 8)
+    monkeypatch.setattr(settings, "LLM_QUEUE_TIMEOUT_SECONDS", 1.0)
+
+def test_fails_over_before_first_token():
+    primary, backup = FakeProvider([UPSTREAM_503]), FakeProvider(TEXT)
+    router = make_router(primary=primary, backup=backup)
+
+    chunks = asyncio.run(collect(router))
+
+    assert chunks == TEXT
+    assert router.stats["primary"].failures == 1
+    assert router.stats["primary"].cooling_down
+    assert primary.closed == 1
+    # The failed attempt gave its slot back
+    assert router.admission.stats()["primary:m"]["active"] == 0
+    assert router.admission.stats()["backup:m"]["active"] == 0
+
+def test_no_failover_on_non_retryable_error():
+    bad_request = {"error": "bad request", "status_code": 400, "retryable": False}
+    primary, backup = FakeProvider([bad_request]), FakeProvider(TEXT)
+
+    chunks = asyncio.run(collect(make_router(primary=primary, backup=backup)))
+
+    assert chunks == [bad_request]
+    assert backup.calls == 0
+
+def test_last_error_is_returned_when_every_provider_fails():
+    router = make_router(primary=FakeProvider([UPSTREAM_503]), backup=FakeProvider([UPSTREAM_503]))
+
+    assert asyncio.run(collect(router)) == [UPSTREAM_503]
+
+def test_provider_503_is_not_reported_as_overload():
+    router = make_router(primary=FakeProvider([UPSTREAM_503]), backup=FakeProvider([UPSTREAM_503]))
+
+    chunks = asyncio.run(collect(router))
+
+    assert len(chunks) == 1
+    assert chunks[0]["status_code"] == 503
+    assert not chunks[0].get("overloaded")
+
+def test_cooling_down_provider_is_tried_last():
+    router = make_router(primary=FakeProvider(TEXT), backup=FakeProvider(TEXT))
+    router.stats["primary"].record_failure()
+
+    assert router.candidates("m") == ["backup", "primary"]
+
+def test_hedge_wins_and_slow_attempt_is_cancelled(monkeypatch):
+    monkeypatch.setattr(settings, "LLM_HEDGE_AFTER_MS", 20)
+    slow, fast = FakeProvider(TEXT, delay=5), FakeProvider(TEXT)
+    router = make_router(slow=slow, fast=fast)
+
+    async def scenario():
+        chunks = await asyncio.wait_for(collect(router), 2)
+        return chunks
+
+    assert asyncio.run(scenario()) == TEXT
+    assert slow.calls == 1 and fast.calls == 1
+    # The loser's stream was closed, not left to the GC
+    assert slow.closed == 1
+    assert router.admission.stats()["slow:m"]["active"] == 0
+
+def test_queue_full_is_an_overload_503(monkeypatch):
+    monkeypatch.setattr(settings, "LLM_MAX_CONCURRENT_STREAMS", 1)
+    monkeypatch.setattr(settings, "LLM_MAX_QUEUE_SIZE", 0)
+    router = make_router(only=FakeProvider(TEXT, delay=0.2))
+
+    async def scenario():
+        first = asyncio.create_task(collect(router))
+        await asyncio.sleep(0.05)
+        second = await collect(router)
+        return await first, second
+
+    first, second = asyncio.run(scenario())
+
+    assert first == TEXT
+    assert second == [second[-1]]
+    assert second[-1]["status_code"] == 503
+    assert second[-1]["overloaded"] is True
+    assert second[-1]["retry_after"] == settings.LLM_QUEUE_RETRY_AFTER_SECONDS
+    assert router.admission.rejected == 1
+
+def test_queue_deadline_is_an_overload_503(monkeypatch):
+    monkeypatch.setattr(settings, "LLM_MAX_CONCURRENT_STREAMS", 1)
+    monkeypatch.setattr(settings, "LLM_QUEUE_TIMEOUT_SECONDS", 0.05)
+    router = make_router(only=FakeProvider(TEXT, delay=0.5))
+
+    async def scenario():
+        first = asyncio.create_task(collect(router))
+        await asyncio.sleep(0.01)
+        second = await collect(router)
+        first.cancel()
+        await asyncio.gather(first, return_exceptions=True)
+        return second
+
+    second = asyncio.run(scenario())
+
+    assert second[0] == {"event": "queued", "position": 0}
+    assert second[-1]["status_code"] == 503
+    assert second[-1]["overloaded"] is True
+    assert router.admission.timed_out == 1
+    assert router.admission.stats()["only:m"] == {"active": 0, "limit": 1, "queued": 0}
+
+def test_busy_provider_is_skipped_for_one_with_free_slots(monkeypatch):
+    monkeypatch.setattr(settings, "LLM_CONCURRENCY_LIMITS", {"busy": 1})
+    busy, idle = FakeProvider(TEXT, delay=0.2), FakeProvider(TEXT)
+    router = make_router(busy=busy, idle=idle)
+
+    async def scenario():
+        first = asyncio.create_task(collect(router))
+        await asyncio.sleep(0.05)
+        second = await collect(router)
+        return await first, second
+
+    assert asyncio.run(scenario()) == (TEXT, TEXT)
+    assert busy.calls == 1 and idle.calls == 1
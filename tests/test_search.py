@@ -0,0 +1,92 @@
+import asyncio
+from datetime import date, datetime, timezone
+
+import pytest
+from fastapi import HTTPException
+
+from src.db.database import db
+from src.search.service import SEARCH_ORDERS, SearchService
+from src.utils.pagination import encode_cursor
+
+def hit(i):
+    return {
+        "id": f"00000000-0000-0000-0000-{i:012d}",
+        "conversation_id": "00000000-0000-0000-0000-00000000000c",
+        "role": "user",
+        "content": f"tea {i}",
+        "created_at": f"2024-05-0{9 - i}T10:00:00+00:00",
+        "rank": 1.0 / (i + 1),
+    }
+
+@pytest.fixture
+def rpc_calls(monkeypatch):
+    """
+    Stands in for the search_messages() SQL function: returns a fixed page
+    of hits and records the parameters it was called with.
+    """
+    calls = []
+
+    async def rpc(function, params=None):
+        calls.append((function, params))
+        return [hit(i) for i in range(params["p_limit"])]
+
+    monkeypatch.setattr(db, "rpc", rpc)
+    return calls
+
+def test_next_page_continues_after_the_last_hit(rpc_calls):
+    async def scenario():
+        first, cursor = await SearchService.search_messages("u", "tea", limit=3)
+        await SearchService.search_messages("u", "tea", limit=3, cursor=cursor)
+        return first, cursor
+
+    first, cursor = asyncio.run(scenario())
+
+    assert [row["id"] for row in first] == [hit(i)["id"] for i in range(3)]
+    assert cursor is not None
+    _, params = rpc_calls[1]
+    assert params["p_limit"] == 4
+    assert params["p_after_rank"] == hit(2)["rank"]
+    assert params["p_after_id"] == hit(2)["id"]
+    assert params["p_after_created_at"] is None
+
+def test_recent_sort_pages_by_creation_time(rpc_calls):
+    async def scenario():
+        _, cursor = await SearchService.search_messages("u", "tea", sort="recent", limit=2)
+        await SearchService.search_messages("u", "tea", sort="recent", limit=2, cursor=cursor)
+
+    asyncio.run(scenario())
+
+    _, params = rpc_calls[1]
+    assert params["p_after_created_at"] == hit(1)["created_at"]
+    assert params["p_after_rank"] is None
+
+def test_cursor_from_another_sort_is_a_400(rpc_calls):
+    async def scenario():
+        _, cursor = await SearchService.search_messages("u", "tea", limit=2)
+        await SearchService.search_messages("u", "tea", sort="recent", limit=2, cursor=cursor)
+
+    with pytest.raises(HTTPException) as error:
+        asyncio.run(scenario())
+    assert error.value.status_code == 400
+
+@pytest.mark.parametrize("rank, id_", [
+    ("0.5", hit(0)["id"]),
+    (True, hit(0)["id"]),
+    (None, hit(0)["id"]),
+    (float("nan"), hit(0)["id"]),
+    (0.5, "not-a-uuid"),
+])
+def test_cursor_with_a_bad_rank_or_id_is_a_400(rpc_calls, rank, id_):
+    cursor = encode_cursor({"rank": rank, "id": id_}, SEARCH_ORDERS["rank"])
+
+    with pytest.raises(HTTPException) as error:
+        asyncio.run(SearchService.search_messages("u", "tea", cursor=cursor))
+    assert error.value.status_code == 400
+    assert rpc_calls == []
+
+def test_end_date_is_inclusive(rpc_calls):
+    asyncio.run(SearchService.search_messages("u", "tea", start_date=date(2024, 5, 1), end_date=date(2024, 5, 1)))
+
+    _, params = rpc_calls[0]
+    assert params["p_created_from"] == datetime(2024, 5, 1, tzinfo=timezone.utc)
+    assert params["p_created_before"] == datetime(2024, 5, 2, tzinfo=timezone.utc)
@@ -0,0 +1,41 @@
+import asyncio
+
+import pytest
+
+from src.messages.sse import coalesce_chunks
+
+async def provider(chunks, closed, delay=0.0):
+    try:
+        for chunk in chunks:
+            await asyncio.sleep(delay)
+            yield chunk
+    finally:
+        closed.append(True)
+
+async def collect(chunks, window_ms, max_chars=1000):
+    return [chunk async for chunk in coalesce_chunks(chunks, window_ms, max_chars)]
+
+def test_content_chunks_are_merged_until_finish():
+    closed = []
+    chunks = [{"content": c, "finish_reason": None} for c in "abc"] + [{"content": "", "finish_reason": "stop"}]
+    result = asyncio.run(collect(provider(chunks, closed), 50))
+    assert result == [{"content": "abc", "finish_reason": None}, {"content": "", "finish_reason": "stop"}]
+    assert closed == [True]
+
+def test_max_chars_flushes_early():
+    closed = []
+    chunks = [{"content": "ab", "finish_reason": None}] * 3
+    result = asyncio.run(collect(provider(chunks, closed), 50, max_chars=4))
+    assert [c["content"] for c in result] == ["abab", "ab"]
+
+@pytest.mark.parametrize("window_ms", [0, 50])
+def test_consumer_leaving_closes_the_provider(window_ms):
+    async def scenario():
+        closed = []
+        chunks = [{"content": "x", "finish_reason": None}] * 100
+        merged = coalesce_chunks(provider(chunks, closed, delay=0.005), window_ms, 1)
+        await merged.__anext__()
+        await merged.aclose()
+        return closed
+
+    assert asyncio.run(scenario()) == [True]
@@ -0,0 +1,94 @@
+import asyncio
+
+import pytest
+
+from src.config.settings import settings
+from src.db.database import db
+from src.messages.resumable import StreamRegistry
+from src.messages.streaming import _generate
+
+WORDS = [{"content": f"word{i} ", "finish_reason": None} for i in range(50)] + [{"content": "", "finish_reason": "stop"}]
+
+@pytest.fixture(autouse=True)
+def stream_settings(monkeypatch):
+    monkeypatch.setattr(settings, "RATE_LIMIT_TOKENS_PER_MINUTE", 0)
+    monkeypatch.setattr(settings, "SSE_COALESCE_WINDOW_MS", 0)
+    monkeypatch.setattr(settings, "SSE_DISCONNECT_GRACE_SECONDS", 0.05)
+
+def start(registry, conversation_id="c1"):
+    source = _generate("llama3-8b-8192", [{"role": "user", "content": "hi"}], 0.7, "u", conversation_id, "m1", 5, None)
+    return registry.start("u", conversation_id, source)
+
+async def saved_replies():
+    return await db.select("messages", filters={"role": "assistant"})
+
+def test_finished_stream_saves_the_reply(memory_db, llm):
+    llm(WORDS)
+
+    async def scenario():
+        session = start(StreamRegistry())
+        events = [event async for event in session.events()]
+        return events, await saved_replies()
+
+    events, rows = asyncio.run(scenario())
+
+    assert "event: message_stop" in events[-1]
+    assert len(rows) == 1
+    assert rows[0]["content"] == "".join(chunk["content"] for chunk in WORDS)
+    assert rows[0]["finish_reason"] == "stop"
+    assert rows[0]["input_tokens"] == 5 and rows[0]["output_tokens"] == rows[0]["token_count"] > 0
+
+def test_abandoned_stream_is_cancelled_and_the_partial_reply_saved(memory_db, llm):
+    scripted = llm(WORDS, delay=0.01)
+
+    async def scenario():
+        session = start(StreamRegistry())
+        events = session.events()
+        received = [await events.__anext__() for _ in range(5)]
+        # The client goes away; nobody reconnects within the grace period
+        await events.aclose()
+        await asyncio.gather(session.broadcast.start(), return_exceptions=True)
+        return received, await saved_replies()
+
+    received, rows = asyncio.run(scenario())
+
+    assert "content_block_delta" in received[-1]
+    assert scripted.closed == 1
+    assert len(rows) == 1
+    assert rows[0]["finish_reason"] == "client_disconnect"
+    assert rows[0]["content"].startswith("word0 word1 word2 ")
+    assert len(rows[0]["content"]) < len("".join(chunk["content"] for chunk in WORDS))
+
+def test_reconnecting_within_the_grace_period_keeps_generating(memory_db, llm):
+    llm(WORDS, delay=0.002)
+
+    async def scenario():
+        session = start(StreamRegistry())
+        events = session.events()
+        await events.__anext__()
+        await events.aclose()
+        await asyncio.sleep(0.01)
+        rest = [event async for event in session.events(after=0)]
+        return rest, await saved_replies()
+
+    rest, rows = asyncio.run(scenario())
+
+    assert "event: message_stop" in rest[-1]
+    assert rows[0]["finish_reason"] == "stop"
+
+def test_shutdown_saves_the_partial_reply(memory_db, llm):
+    llm(WORDS, delay=0.01)
+
+    async def scenario():
+        registry = StreamRegistry()
+        session = start(registry)
+        events = session.events()
+        for _ in range(5):
+            await events.__anext__()
+        await registry.stop()
+        return [event async for event in events], await saved_replies()
+
+    rest, rows = asyncio.run(scenario())
+
+    assert '"cancelled_error"' in rest[-1]
+    assert rows[0]["finish_reason"] == "shutdown"
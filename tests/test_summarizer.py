@@ -0,0 +1,106 @@
+import asyncio
+
+import pytest
+
+from src.config.settings import settings
+from src.db.database import db
+from src.messages.context import ContextBuilder
+from src.messages.summarizer import ConversationSummarizer, summary_prefix
+
+SUMMARY = [{"content": "The user likes tea.", "finish_reason": None}, {"content": "", "finish_reason": "stop"}]
+
+@pytest.fixture(autouse=True)
+def summary_settings(monkeypatch):
+    monkeypatch.setattr(settings, "SUMMARY_KEEP_RECENT_MESSAGES", 2)
+    monkeypatch.setattr(settings, "SUMMARY_MAX_INPUT_TOKENS", 6000)
+
+async def new_conversation(count: int):
+    conversation = (await db.insert("conversations", [{"user_id": "u", "model": "llama3-8b-8192"}]))[0]
+    await add_messages(conversation, 0, count)
+    return conversation
+
+async def add_messages(conversation, start: int, count: int):
+    await db.insert("messages", [{
+        "conversation_id": conversation["id"],
+        "role": "user" if i % 2 == 0 else "assistant",
+        "content": f"message {i}",
+        "token_count": 3,
+        "created_at": f"2024-05-01T10:00:{i:02d}+00:00",
+    } for i in range(start, start + count)])
+
+async def message_ids(conversation):
+    rows = await db.select("messages", filters={"conversation_id": conversation["id"]}, order=["created_at.asc", "id.asc"])
+    return [row["id"] for row in rows]
+
+async def stored(conversation):
+    return (await db.select("conversations", filters={"id": conversation["id"]}))[0]
+
+def test_folds_all_but_the_recent_messages(memory_db, llm):
+    scripted = llm(SUMMARY)
+
+    async def scenario():
+        conversation = await new_conversation(6)
+        await ConversationSummarizer()._summarize(conversation)
+        return await stored(conversation), await message_ids(conversation)
+
+    row, ids = asyncio.run(scenario())
+
+    assert row["summary"] == "The user likes tea."
+    # Messages 4 and 5 stay verbatim
+    assert row["summary_through_id"] == ids[3]
+    assert row["summary_through_at"] == "2024-05-01T10:00:03+00:00"
+    prompt = scripted.calls[0]["messages"][1]["content"]
+    assert "message 3" in prompt and "message 4" not in prompt
+    assert scripted.calls[0]["model"] == settings.SUMMARY_MODEL
+    assert scripted.calls[0]["priority"] == "batch"
+
+def test_next_run_starts_after_the_watermark(memory_db, llm):
+    scripted = llm(SUMMARY)
+
+    async def scenario():
+        conversation = await new_conversation(6)
+        await ConversationSummarizer()._summarize(conversation)
+        await add_messages(conversation, 6, 2)
+        await ConversationSummarizer()._summarize(await stored(conversation))
+        return await stored(conversation), await message_ids(conversation)
+
+    row, ids = asyncio.run(scenario())
+
+    assert row["summary_through_id"] == ids[5]
+    prompt = scripted.calls[1]["messages"][1]["content"]
+    assert "Existing summary:\nThe user likes tea." in prompt
+    assert "message 3" not in prompt and "message 4" in prompt and "message 5" in prompt
+
+def test_stale_run_does_not_move_the_watermark_back(memory_db, llm):
+    llm(SUMMARY)
+
+    async def scenario():
+        stale = await new_conversation(6)
+        await add_messages(stale, 6, 2)
+        await ConversationSummarizer()._summarize(stale)
+        # Started before that run finished: it still sees no summary
+        late = ConversationSummarizer()
+        await late._summarize(stale)
+        return late.completed, await stored(stale), await message_ids(stale)
+
+    completed, row, ids = asyncio.run(scenario())
+
+    assert completed == 0
+    assert row["summary_through_id"] == ids[5]
+
+def test_context_sends_the_summary_instead_of_covered_messages(memory_db, monkeypatch):
+    monkeypatch.setattr(settings, "SUMMARY_ENABLED", False)
+
+    async def scenario():
+        conversation = await new_conversation(6)
+        ids = await message_ids(conversation)
+        conversation.update(summary="The user likes tea.", summary_through_at="2024-05-01T10:00:03+00:00", summary_through_id=ids[3])
+        return await ContextBuilder.build(conversation, "llama3-8b-8192")
+
+    payload, _ = asyncio.run(scenario())
+
+    assert payload == [
+        {"role": "system", "content": summary_prefix("The user likes tea.")},
+        {"role": "user", "content": "message 4"},
+        {"role": "assistant", "content": "message 5"},
+    ]
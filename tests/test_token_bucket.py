@@ -0,0 +1,98 @@
+import asyncio
+import time
+
+import pytest
+from fastapi import HTTPException
+
+from src.config.settings import settings
+from src.middleware.rate_limiter import UserQuota
+from src.utils.token_bucket import MemoryBucketStore, SQLiteBucketStore
+
+@pytest.fixture(params=["memory", "sqlite"])
+def store(request, tmp_path):
+    if request.param == "sqlite":
+        return SQLiteBucketStore(str(tmp_path / "buckets.sqlite3"))
+    return MemoryBucketStore()
+
+def test_takes_until_empty_then_reports_the_wait(store):
+    async def scenario():
+        waits = [await store.take("k", 1, rate=1, capacity=3) for _ in range(4)]
+        return waits
+
+    waits = asyncio.run(scenario())
+    assert waits[:3] == [0.0, 0.0, 0.0]
+    assert 0.9 < waits[3] <= 1.0
+
+def test_forced_charge_leaves_debt_to_wait_out(store):
+    async def scenario():
+        assert await store.take("k", 0, rate=10, capacity=10) == 0.0
+        # Usage only known afterwards is charged even past the capacity
+        assert await store.take("k", 30, rate=10, capacity=10, force=True) == 0.0
+        return await store.take("k", 0, rate=10, capacity=10)
+
+    # 20 tokens of debt at 10/s
+    assert 1.9 < asyncio.run(scenario()) <= 2.0
+
+def test_oversized_request_needs_a_full_bucket(store):
+    async def scenario():
+        first = await store.take("k", 50, rate=10, capacity=10)
+        second = await store.take("k", 1, rate=10, capacity=10)
+        return first, second
+
+    first, second = asyncio.run(scenario())
+    assert first == 0.0
+    assert 4.0 < second <= 4.1
+
+def test_quota_refuses_a_user_in_token_debt(monkeypatch):
+    monkeypatch.setattr(settings, "RATE_LIMIT_REQUESTS_PER_MINUTE", 0)
+    monkeypatch.setattr(settings, "RATE_LIMIT_TOKENS_PER_MINUTE", 600)
+    quota = UserQuota(MemoryBucketStore())
+
+    async def scenario():
+        await quota.admit("u")
+        # A long reply overshoots the bucket; the next turn has to wait it out
+        await quota.charge("u", 1200)
+        with pytest.raises(HTTPException) as error:
+            await quota.admit("u")
+        await quota.admit("someone else")
+        return error.value
+
+    error = asyncio.run(scenario())
+    assert error.status_code == 429
+    assert int(error.headers["Retry-After"]) == 60
+
+def test_quota_limits_requests_per_minute(monkeypatch):
+    monkeypatch.setattr(settings, "RATE_LIMIT_REQUESTS_PER_MINUTE", 2)
+    monkeypatch.setattr(settings, "RATE_LIMIT_TOKENS_PER_MINUTE", 0)
+    quota = UserQuota(MemoryBucketStore())
+
+    async def scenario():
+        await quota.admit("u")
+        await quota.admit("u")
+        await quota.admit("u")
+
+    with pytest.raises(HTTPException) as error:
+        asyncio.run(scenario())
+    assert error.value.status_code == 429
+    assert quota.rejected == 1
+
+def test_memory_sweep_drops_only_refilled_buckets():
+    async def scenario():
+        store = MemoryBucketStore()
+        await store.take("idle", 1, rate=100, capacity=10)
+        await store.take("in_debt", 100, rate=1, capacity=10, force=True)
+        store._sweep(time.monotonic() + 1)
+        return sorted(store._buckets)
+
+    assert asyncio.run(scenario()) == ["in_debt"]
+
+def test_sqlite_sweep_drops_only_refilled_buckets(tmp_path):
+    async def scenario():
+        store = SQLiteBucketStore(str(tmp_path / "buckets.sqlite3"))
+        await store.take("idle", 0, rate=1, capacity=10)
+        await store.take("in_debt", 100, rate=1, capacity=10, force=True)
+        store._next_sweep = 0
+        await store.take("in_debt", 0, rate=1, capacity=10)
+        return sorted(row[0] for row in store._connect().execute("SELECT key FROM buckets"))
+
+    assert asyncio.run(scenario()) == ["in_debt"]
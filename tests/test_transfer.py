@@ -0,0 +1,133 @@
+import asyncio
+import json
+import zlib
+
+import pytest
+from fastapi import HTTPException
+
+from src.conversations.transfer import ConversationTransfer
+from src.db.database import db
+
+async def seed(user_id="alice"):
+    conversations = await db.insert("conversations", [
+        {"user_id": user_id, "title": "First", "model": "llama3-8b-8192", "metadata": {"tag": "a"}},
+        {"user_id": user_id, "title": "Second", "model": "gpt-4-turbo", "is_archived": True},
+        {"user_id": "someone else", "title": "Not exported", "model": "llama3-8b-8192"},
+    ])
+    await db.insert("messages", [{
+        "conversation_id": conversation["id"],
+        "role": "user" if i % 2 == 0 else "assistant",
+        "content": f"{conversation['title']} message {i}",
+        "token_count": 4,
+        "created_at": f"2024-05-01T10:00:{i:02d}+00:00",
+    } for conversation in conversations for i in range(3)])
+
+async def export(user_id, **kwargs):
+    return b"".join([chunk async for chunk in ConversationTransfer.export_ndjson(user_id, **kwargs)])
+
+async def body(data: bytes, size: int = 7):
+    # Split mid-line, as a request body arrives
+    for start in range(0, len(data), size):
+        yield data[start:start + size]
+
+async def history(user_id):
+    conversations = await db.select("conversations", filters={"user_id": user_id}, order=["title.asc"])
+    return [
+        (conversation["title"], conversation["model"], conversation["is_archived"], conversation["metadata"], [
+            (message["role"], message["content"], message["created_at"])
+            for message in await db.select("messages", filters={"conversation_id": conversation["id"]}, order=["created_at.asc"])
+        ])
+        for conversation in conversations
+    ]
+
+@pytest.mark.parametrize("compress", [False, True])
+def test_export_then_import_round_trips(memory_db, compress):
+    async def scenario():
+        await seed()
+        data = await export("alice", compress=compress)
+        result = await ConversationTransfer.import_ndjson("bob", body(data), compressed=compress)
+        return data, result, await history("alice"), await history("bob")
+
+    data, result, original, imported = asyncio.run(scenario())
+
+    lines = (zlib.decompress(data, 47) if compress else data).decode().splitlines()
+    assert [json.loads(line)["type"] for line in lines] == ["conversation", "message", "message", "message"] * 2
+    assert result == {"conversations": 2, "messages": 6, "skipped": 0, "errors": []}
+    assert imported == original
+
+def test_export_can_leave_out_archived_conversations(memory_db):
+    async def scenario():
+        await seed()
+        return await export("alice", include_archived=False)
+
+    titles = [json.loads(line).get("title") for line in asyncio.run(scenario()).decode().splitlines()]
+    assert titles == ["First", None, None, None]
+
+def test_import_gets_fresh_ids(memory_db):
+    async def scenario():
+        await seed()
+        data = await export("alice")
+        await ConversationTransfer.import_ndjson("alice", body(data))
+        return await db.select("conversations", filters={"user_id": "alice"})
+
+    rows = asyncio.run(scenario())
+    assert len({row["id"] for row in rows}) == 4
+
+def test_invalid_lines_are_skipped_and_reported(memory_db):
+    lines = [
+        {"type": "conversation", "id": "c1", "title": "Kept"},
+        {"type": "message", "conversation_id": "c1", "role": "user", "content": "fine"},
+        {"type": "message", "conversation_id": "c1", "role": "robot", "content": "bad role"},
+        {"type": "message", "conversation_id": "c1", "role": "user", "content": "x", "token_count": 2**31},
+        {"type": "message", "conversation_id": "c1", "role": "user", "content": "nul \x00 byte"},
+        {"type": "message", "conversation_id": "c1", "role": "user", "content": "x", "created_at": "yesterday"},
+        {"type": "conversation", "id": "c2", "title": "t" * 501},
+        {"type": "message", "role": "user", "content": "follows the skipped conversation"},
+        {"type": "message", "conversation_id": "nowhere", "role": "user", "content": "orphan"},
+        {"type": "attachment"},
+    ]
+    data = ("\n".join(json.dumps(line) for line in lines) + "\nnot json\n[1]\n").encode()
+
+    async def scenario():
+        result = await ConversationTransfer.import_ndjson("bob", body(data))
+        return result, await history("bob")
+
+    result, imported = asyncio.run(scenario())
+
+    assert result["conversations"] == 1 and result["messages"] == 1
+    assert result["skipped"] == 10
+    assert [error["line"] for error in result["errors"]] == list(range(3, 13))
+    assert result["errors"][0]["error"].startswith("role:")
+    assert result["errors"][1]["error"].startswith("token_count:")
+    assert imported == [("Kept", "llama3-8b-8192", False, {}, [("user", "fine", imported[0][4][0][2])])]
+
+def test_naive_import_timestamps_are_taken_as_utc(memory_db):
+    lines = [
+        {"type": "conversation", "id": "c1", "created_at": "2024-05-01T10:00:00"},
+        {"type": "message", "role": "user", "content": "hi", "created_at": "2024-05-01T10:00:01"},
+    ]
+    data = "\n".join(json.dumps(line) for line in lines).encode()
+
+    async def scenario():
+        await ConversationTransfer.import_ndjson("bob", body(data))
+        return (await db.select("conversations"))[0], (await db.select("messages"))[0]
+
+    conversation, message = asyncio.run(scenario())
+    assert conversation["created_at"] == conversation["updated_at"] == "2024-05-01T10:00:00+00:00"
+    assert message["created_at"] == "2024-05-01T10:00:01+00:00"
+
+def test_gzip_bomb_is_refused_before_it_is_inflated(memory_db):
+    # 64 MiB of zeros without a newline compresses to about 64 KiB
+    bomb = zlib.compressobj(9, zlib.DEFLATED, 31)
+    data = b"".join(bomb.compress(b"0" * (1 << 20)) for _ in range(64)) + bomb.flush()
+
+    with pytest.raises(HTTPException) as error:
+        asyncio.run(ConversationTransfer.import_ndjson("bob", body(data, 1 << 16), compressed=True))
+
+    assert error.value.status_code == 413
+
+def test_body_that_is_not_gzip_is_a_400(memory_db):
+    with pytest.raises(HTTPException) as error:
+        asyncio.run(ConversationTransfer.import_ndjson("bob", body(b"{}\n"), compressed=True))
+
+    assert error.value.status_code == 400